@@ -0,0 +1,24 @@
+"""Add token_version to users table
+
+Revision ID: 007_user_token_version
+Revises: 006_fix_employee_constraints
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007_user_token_version'
+down_revision = '006_fix_employee_constraints'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Per-user counter embedded in access tokens; bumping it revokes issued tokens
+    op.add_column('users', sa.Column('token_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
@@ -0,0 +1,54 @@
+"""Add notifications and email_logs tables
+
+Revision ID: 008_notifications_email_logs
+Revises: 007_user_token_version
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008_notifications_email_logs'
+down_revision = '007_user_token_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'notifications',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('type', sa.String(length=50), nullable=False),
+        sa.Column('recipient_user_id', sa.String(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('action_url', sa.String(length=500), nullable=True),
+        sa.Column('read', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('employee_id', sa.Integer(), sa.ForeignKey('hr_employees.employee_id', ondelete='SET NULL'), nullable=True),
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id', ondelete='SET NULL'), nullable=True),
+    )
+    op.create_index('ix_notifications_id', 'notifications', ['id'])
+    op.create_index('ix_notifications_recipient_user_id', 'notifications', ['recipient_user_id'])
+
+    op.create_table(
+        'email_logs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('template_name', sa.String(length=100), nullable=False),
+        sa.Column('recipient_email', sa.String(length=255), nullable=False),
+        sa.Column('subject', sa.String(length=500), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True, server_default=sa.func.now()),
+        sa.Column('status', sa.String(length=20), nullable=True, server_default='sent'),
+        sa.Column('employee_id', sa.Integer(), sa.ForeignKey('hr_employees.employee_id', ondelete='SET NULL'), nullable=True),
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id', ondelete='SET NULL'), nullable=True),
+    )
+    op.create_index('ix_email_logs_id', 'email_logs', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_email_logs_id', table_name='email_logs')
+    op.drop_table('email_logs')
+    op.drop_index('ix_notifications_recipient_user_id', table_name='notifications')
+    op.drop_index('ix_notifications_id', table_name='notifications')
+    op.drop_table('notifications')
@@ -0,0 +1,29 @@
+"""Add the (created_at, id) keyset index on users
+
+Revision ID: 009_users_keyset_index
+Revises: 008_notifications_email_logs
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009_users_keyset_index'
+down_revision = '008_notifications_email_logs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Keyset paging compares (created_at, id) row values; NULLs would fall out of every page
+    op.execute("UPDATE users SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    op.create_index(
+        'ix_users_created_at_id',
+        'users',
+        [sa.text('created_at DESC'), sa.text('id DESC')],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_created_at_id', table_name='users')
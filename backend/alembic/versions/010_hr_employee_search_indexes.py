@@ -0,0 +1,40 @@
+"""Add trigram search indexes on hr_employees
+
+Revision ID: 010_hr_employee_search
+Revises: 009_users_keyset_index
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '010_hr_employee_search'
+down_revision = '009_users_keyset_index'
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = ('emp_code', 'first_name', 'last_name')
+
+
+def upgrade() -> None:
+    # pg_trgm lets Postgres serve ILIKE '%term%' from a GIN index and rank by similarity()
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in SEARCH_COLUMNS:
+        op.create_index(
+            f'ix_hr_employees_{column}_trgm',
+            'hr_employees',
+            [column],
+            postgresql_using='gin',
+            postgresql_ops={column: 'gin_trgm_ops'},
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for column in SEARCH_COLUMNS:
+        op.drop_index(f'ix_hr_employees_{column}_trgm', table_name='hr_employees')
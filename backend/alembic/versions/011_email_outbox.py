@@ -0,0 +1,43 @@
+"""Turn email_logs into the outbound email queue
+
+Revision ID: 011_email_outbox
+Revises: 010_hr_employee_search
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011_email_outbox'
+down_revision = '010_hr_employee_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('email_logs', sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+    op.add_column('email_logs', sa.Column('body_text', sa.Text(), nullable=True))
+    op.add_column('email_logs', sa.Column('body_html', sa.Text(), nullable=True))
+    op.add_column('email_logs', sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('email_logs', sa.Column('next_attempt_at', sa.DateTime(), nullable=True))
+    op.add_column('email_logs', sa.Column('last_error', sa.Text(), nullable=True))
+
+    # sent_at is now only set on delivery; existing rows keep their timestamps
+    op.alter_column('email_logs', 'sent_at', server_default=None)
+    op.execute("UPDATE email_logs SET status = 'sent' WHERE status IS NULL")
+    op.alter_column('email_logs', 'status', server_default='queued', nullable=False)
+
+    op.create_index('ix_email_logs_status_next_attempt', 'email_logs', ['status', 'next_attempt_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_email_logs_status_next_attempt', table_name='email_logs')
+    op.alter_column('email_logs', 'status', server_default='sent', nullable=True)
+    op.alter_column('email_logs', 'sent_at', server_default=sa.func.now())
+    op.drop_column('email_logs', 'last_error')
+    op.drop_column('email_logs', 'next_attempt_at')
+    op.drop_column('email_logs', 'attempts')
+    op.drop_column('email_logs', 'body_html')
+    op.drop_column('email_logs', 'body_text')
+    op.drop_column('email_logs', 'created_at')
@@ -0,0 +1,34 @@
+"""Add materialized unread notification counters
+
+Revision ID: 012_notification_counters
+Revises: 011_email_outbox
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012_notification_counters'
+down_revision = '011_email_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'notification_counters',
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('unread_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+
+    op.execute(
+        "INSERT INTO notification_counters (user_id, unread_count, updated_at) "
+        "SELECT recipient_user_id, COUNT(*), CURRENT_TIMESTAMP FROM notifications "
+        "WHERE read = false GROUP BY recipient_user_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('notification_counters')
@@ -0,0 +1,36 @@
+"""Add composite indexes for paging notifications per recipient
+
+Revision ID: 013_notification_paging
+Revises: 012_notification_counters
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013_notification_paging'
+down_revision = '012_notification_counters'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_notifications_recipient_read_created',
+        'notifications',
+        ['recipient_user_id', 'read', sa.text('created_at DESC'), sa.text('id DESC')],
+    )
+    op.create_index(
+        'ix_notifications_recipient_created',
+        'notifications',
+        ['recipient_user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+    )
+    # Both new indexes lead with recipient_user_id
+    op.drop_index('ix_notifications_recipient_user_id', table_name='notifications')
+
+
+def downgrade() -> None:
+    op.create_index('ix_notifications_recipient_user_id', 'notifications', ['recipient_user_id'])
+    op.drop_index('ix_notifications_recipient_created', table_name='notifications')
+    op.drop_index('ix_notifications_recipient_read_created', table_name='notifications')
@@ -0,0 +1,41 @@
+"""Add the email log archive and retention indexes
+
+Revision ID: 014_retention
+Revises: 013_notification_paging
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '014_retention'
+down_revision = '013_notification_paging'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'email_logs_archive',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column('template_name', sa.String(length=100), nullable=False),
+        sa.Column('recipient_email', sa.String(length=255), nullable=False),
+        sa.Column('subject', sa.String(length=500), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('employee_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.String(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('ix_email_logs_created_at', 'email_logs', ['created_at'])
+    op.create_index('ix_notifications_created_at', 'notifications', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notifications_created_at', table_name='notifications')
+    op.drop_index('ix_email_logs_created_at', table_name='email_logs')
+    op.drop_table('email_logs_archive')
@@ -0,0 +1,42 @@
+"""Add the shared rate limit counter table
+
+Revision ID: 015_rate_limit_counters
+Revises: 014_retention
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '015_rate_limit_counters'
+down_revision = '014_retention'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # Counters are disposable: skip WAL, losing them on a crash only resets limits
+        op.execute(
+            "CREATE UNLOGGED TABLE rate_limit_counters ("
+            "bucket_key VARCHAR(255) NOT NULL, "
+            "window_start BIGINT NOT NULL, "
+            "count INTEGER NOT NULL DEFAULT 0, "
+            "expires_at BIGINT NOT NULL, "
+            "PRIMARY KEY (bucket_key, window_start))"
+        )
+    else:
+        op.create_table(
+            'rate_limit_counters',
+            sa.Column('bucket_key', sa.String(length=255), primary_key=True),
+            sa.Column('window_start', sa.BigInteger(), primary_key=True),
+            sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('expires_at', sa.BigInteger(), nullable=False),
+        )
+    op.create_index('ix_rate_limit_counters_expires_at', 'rate_limit_counters', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_rate_limit_counters_expires_at', table_name='rate_limit_counters')
+    op.drop_table('rate_limit_counters')
@@ -1,14 +1,17 @@
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import Optional, Tuple
+from jose import JWTError, jwt, jwk
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from .database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import get_async_db
 from .models import User
-from .safe_db import SafeUser, safe_get_user_by_username, check_table_schema
+from .safe_db import SafeUser, check_table_schema
+from .safe_db_async import safe_get_user_by_username
 from .permissions import normalize_role, get_role_permissions
+from .auth_cache import principal_cache, rejected_tokens
+from .hash_policy import pwd_context, verify_and_update
+from .token_versions import token_versions, AUTH_TRUST_TOKEN_CLAIMS
 from dotenv import load_dotenv
 import os
 
@@ -52,9 +55,10 @@ if DEBUG_MODE:
         logger.info("JWT secret key loaded", env=APP_ENV)
 
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
+# Built once at import; jose accepts the key object for both signing and verification
+SIGNING_KEY = jwk.construct(SECRET_KEY, ALGORITHM)
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -64,9 +68,30 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         logger.error("Password verification error", error=str(e))
         return False
 
+def verify_password_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password; also returns a new hash when the stored one is off-policy"""
+    try:
+        return verify_and_update(plain_password, hashed_password)
+    except Exception as e:
+        logger.error("Password verification error", error=str(e))
+        return False, None
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+def build_token_claims(user) -> dict:
+    """Access token claims for a user; claims-trusted mode embeds authorization data"""
+    claims = {"sub": user.username}
+    if AUTH_TRUST_TOKEN_CLAIMS:
+        claims.update({
+            "uid": str(user.id),
+            "role": user.role,
+            "emp": user.employee_id,
+            "ver": getattr(user, "token_version", None) or 0,
+            "active": bool(user.is_active),
+        })
+    return claims
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -74,90 +99,61 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     
     # Normalize role in JWT payload
     if "role" in to_encode:
         to_encode["role"] = normalize_role(to_encode["role"])
     
-    # Enhanced SECRET_KEY preparation with multiple fallbacks
-    key_to_use = SECRET_KEY
-    
-    # Ensure key is string and clean
-    if not key_to_use:
-        key_to_use = "fallback-development-key-very-long-and-secure-12345"
-    
-    key_to_use = str(key_to_use).strip()
-    
     try:
-        # Try encoding with string key first
-        encoded_jwt = jwt.encode(to_encode, key_to_use, algorithm=ALGORITHM)
-        return encoded_jwt
+        return jwt.encode(to_encode, SIGNING_KEY, algorithm=ALGORITHM)
     except Exception as e:
-        logger.warning("JWT encoding error with string key; retrying with bytes", error=str(e), key_type=type(key_to_use).__name__)
-        
-        # Try with bytes conversion as fallback
-        try:
-            key_bytes = key_to_use.encode('utf-8')
-            encoded_jwt = jwt.encode(to_encode, key_bytes, algorithm=ALGORITHM)
-            if DEBUG_MODE:
-                logger.debug("JWT encoding succeeded with bytes key")
-            return encoded_jwt
-        except Exception as e2:
-            logger.error("JWT encoding failed with bytes key", error=str(e2))
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Token creation failed: {str(e)}"
-            )
+        logger.error("JWT encoding failed", error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Token creation failed: {str(e)}"
+        )
 
-def verify_token(token: str):
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def decode_token(token: str) -> dict:
+    """Decode and validate a JWT, returning its claims (requires a subject)"""
+    # Tokens that already failed verification are rejected without another HMAC
+    if rejected_tokens.contains(token):
+        raise _credentials_exception()
+    
     try:
-        # Enhanced SECRET_KEY preparation matching create_access_token
-        key_to_use = SECRET_KEY
-        
-        if not key_to_use:
-            key_to_use = "fallback-development-key-very-long-and-secure-12345"
-        
-        key_to_use = str(key_to_use).strip()
-        
-        # Try decoding with string key first
-        try:
-            payload = jwt.decode(token, key_to_use, algorithms=[ALGORITHM])
-        except Exception as e1:
-            if DEBUG_MODE:
-                logger.debug("JWT decode error with string key; retrying with bytes", error=str(e1))
-            # Try with bytes key as fallback
-            try:
-                key_bytes = key_to_use.encode('utf-8')
-                payload = jwt.decode(token, key_bytes, algorithms=[ALGORITHM])
-                if DEBUG_MODE:
-                    logger.debug("JWT decode succeeded with bytes key")
-            except Exception as e2:
-                logger.error("JWT decode failed with bytes key", error=str(e2))
-                raise e1  # Raise original error
-        
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return username
+        payload = jwt.decode(token, SIGNING_KEY, algorithms=[ALGORITHM])
     except JWTError as e:
+        rejected_tokens.add(token)
         logger.warning("JWT decode error", error=str(e))
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception()
+    
+    # Access tokens carry no "typ"; typed tokens (stream tickets) are not bearer credentials
+    if payload.get("sub") is None or payload.get("typ") is not None:
+        rejected_tokens.add(token)
+        raise _credentials_exception()
+    return payload
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
-    token = credentials.credentials
-    username = verify_token(token)
+def verify_token(token: str):
+    return decode_token(token)["sub"]
+
+async def _load_user(payload: dict, db: AsyncSession):
+    username = payload["sub"]
+    # Tokens issued before "iat" was added are keyed by their expiry instead
+    issued_at = payload.get("iat", payload.get("exp"))
+    
+    cached_user = principal_cache.get(username, issued_at)
+    if cached_user is not None:
+        return cached_user
     
     # Use ONLY safe user query (no fallback to User model)
-    user = safe_get_user_by_username(db, username)
+    user = await safe_get_user_by_username(db, username)
     
     if user is None:
         logger.error(f"User not found: {username}")
@@ -169,5 +165,41 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     
     # Normalize user role
     user.role = normalize_role(user.role)
+    principal_cache.set(username, issued_at, user)
     return user
 
+# Both dependencies use the request's AsyncSession (get_async_db is cached per
+# request), so an async route and its auth check share one connection
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_async_db)):
+    token = credentials.credentials
+    return await _load_user(decode_token(token), db)
+
+async def get_current_principal(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_async_db)):
+    """
+    Resolve the caller for authorization checks.
+    In claims-trusted mode a token carrying uid/role/ver is authorized from its
+    claims plus the in-memory token version map, without a users lookup.
+    Tokens without those claims (or an unavailable map) use get_current_user.
+    """
+    token = credentials.credentials
+    payload = decode_token(token)
+    
+    if AUTH_TRUST_TOKEN_CLAIMS and "uid" in payload and "ver" in payload:
+        current = await token_versions.is_current(db, payload["uid"], payload["ver"])
+        if current is False or payload.get("active") is False:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        if current:
+            # Role was normalized when the token was issued
+            return SafeUser(
+                id=payload["uid"],
+                username=payload["sub"],
+                role=payload.get("role", "user"),
+                is_active=True,
+                employee_id=payload.get("emp"),
+            )
+    
+    return await _load_user(payload, db)
@@ -0,0 +1,182 @@
+"""
+In-process cache for authenticated principals
+
+get_current_user resolves the JWT subject to a SafeUser on every request.
+This cache keeps the resolved (role-normalized) user for a short TTL so
+repeated requests with the same token skip the users table round trip.
+
+Entries are keyed by (username, token iat) and are bounded by both a TTL
+and an LRU size limit. Anything that changes a user row must call
+principal_cache.invalidate(...) so the next request reloads it. The cache is
+per-process, so the TTL is the upper bound on staleness across workers.
+
+A second, negative cache remembers digests of tokens that failed
+verification (bad signature, expired, no subject). Such tokens can never
+become valid, so a client replaying a stale token is rejected without
+another HMAC verification or log line.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger("auth_cache")
+
+AUTH_CACHE_ENABLED = (os.getenv("AUTH_CACHE_ENABLED") or "true").lower() in ("1", "true", "yes", "on")
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 1024))
+AUTH_REJECTED_TOKEN_TTL_SECONDS = float(os.getenv("AUTH_REJECTED_TOKEN_TTL_SECONDS", 300))
+AUTH_REJECTED_TOKEN_MAX_ENTRIES = int(os.getenv("AUTH_REJECTED_TOKEN_MAX_ENTRIES", 4096))
+
+
+class PrincipalCache:
+    """Thread-safe TTL + LRU cache of SafeUser objects"""
+
+    def __init__(self, ttl_seconds: float = AUTH_CACHE_TTL_SECONDS,
+                 max_entries: int = AUTH_CACHE_MAX_ENTRIES, enabled: bool = AUTH_CACHE_ENABLED):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, username: str, issued_at: Hashable) -> Optional[Any]:
+        """Return the cached user for this token, or None on miss/expiry"""
+        if not self.enabled:
+            return None
+
+        key = (username, issued_at)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, user = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return user
+
+    def set(self, username: str, issued_at: Hashable, user: Any) -> None:
+        """Store a resolved user for this token"""
+        if not self.enabled:
+            return
+
+        key = (username, issued_at)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: Optional[str] = None, username: Optional[str] = None) -> int:
+        """
+        Drop every cached token for a user (matched by id or username)
+        Returns the number of entries removed
+        """
+        if user_id is None and username is None:
+            return 0
+
+        with self._lock:
+            stale_keys = [
+                key for key, (_, user) in self._entries.items()
+                if (user_id is not None and str(getattr(user, "id", None)) == str(user_id))
+                or (username is not None and key[0] == username)
+            ]
+            for key in stale_keys:
+                del self._entries[key]
+            self.invalidations += len(stale_keys)
+
+        if stale_keys:
+            logger.debug("Principal cache invalidated", user_id=user_id, username=username, entries=len(stale_keys))
+        return len(stale_keys)
+
+    def clear(self) -> None:
+        """Drop all cached principals"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class RejectedTokenCache:
+    """Thread-safe TTL + LRU set of rejected token digests"""
+
+    def __init__(self, ttl_seconds: float = AUTH_REJECTED_TOKEN_TTL_SECONDS,
+                 max_entries: int = AUTH_REJECTED_TOKEN_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def contains(self, token: str) -> bool:
+        """True if this token was rejected recently"""
+        key = self._digest(token)
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True
+
+    def add(self, token: str) -> None:
+        """Remember a token that failed verification"""
+        key = self._digest(token)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl_seconds
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+            }
+
+
+# Global cache instances
+principal_cache = PrincipalCache()
+rejected_tokens = RejectedTokenCache()
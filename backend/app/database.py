@@ -1,14 +1,12 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
 
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-import os
-from dotenv import load_dotenv
+from .db_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool, async_pool_metrics, pool_metrics
 
 load_dotenv()
 
@@ -49,9 +47,74 @@ print(f"Final Database URL: {DATABASE_URL}")
 if not (DATABASE_URL.startswith("postgresql://") or DATABASE_URL.startswith("sqlite:///")):
     raise ValueError(f"Invalid DATABASE_URL format: {DATABASE_URL}")
 
-engine = create_engine(DATABASE_URL)
+# Connection pool settings (Railway Postgres drops idle connections, so
+# recycle and pre-ping are on by default). The sync pool only serves what is
+# still sync (login, password reset, admin/debug endpoints); most request
+# traffic goes through the async pool below.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 3))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 5))
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", 5))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = (os.getenv("DB_POOL_PRE_PING") or "true").lower() in ("1", "true", "yes", "on")
+
+# Query parameters the asyncpg dialect passes to asyncpg.connect() as-is; other
+# libpq parameters (channel_binding, target_session_attrs, options, ...) would
+# make connect() raise, so they only apply to the sync (psycopg2) engine
+ASYNCPG_URL_PARAMS = ("ssl", "prepared_statement_cache_size")
+
+
+def async_database_url(url: str) -> str:
+    """The async driver's URL for a postgresql:// or sqlite:/// DATABASE_URL"""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+
+    query = dict(url.query)
+    # asyncpg spells libpq's sslmode as ssl (same values: disable ... verify-full)
+    sslmode = query.pop("sslmode", None)
+    if sslmode is not None:
+        query.setdefault("ssl", sslmode)
+    dropped = sorted(name for name in query if name not in ASYNCPG_URL_PARAMS)
+    if dropped:
+        print(f"Warning: ignoring DATABASE_URL parameters not supported by asyncpg: {', '.join(dropped)}")
+    query = {name: value for name, value in query.items() if name in ASYNCPG_URL_PARAMS}
+    return url.set(drivername="postgresql+asyncpg", query=query).render_as_string(hide_password=False)
+
+
+engine_options = {"pool_pre_ping": DB_POOL_PRE_PING}
+if DATABASE_URL.startswith("postgresql://"):
+    engine_options.update({
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+    })
+
+engine = create_engine(DATABASE_URL, **engine_options)
+pool_metrics.install(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the async routers and the auth dependencies (asyncpg /
+# aiosqlite drivers). Its pool is sized by ASYNC_DB_POOL_SIZE/ASYNC_DB_MAX_OVERFLOW;
+# a worker holds at most both pools' size + overflow connections in total.
+ASYNC_DATABASE_URL = async_database_url(DATABASE_URL)
+
+async_engine_options = {key: value for key, value in engine_options.items() if key != "poolclass"}
+if "pool_size" in async_engine_options:
+    async_engine_options.update({
+        "poolclass": InstrumentedAsyncQueuePool,
+        "pool_size": ASYNC_DB_POOL_SIZE,
+        "max_overflow": ASYNC_DB_MAX_OVERFLOW,
+    })
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_engine_options)
+async_pool_metrics.install(async_engine.sync_engine)
+# expire_on_commit=False: attributes stay loaded after commit, since an
+# implicit refresh cannot run lazily outside an await
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -61,3 +124,7 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
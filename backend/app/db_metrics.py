@@ -0,0 +1,150 @@
+"""
+Connection pool telemetry for the SQLAlchemy engines
+
+InstrumentedQueuePool (sync engine) and InstrumentedAsyncQueuePool (async
+engine) time every connection checkout, including the time spent waiting
+for a free slot or opening an overflow connection, and feed a fixed-bucket
+histogram. Pool events count connects, checkouts, checkins and
+invalidations. pool_metrics and async_pool_metrics snapshots are served by
+/admin/diagnostics so worker counts and pool sizes can be tuned from real
+numbers; most request traffic goes through the async pool.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Upper bounds (milliseconds) of the checkout wait histogram buckets
+WAIT_BUCKETS_MS: List[float] = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+
+class PoolMetrics:
+    """Thread-safe counters and wait-time histogram for a connection pool"""
+
+    def __init__(self, buckets_ms: List[float] = WAIT_BUCKETS_MS):
+        self.buckets_ms = list(buckets_ms)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.wait_counts = [0] * (len(self.buckets_ms) + 1)
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.waits = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.peak_checked_out = 0
+
+    def record_wait(self, waited_ms: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.wait_counts[bisect.bisect_left(self.buckets_ms, waited_ms)] += 1
+            self.wait_total_ms += waited_ms
+            self.wait_max_ms = max(self.wait_max_ms, waited_ms)
+            self.waits += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def _increment(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def install(self, engine: Engine) -> None:
+        """Attach pool event listeners to an engine"""
+
+        @event.listens_for(engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            self._increment("connects")
+
+        @event.listens_for(engine, "checkout")
+        def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+            self._increment("checkouts")
+            checked_out = engine.pool.checkedout() if hasattr(engine.pool, "checkedout") else 0
+            with self._lock:
+                self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+        @event.listens_for(engine, "checkin")
+        def _on_checkin(dbapi_connection, connection_record):
+            self._increment("checkins")
+
+        @event.listens_for(engine, "invalidate")
+        def _on_invalidate(dbapi_connection, connection_record, exception):
+            self._increment("invalidations")
+
+    def snapshot(self, engine: Engine) -> Dict[str, Any]:
+        pool = engine.pool
+        with self._lock:
+            histogram = {
+                f"le_{bound:g}ms": count
+                for bound, count in zip(self.buckets_ms, self.wait_counts)
+            }
+            histogram["le_inf"] = self.wait_counts[-1]
+            return {
+                "pool_class": type(pool).__name__,
+                "size": pool.size() if hasattr(pool, "size") else None,
+                "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+                "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+                "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+                "peak_checked_out": self.peak_checked_out,
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total_ms / self.waits, 3) if self.waits else 0.0,
+                "wait_max_ms": round(self.wait_max_ms, 3),
+                "wait_histogram": histogram,
+            }
+
+
+# Set while the outermost checkout of the current thread or task is being timed.
+# A ContextVar rather than a thread-local: async checkouts of different tasks
+# interleave on one thread.
+_timing_checkout: ContextVar[bool] = ContextVar("timing_checkout", default=False)
+
+# Global metrics shared by every pool the engine creates (dispose() recreates it)
+pool_metrics = PoolMetrics()
+# Same for the async engine's pool
+async_pool_metrics = PoolMetrics()
+
+
+class TimedCheckoutMixin:
+    """Records how long each checkout waited for a connection into `metrics`"""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        # QueuePool._do_get retries by calling itself; only time the outermost call
+        if _timing_checkout.get():
+            return super()._do_get()
+
+        token = _timing_checkout.set(True)
+        started_at = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record_wait((time.perf_counter() - started_at) * 1000, timed_out=True)
+            raise
+        finally:
+            _timing_checkout.reset(token)
+        self.metrics.record_wait((time.perf_counter() - started_at) * 1000)
+        return connection
+
+
+class InstrumentedQueuePool(TimedCheckoutMixin, QueuePool):
+    """QueuePool that records checkout waits into pool_metrics"""
+
+    metrics = pool_metrics
+
+
+class InstrumentedAsyncQueuePool(TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records checkout waits into async_pool_metrics"""
+
+    metrics = async_pool_metrics
@@ -0,0 +1,249 @@
+"""
+Durable outbound email queue
+
+Request handlers call enqueue_email(), which only adds an email_logs row
+(status "queued") to the caller's session. The caller commits it together
+with whatever triggered the email, so nothing is lost if the process dies
+and no request waits on SMTP.
+
+EmailQueueWorker runs in the application's event loop. It claims due rows
+(FOR UPDATE SKIP LOCKED on PostgreSQL, so several workers can share the
+table), delivers them on a thread, and records the outcome:
+
+    queued --claim--> sending --ok--> sent
+                         |
+                         +--error--> queued (next_attempt_at backs off
+                                     exponentially) ... failed
+
+A claimed row is leased until next_attempt_at; if the worker dies mid-send
+the lease expires and another poll picks the row up again. Message bodies
+are cleared once a row is sent or given up on.
+
+A batch is delivered over the sender's pooled SMTP session, so fanning a
+notification out to N recipients costs one handshake rather than N. Idle
+sessions are closed between polls and when the worker stops.
+"""
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import select
+
+from .database import AsyncSessionLocal
+from .email_service import email_service
+from .logging_config import get_logger
+from .models import EmailLog
+from .schemas import EmailLogCreate
+
+logger = get_logger("email_queue")
+
+EMAIL_QUEUE_ENABLED = (os.getenv("EMAIL_QUEUE_ENABLED") or "true").lower() in ("1", "true", "yes", "on")
+EMAIL_QUEUE_POLL_SECONDS = float(os.getenv("EMAIL_QUEUE_POLL_SECONDS", 5))
+EMAIL_QUEUE_BATCH_SIZE = int(os.getenv("EMAIL_QUEUE_BATCH_SIZE", 20))
+EMAIL_SEND_LEASE_SECONDS = int(os.getenv("EMAIL_SEND_LEASE_SECONDS", 300))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 6))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", 30))
+EMAIL_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", 3600))
+
+STATUS_QUEUED = "queued"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+
+def enqueue_email(db, template_name: str, recipient_email: str, subject: str,
+                  body_text: Optional[str] = None, body_html: Optional[str] = None,
+                  employee_id: Optional[int] = None, user_id: Optional[str] = None) -> EmailLog:
+    """
+    Add an email to the queue in the caller's session (sync or async)
+    Nothing is sent until the caller commits; call email_queue.wake() after
+    the commit to have it delivered right away instead of on the next poll.
+    """
+    data = EmailLogCreate(
+        template_name=template_name,
+        recipient_email=recipient_email,
+        subject=subject,
+        status=STATUS_QUEUED,
+        employee_id=employee_id,
+        user_id=user_id,
+        body_text=body_text,
+        body_html=body_html,
+    )
+    email_log = EmailLog(**data.dict(), attempts=0, next_attempt_at=datetime.utcnow())
+    db.add(email_log)
+    return email_log
+
+
+def retry_delay_seconds(attempts: int, base: float = EMAIL_RETRY_BASE_SECONDS,
+                        maximum: float = EMAIL_RETRY_MAX_SECONDS) -> float:
+    """Exponential backoff with +/-10% jitter after the given number of failed attempts"""
+    delay = min(base * (2 ** max(attempts - 1, 0)), maximum)
+    return delay * random.uniform(0.9, 1.1)
+
+
+class EmailQueueWorker:
+    """Background task that delivers queued emails with retries"""
+
+    def __init__(self, session_factory: Callable = AsyncSessionLocal, sender: Any = email_service,
+                 poll_seconds: float = EMAIL_QUEUE_POLL_SECONDS, batch_size: int = EMAIL_QUEUE_BATCH_SIZE,
+                 max_attempts: int = EMAIL_MAX_ATTEMPTS, lease_seconds: int = EMAIL_SEND_LEASE_SECONDS):
+        self.session_factory = session_factory
+        self.sender = sender
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        """Start the worker task on the running event loop"""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self._run(), name="email-queue-worker")
+        logger.info("Email queue worker started", poll_seconds=self.poll_seconds, batch_size=self.batch_size)
+
+    async def stop(self) -> None:
+        """Cancel the worker task and close SMTP sessions; unsent rows stay queued for the next start"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._close_smtp_pool(reap_only=False)
+
+    async def _close_smtp_pool(self, reap_only: bool = True) -> None:
+        pool = getattr(self.sender, "smtp_pool", None)
+        if pool is None:
+            return
+        # QUIT is a network round trip, keep it off the event loop
+        close = pool.reap_idle if reap_only else pool.close
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, close)
+        except Exception as e:
+            logger.warning("Closing idle SMTP connections failed", error=str(e))
+
+    def wake(self) -> None:
+        """Ask the worker to poll now (safe to call from any thread)"""
+        if self._loop is None or self._wakeup is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Keep draining while full batches come back
+                while await self.process_once() >= self.batch_size:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Email queue poll failed", error=str(e))
+
+            await self._close_smtp_pool()
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def process_once(self) -> int:
+        """Claim and deliver one batch of due emails; returns the number claimed"""
+        async with self.session_factory() as db:
+            now = datetime.utcnow()
+            claimed = (await db.execute(
+                select(EmailLog)
+                .where(
+                    EmailLog.status.in_((STATUS_QUEUED, STATUS_SENDING)),
+                    EmailLog.next_attempt_at <= now,
+                )
+                .order_by(EmailLog.next_attempt_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+
+            if not claimed:
+                return 0
+
+            for email_log in claimed:
+                email_log.status = STATUS_SENDING
+                email_log.next_attempt_at = now + timedelta(seconds=self.lease_seconds)
+            await db.commit()
+
+            # The session holds no connection between commits, so SMTP time
+            # does not pin a pool slot
+            for email_log in claimed:
+                await self._deliver(email_log)
+                await db.commit()
+
+            return len(claimed)
+
+    async def _deliver(self, email_log: EmailLog) -> None:
+        if not self.sender.is_configured:
+            self._give_up(email_log, "SMTP not configured")
+            return
+
+        message = self.sender.build_message(
+            email_log.recipient_email, email_log.subject, email_log.body_text, email_log.body_html
+        )
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.sender.deliver, message)
+        except Exception as e:
+            email_log.attempts = (email_log.attempts or 0) + 1
+            email_log.last_error = str(e)[:1000]
+            self.last_error = email_log.last_error
+            if email_log.attempts >= self.max_attempts:
+                self._give_up(email_log, email_log.last_error)
+            else:
+                delay = retry_delay_seconds(email_log.attempts)
+                email_log.status = STATUS_QUEUED
+                email_log.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                self.retried += 1
+                logger.warning("Email delivery failed, will retry", email_id=email_log.id,
+                               attempts=email_log.attempts, retry_in_seconds=round(delay, 1), error=str(e))
+            return
+
+        email_log.attempts = (email_log.attempts or 0) + 1
+        email_log.status = STATUS_SENT
+        email_log.sent_at = datetime.utcnow()
+        email_log.next_attempt_at = None
+        email_log.last_error = None
+        email_log.body_text = None
+        email_log.body_html = None
+        self.sent += 1
+        logger.info("Email sent", email_id=email_log.id, template=email_log.template_name)
+
+    def _give_up(self, email_log: EmailLog, error: str) -> None:
+        email_log.status = STATUS_FAILED
+        email_log.next_attempt_at = None
+        email_log.last_error = error
+        email_log.body_text = None
+        email_log.body_html = None
+        self.failed += 1
+        logger.error("Email delivery abandoned", email_id=email_log.id,
+                     template=email_log.template_name, attempts=email_log.attempts, error=error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "last_error": self.last_error,
+        }
+
+
+# Global email queue worker
+email_queue = EmailQueueWorker()
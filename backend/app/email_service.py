@@ -1,216 +1,114 @@
 """
 Email service for sending password reset emails
+
+Request handlers never talk to SMTP directly: they queue the message in
+email_logs (see app/email_queue.py) and the queue worker calls deliver(),
+which reuses authenticated sessions from the SMTP pool (app/smtp_pool.py).
 """
 import smtplib
 import os
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from email.utils import formatdate
 from typing import Optional
 from datetime import datetime
+from app.email_templates import email_templates
 from app.logging_config import get_logger
+from app.smtp_pool import SMTPConnectionPool
 
 logger = get_logger("email_service")
 
 class EmailService:
     def __init__(self):
-        self.smtp_host = os.getenv("SMTP_HOST", "smtp.gmail.com")
+        self.smtp_host = os.getenv("SMTP_HOST") or os.getenv("SMTP_SERVER", "smtp.gmail.com")
         self.smtp_port = int(os.getenv("SMTP_PORT", "587"))
         self.smtp_username = os.getenv("SMTP_USERNAME", "")
         self.smtp_password = os.getenv("SMTP_PASSWORD", "")
+        self.smtp_starttls = (os.getenv("SMTP_STARTTLS") or "true").lower() in ("1", "true", "yes", "on")
+        # Relays that accept unauthenticated mail (local MTA, aiosmtpd in tests)
+        self.smtp_require_auth = (os.getenv("SMTP_REQUIRE_AUTH") or "true").lower() in ("1", "true", "yes", "on")
+        self.smtp_timeout = float(os.getenv("SMTP_TIMEOUT", 30))
         self.from_email = os.getenv("FROM_EMAIL", self.smtp_username)
         self.frontend_url = os.getenv("FRONTEND_URL", "http://localhost:5174")
-        
-        # Check if email is configured
-        self.is_configured = bool(self.smtp_username and self.smtp_password)
+        self.smtp_pool = SMTPConnectionPool(self.connect)
         
         if not self.is_configured:
             logger.warning("Email service not configured - SMTP credentials missing")
+
+    @property
+    def is_configured(self) -> bool:
+        """True when there is enough SMTP configuration to deliver mail"""
+        if not self.smtp_host:
+            return False
+        return bool(self.smtp_username and self.smtp_password) or not self.smtp_require_auth
     
     def create_reset_email_html(self, username: str, reset_token: str) -> str:
         """Create HTML email content for password reset"""
         reset_link = f"{self.frontend_url}/reset-password?token={reset_token}"
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Reset Your Password</title>
-            <style>
-                body {{
-                    font-family: Arial, sans-serif;
-                    line-height: 1.6;
-                    color: #333;
-                    max-width: 600px;
-                    margin: 0 auto;
-                    padding: 20px;
-                }}
-                .header {{
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    padding: 30px;
-                    text-align: center;
-                    border-radius: 10px 10px 0 0;
-                }}
-                .content {{
-                    background: #f9f9f9;
-                    padding: 30px;
-                    border-radius: 0 0 10px 10px;
-                }}
-                .button {{
-                    display: inline-block;
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    padding: 15px 30px;
-                    text-decoration: none;
-                    border-radius: 5px;
-                    margin: 20px 0;
-                    font-weight: bold;
-                }}
-                .button:hover {{
-                    opacity: 0.9;
-                }}
-                .footer {{
-                    margin-top: 30px;
-                    padding-top: 20px;
-                    border-top: 1px solid #ddd;
-                    font-size: 12px;
-                    color: #666;
-                }}
-                .warning {{
-                    background: #fff3cd;
-                    border: 1px solid #ffeaa7;
-                    color: #856404;
-                    padding: 15px;
-                    border-radius: 5px;
-                    margin: 20px 0;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>🔐 Reset Your Password</h1>
-                <p>Auth System</p>
-            </div>
-            
-            <div class="content">
-                <h2>Hi {username},</h2>
-                
-                <p>You requested to reset your password for your Auth System account. Click the button below to reset your password:</p>
-                
-                <div style="text-align: center;">
-                    <a href="{reset_link}" class="button">Reset Password</a>
-                </div>
-                
-                <p>Or copy and paste this link into your browser:</p>
-                <p style="word-break: break-all; background: #f0f0f0; padding: 10px; border-radius: 5px;">
-                    {reset_link}
-                </p>
-                
-                <div class="warning">
-                    <strong>⚠️ Important:</strong>
-                    <ul>
-                        <li>This link will expire in <strong>30 minutes</strong></li>
-                        <li>You can only use this link once</li>
-                        <li>If you didn't request this, please ignore this email</li>
-                    </ul>
-                </div>
-                
-                <p>If you're having trouble clicking the button, copy and paste the URL above into your web browser.</p>
-                
-                <p>Best regards,<br>
-                <strong>Auth System Team</strong></p>
-            </div>
-            
-            <div class="footer">
-                <p>This email was sent to you because a password reset was requested for your account.</p>
-                <p>If you did not request this password reset, please ignore this email or contact support if you have concerns.</p>
-                <p>© 2025 Auth System. All rights reserved.</p>
-            </div>
-        </body>
-        </html>
-        """
-        return html_content
+        return email_templates.render("password_reset.html", username=username, reset_link=reset_link)
     
     def create_reset_email_text(self, username: str, reset_token: str) -> str:
         """Create plain text email content for password reset"""
         reset_link = f"{self.frontend_url}/reset-password?token={reset_token}"
+        return email_templates.render("password_reset.txt", username=username, reset_link=reset_link).strip()
+    
+    def build_message(self, to_email: str, subject: str, text_content: Optional[str],
+                      html_content: Optional[str] = None) -> MIMEMultipart:
+        """Build a multipart message with plain text and/or HTML parts"""
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = self.from_email
+        msg['To'] = to_email
+        msg['Date'] = formatdate(usegmt=True)
         
-        text_content = f"""
-Reset Your Password - Auth System
-
-Hi {username},
+        if text_content:
+            msg.attach(MIMEText(text_content, 'plain', 'utf-8'))
+        if html_content:
+            msg.attach(MIMEText(html_content, 'html', 'utf-8'))
+        return msg
 
-You requested to reset your password for your Auth System account.
-
-Click the link below to reset your password:
-{reset_link}
-
-IMPORTANT:
-- This link will expire in 30 minutes
-- You can only use this link once
-- If you didn't request this, please ignore this email
-
-If you're having trouble with the link, copy and paste it into your web browser.
-
-Best regards,
-Auth System Team
-
----
-This email was sent because a password reset was requested for your account.
-If you did not request this, please ignore this email or contact support.
+    def connect(self) -> smtplib.SMTP:
+        """Open a new SMTP session, upgraded to TLS and logged in as configured"""
+        server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=self.smtp_timeout)
+        try:
+            if self.smtp_starttls:
+                server.starttls()
+            if self.smtp_username and self.smtp_password:
+                server.login(self.smtp_username, self.smtp_password)
+        except Exception:
+            server.close()
+            raise
+        return server
 
-© 2025 Auth System. All rights reserved.
+    def deliver(self, msg: MIMEMultipart) -> None:
         """
-        return text_content.strip()
-    
-    async def send_reset_email(self, email: str, username: str, reset_token: str) -> bool:
+        Send a message over a pooled SMTP session (blocking, raises on failure)
+        Called from the email queue worker's thread, never from a request
+        """
+        self.smtp_pool.send(msg)
+
+    def queue_reset_email(self, db, email: str, username: str, reset_token: str,
+                          user_id: Optional[str] = None):
         """
-        Send password reset email
-        Returns True if sent successfully, False otherwise
+        Queue the password reset email in the caller's session
+        The caller's commit makes the token and its email durable together
         """
+        from app.email_queue import enqueue_email
+
         if not self.is_configured:
-            logger.error("Cannot send email - SMTP not configured")
             # For development, log the reset link
             reset_link = f"{self.frontend_url}/reset-password?token={reset_token}"
             logger.info(f"Password reset link for {email}: {reset_link}")
-            return False
         
-        try:
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = "Reset Your Password - Auth System"
-            msg['From'] = self.from_email
-            msg['To'] = email
-            msg['Date'] = datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S +0000')
-            
-            # Create text and HTML versions
-            text_content = self.create_reset_email_text(username, reset_token)
-            html_content = self.create_reset_email_html(username, reset_token)
-            
-            # Attach parts
-            text_part = MIMEText(text_content, 'plain', 'utf-8')
-            html_part = MIMEText(html_content, 'html', 'utf-8')
-            
-            msg.attach(text_part)
-            msg.attach(html_part)
-            
-            # Send email
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
-            
-            logger.info(f"Password reset email sent successfully to {email}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to send password reset email to {email}: {e}")
-            # For development, still log the reset link
-            reset_link = f"{self.frontend_url}/reset-password?token={reset_token}"
-            logger.info(f"Password reset link for {email}: {reset_link}")
-            return False
+        return enqueue_email(
+            db,
+            template_name="password_reset",
+            recipient_email=email,
+            subject="Reset Your Password - Auth System",
+            body_text=self.create_reset_email_text(username, reset_token),
+            body_html=self.create_reset_email_html(username, reset_token),
+            user_id=user_id,
+        )
     
     def test_connection(self) -> bool:
         """Test SMTP connection"""
@@ -218,9 +116,7 @@ If you did not request this, please ignore this email or contact support.
             return False
         
         try:
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
+            self.connect().quit()
             logger.info("SMTP connection test successful")
             return True
         except Exception as e:
@@ -230,9 +126,8 @@ If you did not request this, please ignore this email or contact support.
 # Global email service instance
 email_service = EmailService()
 
-async def send_password_reset_email(email: str, username: str, reset_token: str) -> bool:
+def queue_password_reset_email(db, email: str, username: str, reset_token: str, user_id: Optional[str] = None):
     """
-    Convenience function to send password reset email
+    Convenience function to queue the password reset email
     """
-    return await email_service.send_reset_email(email, username, reset_token)
-
+    return email_service.queue_reset_email(db, email, username, reset_token, user_id=user_id)
@@ -0,0 +1,84 @@
+"""
+Email templates
+
+Bodies live as Jinja2 templates in app/templates/email, sharing the styling
+in layout.html. Templates are compiled once (warm() runs at startup) and
+kept per (template, locale); the static HTML/CSS is a constant in the
+compiled code, so rendering a message only formats its per-recipient
+fields. Set EMAIL_TEMPLATE_BYTECODE_DIR to also persist compiled bytecode
+across restarts.
+
+A locale-specific variant is looked up as "<locale>/<name>" and falls back
+to the default template.
+"""
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, select_autoescape
+
+from .logging_config import get_logger
+
+logger = get_logger("email_templates")
+
+EMAIL_TEMPLATE_DIR = os.getenv("EMAIL_TEMPLATE_DIR") or os.path.join(os.path.dirname(__file__), "templates", "email")
+EMAIL_TEMPLATE_BYTECODE_DIR = os.getenv("EMAIL_TEMPLATE_BYTECODE_DIR", "")
+EMAIL_DEFAULT_LOCALE = os.getenv("EMAIL_DEFAULT_LOCALE", "en")
+
+
+class EmailTemplates:
+    """Compiled email templates keyed by template name and locale"""
+
+    def __init__(self, template_dir: str = EMAIL_TEMPLATE_DIR, bytecode_dir: str = EMAIL_TEMPLATE_BYTECODE_DIR,
+                 default_locale: str = EMAIL_DEFAULT_LOCALE):
+        if bytecode_dir:
+            os.makedirs(bytecode_dir, exist_ok=True)
+        self.env = Environment(
+            loader=FileSystemLoader(template_dir),
+            autoescape=select_autoescape(["html"]),
+            bytecode_cache=FileSystemBytecodeCache(bytecode_dir) if bytecode_dir else None,
+            # Templates ship with the code; never stat the files again
+            auto_reload=False,
+            cache_size=-1,
+            trim_blocks=True,
+            lstrip_blocks=True,
+        )
+        self.default_locale = default_locale
+        self._compiled: Dict[Tuple[str, str], Template] = {}
+        self.compiled = 0
+        self.renders = 0
+
+    def get(self, name: str, locale: Optional[str] = None) -> Template:
+        """Compiled template for a locale, compiling it on first use"""
+        locale = locale or self.default_locale
+        key = (name, locale)
+        template = self._compiled.get(key)
+        if template is None:
+            candidates = [name] if locale == self.default_locale else [f"{locale}/{name}", name]
+            template = self.env.select_template(candidates)
+            self._compiled[key] = template
+            self.compiled += 1
+        return template
+
+    def render(self, template_name: str, locale: Optional[str] = None, **fields: Any) -> str:
+        """Render a template with the per-recipient fields"""
+        self.renders += 1
+        return self.get(template_name, locale).render(**fields)
+
+    def warm(self) -> int:
+        """Compile every default-locale template up front; returns how many"""
+        names = [name for name in self.env.list_templates(extensions=["html", "txt"]) if "/" not in name]
+        for name in names:
+            self.get(name)
+        logger.info("Email templates compiled", templates=len(names))
+        return len(names)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "compiled": self.compiled,
+            "renders": self.renders,
+            "bytecode_cache": bool(self.env.bytecode_cache),
+        }
+
+
+# Global email templates
+email_templates = EmailTemplates()
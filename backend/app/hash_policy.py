@@ -0,0 +1,73 @@
+"""
+Central password hash policy
+
+All password hashing goes through the single CryptContext defined here, so
+the bcrypt work factor is configured in one place. The cost comes from
+BCRYPT_ROUNDS, or a per-environment default (cheap for test/benchmark runs,
+full strength elsewhere).
+
+The policy sets only a minimum: a stored hash below the configured cost is
+reported by verify_and_update() and rehashed transparently on the user's
+next successful login, so the cost can be raised without a mass password
+reset. Stronger hashes are left alone; login never lowers the cost.
+
+Production refuses to start with a cost below MIN_PRODUCTION_BCRYPT_ROUNDS.
+"""
+import os
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+APP_ENV = (os.getenv("ENV") or os.getenv("APP_ENV") or os.getenv("ENVIRONMENT") or "development").lower()
+
+# Default bcrypt cost per environment (BCRYPT_ROUNDS overrides)
+DEFAULT_BCRYPT_ROUNDS = {
+    "production": 12,
+    "prod": 12,
+    "staging": 12,
+    "development": 12,
+    "test": 4,
+    "testing": 4,
+    "benchmark": 4,
+}
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS") or DEFAULT_BCRYPT_ROUNDS.get(APP_ENV, 12))
+
+# Lowest cost production will start with (the cheap profiles are for tests only)
+MIN_PRODUCTION_BCRYPT_ROUNDS = 10
+
+
+def check_rounds(rounds: int, app_env: str = APP_ENV) -> None:
+    """Fail fast when production is configured with a weak bcrypt cost"""
+    if app_env in ("prod", "production") and rounds < MIN_PRODUCTION_BCRYPT_ROUNDS:
+        raise RuntimeError(
+            f"BCRYPT_ROUNDS={rounds} is below the production minimum of {MIN_PRODUCTION_BCRYPT_ROUNDS}"
+        )
+
+
+def build_context(rounds: int) -> CryptContext:
+    """bcrypt context hashing at `rounds` and upgrading anything weaker"""
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+    )
+
+
+check_rounds(BCRYPT_ROUNDS)
+pwd_context = build_context(BCRYPT_ROUNDS)
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with the current policy"""
+    return pwd_context.hash(password)
+
+
+def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and, if the stored hash does not match the current
+    policy, also return a replacement hash (otherwise None)
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
@@ -1,14 +1,181 @@
 """
 Structured logging configuration for production environment
 """
+import atexit
 import logging
 import logging.config
+import logging.handlers
+import queue
+import random
+import re
 import structlog
 import sys
+import threading
+import time
+import uuid
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import unquote_plus
 import os
 
+# Log records are queued and written by a background thread, never on the event loop
+LOG_QUEUE_ENABLED = (os.getenv("LOG_QUEUE_ENABLED") or "true").lower() in ("1", "true", "yes", "on")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# When the queue is full: drop (count and discard the record) or block (wait for the writer)
+LOG_QUEUE_POLICY = os.getenv("LOG_QUEUE_POLICY", "drop").lower()
+LOG_QUEUE_BATCH_SIZE = int(os.getenv("LOG_QUEUE_BATCH_SIZE", 500))
+
+
+class BatchFlushMixin:
+    """Handler mixin: while deferred, flush() is left to the queue listener, once per batch"""
+    deferred = False
+
+    def flush(self):
+        if not self.deferred:
+            super().flush()
+
+    def flush_batch(self):
+        try:
+            super().flush()
+        except (OSError, ValueError):
+            # Stream already closed (interpreter shutdown); logging.shutdown ignores these too
+            pass
+
+
+class BatchStreamHandler(BatchFlushMixin, logging.StreamHandler):
+    pass
+
+
+class BatchRotatingFileHandler(BatchFlushMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+
+class QueueingHandler(logging.Handler):
+    """Puts records on the log queue together with the handlers that should write them"""
+
+    def __init__(self, log_queue: "LogQueue", targets: Tuple[logging.Handler, ...]):
+        super().__init__()
+        self.log_queue = log_queue
+        self.targets = targets
+
+    def emit(self, record):
+        try:
+            # Resolve args now: they may change once the call returns. exc_info stays for the formatters.
+            record.msg = record.getMessage()
+            record.args = None
+            self.log_queue.put(record, self.targets)
+        except Exception:
+            self.handleError(record)
+
+
+class LogQueue:
+    """Bounded queue drained in batches by one writer thread"""
+
+    def __init__(self, maxsize: int = LOG_QUEUE_SIZE, policy: str = LOG_QUEUE_POLICY,
+                 batch_size: int = LOG_QUEUE_BATCH_SIZE):
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self.policy = policy
+        self.batch_size = batch_size
+        self.handlers: Tuple[logging.Handler, ...] = ()
+        self._thread = None
+        self.written = 0
+        self.batches = 0
+        self.dropped: Dict[str, int] = {}
+        # put() runs on every logging thread; the read-modify-write of a drop count needs the lock
+        self._dropped_lock = threading.Lock()
+
+    def install(self, logger_names) -> None:
+        """Route the given loggers' handlers through the queue"""
+        self.stop()
+        by_targets: Dict[Tuple[logging.Handler, ...], QueueingHandler] = {}
+        handlers = {}
+        for name in logger_names:
+            logger = logging.getLogger(name)
+            targets = tuple(logger.handlers)
+            if not targets:
+                continue
+            for handler in targets:
+                handlers[id(handler)] = handler
+            if targets not in by_targets:
+                by_targets[targets] = QueueingHandler(self, targets)
+            logger.handlers = [by_targets[targets]]
+        self.handlers = tuple(handlers.values())
+        self.start()
+
+    def put(self, record, targets) -> None:
+        if self.policy == "block":
+            self.queue.put((record, targets))
+            return
+        try:
+            self.queue.put_nowait((record, targets))
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped[record.levelname] = self.dropped.get(record.levelname, 0) + 1
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        for handler in self.handlers:
+            if isinstance(handler, BatchFlushMixin):
+                handler.deferred = True
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write out everything queued, then stop the writer thread"""
+        if self._thread is None:
+            return
+        self.queue.put(None)
+        self._thread.join(timeout=10)
+        self._thread = None
+        for handler in self.handlers:
+            if isinstance(handler, BatchFlushMixin):
+                handler.deferred = False
+                handler.flush_batch()
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            batch = [item]
+            while item is not None and len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+            for entry in batch:
+                if entry is None:
+                    break
+                record, targets = entry
+                for handler in targets:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            for handler in self.handlers:
+                if isinstance(handler, BatchFlushMixin):
+                    handler.flush_batch()
+            self.written += len(batch) - (batch[-1] is None)
+            self.batches += 1
+            if batch[-1] is None:
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        with self._dropped_lock:
+            dropped = dict(self.dropped)
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "queued": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "policy": self.policy,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": dropped,
+        }
+
+
+# Global log queue (installed by setup_logging)
+log_queue = LogQueue()
+atexit.register(log_queue.stop)
+
 def setup_logging():
     """Configure structured logging for the application"""
     
@@ -32,13 +199,13 @@ def setup_logging():
         },
         'handlers': {
             'console': {
-                'class': 'logging.StreamHandler',
+                'class': 'app.logging_config.BatchStreamHandler',
                 'level': log_level,
                 'formatter': 'standard',
                 'stream': sys.stdout
             },
             'file': {
-                'class': 'logging.handlers.RotatingFileHandler',
+                'class': 'app.logging_config.BatchRotatingFileHandler',
                 'level': log_level,
                 'formatter': 'json' if environment == 'production' else 'standard',
                 'filename': 'logs/app.log',
@@ -46,7 +213,7 @@ def setup_logging():
                 'backupCount': 5
             },
             'error_file': {
-                'class': 'logging.handlers.RotatingFileHandler',
+                'class': 'app.logging_config.BatchRotatingFileHandler',
                 'level': 'ERROR',
                 'formatter': 'json' if environment == 'production' else 'standard',
                 'filename': 'logs/error.log',
@@ -86,12 +253,16 @@ def setup_logging():
     # Create logs directory if it doesn't exist
     os.makedirs('logs', exist_ok=True)
     
-    # Apply logging configuration
+    # Apply logging configuration (after the writer thread let go of the old handlers)
+    log_queue.stop()
     logging.config.dictConfig(logging_config)
+    if LOG_QUEUE_ENABLED:
+        log_queue.install(logging_config['loggers'])
     
     # Configure structlog
     structlog.configure(
         processors=[
+            structlog.contextvars.merge_contextvars,  # request_id bound by RequestLoggingMiddleware
             structlog.stdlib.filter_by_level,
             structlog.stdlib.add_logger_name,
             structlog.stdlib.add_log_level,
@@ -113,85 +284,206 @@ def get_logger(name: str = None):
     return structlog.get_logger(name)
 
 # Request logging middleware
+# Incoming X-Request-ID values are reused only if they look like an ID
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+# Share of successful requests that get an access log line (errors and slow requests always do)
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_SAMPLE_RATE", 1.0))
+# Per path prefix, e.g. "/health=0.01,/api/notifications/stream=0"; the longest matching prefix wins
+REQUEST_LOG_PATH_SAMPLE_RATES = os.getenv("REQUEST_LOG_PATH_SAMPLE_RATES", "/health=0.01")
+REQUEST_LOG_SLOW_MS = float(os.getenv("REQUEST_LOG_SLOW_MS", 1000))
+# Also log a "Request started" line (off: one line per request)
+REQUEST_LOG_START_LINE = (os.getenv("REQUEST_LOG_START_LINE") or "false").lower() in ("1", "true", "yes", "on")
+# Query parameters whose values never reach the access log (names compared case-insensitively)
+REDACTED_QUERY_PARAMS = frozenset(
+    name.strip().lower()
+    for name in os.getenv(
+        "REQUEST_LOG_REDACTED_PARAMS",
+        "access_token,refresh_token,id_token,token,ticket,password,secret,api_key,apikey,key,signature,code"
+    ).split(",")
+    if name.strip()
+)
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse "prefix=rate,prefix=rate" into {prefix: rate}"""
+    rates = {}
+    for item in spec.split(","):
+        prefix, _, rate = item.strip().partition("=")
+        try:
+            rates[prefix] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+class RequestLogSampler:
+    """Decides which requests get access log lines; settings can change at runtime"""
+
+    def __init__(self, default_rate: float = REQUEST_LOG_SAMPLE_RATE,
+                 path_rates: Optional[Dict[str, float]] = None, slow_ms: float = REQUEST_LOG_SLOW_MS,
+                 log_start: bool = REQUEST_LOG_START_LINE):
+        self.logged = 0
+        self.skipped = 0
+        self.configure(
+            default_rate=default_rate,
+            path_rates=parse_sample_rates(REQUEST_LOG_PATH_SAMPLE_RATES) if path_rates is None else path_rates,
+            slow_ms=slow_ms,
+            log_start=log_start,
+        )
+
+    def configure(self, default_rate: Optional[float] = None, path_rates: Optional[Dict[str, float]] = None,
+                  slow_ms: Optional[float] = None, log_start: Optional[bool] = None) -> None:
+        """Replace the given settings; None leaves a setting unchanged"""
+        if default_rate is not None:
+            self.default_rate = default_rate
+        if path_rates is not None:
+            self.path_rates = dict(path_rates)
+            # Longest prefix first so "/api/notifications/stream" beats "/api"
+            self._prefixes = tuple(sorted(self.path_rates.items(), key=lambda item: len(item[0]), reverse=True))
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+            self.slow_seconds = slow_ms / 1000
+        if log_start is not None:
+            self.log_start = log_start
+
+    def rate_for(self, path: str) -> float:
+        for prefix, rate in self._prefixes:
+            if path.startswith(prefix):
+                return rate
+        return self.default_rate
+
+    def sample(self, path: str) -> bool:
+        """Per-request draw, made once when the request starts"""
+        rate = self.rate_for(path)
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+    def should_log(self, sampled: bool, status_code: int, duration_seconds: float) -> bool:
+        if sampled or status_code >= 400 or duration_seconds >= self.slow_seconds:
+            self.logged += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def settings(self) -> Dict[str, Any]:
+        return {
+            "default_rate": self.default_rate,
+            "path_rates": dict(self.path_rates),
+            "slow_ms": self.slow_ms,
+            "log_start": self.log_start,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.settings(), "logged": self.logged, "skipped": self.skipped}
+
+
+# Global request log sampler (adjusted at runtime through /admin/request-logging)
+request_log_sampler = RequestLogSampler()
+
+
+def redact_query_string(query_string: str) -> str:
+    """Replace the values of credential-bearing parameters with [REDACTED]"""
+    if "=" not in query_string:
+        return query_string
+    pairs = query_string.split("&")
+    for i, pair in enumerate(pairs):
+        name, sep, _ = pair.partition("=")
+        if sep and unquote_plus(name).lower() in REDACTED_QUERY_PARAMS:
+            pairs[i] = f"{name}=[REDACTED]"
+    return "&".join(pairs)
+
+
+def get_request_id(request) -> str:
+    """request_id assigned by RequestLoggingMiddleware (a new one outside it)"""
+    return request.scope.get("state", {}).get("request_id") or str(uuid.uuid4())
+
+
 class RequestLoggingMiddleware:
-    def __init__(self, app):
+    """
+    Request ID, timing and access logging in one pure ASGI pass
+
+    The request ID comes from a well-formed X-Request-ID header or a new
+    uuid4. It is stored in scope["state"] (request.state.request_id, also
+    seen by the exception handlers), bound into structlog's context for every
+    log line of the request and returned as X-Request-ID. One line is logged
+    when the response starts, for the share of requests picked by the
+    sampler plus every error (status >= 400) and slow request, and always on
+    an unhandled exception.
+    """
+
+    def __init__(self, app, sampler: RequestLogSampler = request_log_sampler):
         self.app = app
         self.logger = get_logger("request")
+        self.sampler = sampler
 
     async def __call__(self, scope, receive, send):
-        if scope["type"] == "http":
-            start_time = datetime.now()
-            
-            # Extract request info
-            method = scope.get("method", "")
-            path = scope.get("path", "")
-            query_string = scope.get("query_string", b"").decode()
-            client_ip = None
-            
-            # Get client IP from headers
-            for header_name, header_value in scope.get("headers", []):
-                if header_name == b"x-forwarded-for":
-                    client_ip = header_value.decode().split(",")[0].strip()
-                    break
-                elif header_name == b"x-real-ip":
-                    client_ip = header_value.decode()
-                    break
-            
-            if not client_ip:
-                client = scope.get("client")
-                client_ip = client[0] if client else "unknown"
-            
-            # Log request start
-            self.logger.info(
-                "Request started",
-                method=method,
-                path=path,
-                query_string=query_string,
-                client_ip=client_ip
-            )
-            
-            # Process request
-            status_code = 500  # Default to error
-            
-            async def send_wrapper(message):
-                nonlocal status_code
-                if message["type"] == "http.response.start":
-                    status_code = message.get("status", 500)
-                await send(message)
-            
-            try:
-                await self.app(scope, receive, send_wrapper)
-            except Exception as e:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        sampler = self.sampler
+        sampled = sampler.sample(scope["path"])
+        request_id = client_ip = None
+        for header_name, header_value in scope.get("headers", []):
+            if header_name == b"x-request-id" and request_id is None:
+                candidate = header_value.decode("latin-1")
+                if REQUEST_ID_PATTERN.match(candidate):
+                    request_id = candidate
+            elif header_name == b"x-forwarded-for" and client_ip is None:
+                client_ip = header_value.decode("latin-1").split(",")[0].strip()
+            elif header_name == b"x-real-ip" and client_ip is None:
+                client_ip = header_value.decode("latin-1")
+        if request_id is None:
+            request_id = str(uuid.uuid4())
+        if not client_ip:
+            client = scope.get("client")
+            client_ip = client[0] if client else "unknown"
+
+        scope.setdefault("state", {})["request_id"] = request_id
+        context_tokens = structlog.contextvars.bind_contextvars(request_id=request_id)
+        request_id_header = (b"x-request-id", request_id.encode("latin-1"))
+        responded = False
+        if sampled and sampler.log_start:
+            self.logger.info("Request started", method=scope["method"], path=scope["path"], client_ip=client_ip)
+
+        async def send_wrapper(message):
+            nonlocal responded
+            if message["type"] == "http.response.start":
+                responded = True
+                message["headers"] = [*message.get("headers", ()), request_id_header]
+                status_code = message["status"]
+                duration = time.perf_counter() - start_time
+                # Unsampled successes skip the log call entirely, so nothing is rendered for them
+                if sampler.should_log(sampled, status_code, duration):
+                    log = self.logger.error if status_code >= 500 else self.logger.warning if status_code >= 400 else self.logger.info
+                    log(
+                        "Request completed",
+                        method=scope["method"],
+                        path=scope["path"],
+                        query_string=redact_query_string(scope.get("query_string", b"").decode("latin-1")),
+                        status_code=status_code,
+                        duration_seconds=round(duration, 6),
+                        client_ip=client_ip,
+                        sampled=sampled
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            if not responded:
                 self.logger.error(
                     "Request failed with exception",
-                    method=method,
-                    path=path,
+                    method=scope["method"],
+                    path=scope["path"],
                     client_ip=client_ip,
+                    duration_seconds=round(time.perf_counter() - start_time, 6),
                     error=str(e),
                     exc_info=True
                 )
-                raise
-            finally:
-                # Log request completion
-                end_time = datetime.now()
-                duration = (end_time - start_time).total_seconds()
-                
-                log_level = "info"
-                if status_code >= 500:
-                    log_level = "error"
-                elif status_code >= 400:
-                    log_level = "warning"
-                
-                getattr(self.logger, log_level)(
-                    "Request completed",
-                    method=method,
-                    path=path,
-                    status_code=status_code,
-                    duration_seconds=duration,
-                    client_ip=client_ip
-                )
-        else:
-            await self.app(scope, receive, send)
+            raise
+        finally:
+            structlog.contextvars.reset_contextvars(**context_tokens)
 
 # Database logging
 def log_database_operation(operation: str, table: str, details: Dict[str, Any] = None):
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Date
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Date, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
@@ -15,6 +15,8 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_login = Column(DateTime, nullable=True)
+    # Bumped whenever issued access tokens must stop being trusted
+    token_version = Column(Integer, default=0, nullable=False, server_default="0")
     
     # Bidirectional One-to-One relationship with hr_employees
     employee_id = Column(Integer, unique=True, nullable=True)  # Foreign Key to hr_employees.employee_id
@@ -22,6 +24,11 @@ class User(Base):
     # Relationship to password reset tokens
     password_reset_tokens = relationship("PasswordResetToken", back_populates="user", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Keyset pagination for the user list (ORDER BY created_at DESC, id DESC)
+        Index("ix_users_created_at_id", created_at.desc(), id.desc()),
+    )
+
 class PasswordResetToken(Base):
     __tablename__ = "password_reset_tokens"
     
@@ -36,3 +43,86 @@ class PasswordResetToken(Base):
     # Relationship to user
     user = relationship("User", back_populates="password_reset_tokens")
 
+
+class Notification(Base):
+    __tablename__ = "notifications"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String(50), nullable=False)  # employee_added, assignment_completed, ...
+    recipient_user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    title = Column(String(200), nullable=False)
+    message = Column(Text, nullable=False)
+    action_url = Column(String(500), nullable=True)
+    read = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    employee_id = Column(Integer, ForeignKey("hr_employees.employee_id", ondelete="SET NULL"), nullable=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+
+    # Newest-first paging per recipient, with and without the unread filter
+    __table_args__ = (
+        Index("ix_notifications_recipient_read_created", recipient_user_id, read, created_at.desc(), id.desc()),
+        Index("ix_notifications_recipient_created", recipient_user_id, created_at.desc(), id.desc()),
+        # Retention: WHERE read AND created_at < cutoff
+        Index("ix_notifications_created_at", created_at),
+    )
+
+class NotificationCounter(Base):
+    """Materialized unread notification count per user (see app/notification_counters.py)"""
+    __tablename__ = "notification_counters"
+    
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class EmailLog(Base):
+    """Outbound email: queued by request handlers, delivered by the email queue worker"""
+    __tablename__ = "email_logs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    template_name = Column(String(100), nullable=False)
+    recipient_email = Column(String(255), nullable=False)
+    subject = Column(String(500), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+    status = Column(String(20), default="queued", nullable=False)  # queued, sending, sent, failed
+    employee_id = Column(Integer, ForeignKey("hr_employees.employee_id", ondelete="SET NULL"), nullable=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    # Delivery state (bodies are cleared once the message is sent or given up on)
+    body_text = Column(Text, nullable=True)
+    body_html = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # Worker poll: WHERE status IN (...) AND next_attempt_at <= now ORDER BY next_attempt_at
+        Index("ix_email_logs_status_next_attempt", "status", "next_attempt_at"),
+        # Retention: WHERE created_at < cutoff ORDER BY id
+        Index("ix_email_logs_created_at", "created_at"),
+    )
+
+class EmailLogArchive(Base):
+    """Sent or failed emails moved out of email_logs by the retention job (no FKs, outlives users)"""
+    __tablename__ = "email_logs_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    template_name = Column(String(100), nullable=False)
+    recipient_email = Column(String(255), nullable=False)
+    subject = Column(String(500), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+    status = Column(String(20), nullable=False)
+    employee_id = Column(Integer, nullable=True)
+    user_id = Column(String, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class RateLimitCounter(Base):
+    """Shared sliding-window counters (see app/rate_limiter.py); UNLOGGED on PostgreSQL"""
+    __tablename__ = "rate_limit_counters"
+    
+    bucket_key = Column(String(255), primary_key=True)
+    window_start = Column(BigInteger, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+    expires_at = Column(BigInteger, nullable=False, index=True)  # epoch seconds
@@ -0,0 +1,205 @@
+"""
+Materialized unread notification counters
+
+The notification bell reads a user's unread count constantly. Instead of a
+COUNT(*) over notifications per read, notification_counters keeps one row
+per user that is adjusted in the same transaction as the change:
+
+    new notification          +1   (NotificationService.create_bulk_notifications)
+    marked read / mark all    -n
+    unread one deleted        -1
+
+A user without a row yet is materialized from notifications on first read
+or first adjustment.
+NotificationCounterReconciler periodically recomputes counters from the
+notifications table to correct drift (e.g. rows changed by hand). It skips
+counters touched within NOTIFICATION_COUNTER_RECONCILE_GRACE_SECONDS so it
+never overwrites an adjustment whose transaction is still in flight.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from sqlalchemy import case, exists, func, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import AsyncSessionLocal
+from .logging_config import get_logger
+from .models import Notification, NotificationCounter
+
+logger = get_logger("notification_counters")
+
+NOTIFICATION_COUNTER_RECONCILE_ENABLED = (os.getenv("NOTIFICATION_COUNTER_RECONCILE_ENABLED") or "true").lower() in ("1", "true", "yes", "on")
+NOTIFICATION_COUNTER_RECONCILE_SECONDS = float(os.getenv("NOTIFICATION_COUNTER_RECONCILE_SECONDS", 900))
+NOTIFICATION_COUNTER_RECONCILE_GRACE_SECONDS = float(os.getenv("NOTIFICATION_COUNTER_RECONCILE_GRACE_SECONDS", 60))
+
+
+def _insert(db: AsyncSession):
+    """Dialect insert() with ON CONFLICT support"""
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(NotificationCounter)
+
+
+def _actual_unread(user_id_column) -> Any:
+    return (
+        select(func.count(Notification.id))
+        .where(Notification.recipient_user_id == user_id_column, Notification.read == False)
+        .scalar_subquery()
+    )
+
+
+async def adjust_unread(db: AsyncSession, user_ids: Iterable[str], delta: int) -> None:
+    """
+    Add delta to each user's counter in the caller's transaction (the caller commits)
+    Call it after writing the notification changes it accounts for: a user
+    without a counter row yet gets one seeded from the actual unread count,
+    which already includes them, instead of starting from delta.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids or not delta:
+        return
+    now = datetime.utcnow()
+    new_count = NotificationCounter.unread_count + delta
+    adjusted = case((new_count < 0, 0), else_=new_count)
+
+    updated = set((await db.execute(
+        update(NotificationCounter)
+        .where(NotificationCounter.user_id.in_(user_ids))
+        .values(unread_count=adjusted, updated_at=now)
+        .returning(NotificationCounter.user_id)
+        .execution_options(synchronize_session=False)
+    )).scalars())
+    missing = [user_id for user_id in user_ids if user_id not in updated]
+    if not missing:
+        return
+
+    # COUNT(*) only for users without a row; a row created concurrently is adjusted instead
+    statement = _insert(db).values([
+        {"user_id": user_id, "unread_count": _actual_unread(literal(user_id)), "updated_at": now}
+        for user_id in missing
+    ])
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[NotificationCounter.user_id],
+        set_={"unread_count": adjusted, "updated_at": now},
+    ))
+
+
+async def get_unread_count(db: AsyncSession, user_id: str) -> int:
+    """Unread count from the counter row, materializing it on first use"""
+    count = await db.scalar(
+        select(NotificationCounter.unread_count).where(NotificationCounter.user_id == user_id)
+    )
+    if count is not None:
+        return count
+
+    count = await db.scalar(
+        select(func.count(Notification.id)).where(
+            Notification.recipient_user_id == user_id,
+            Notification.read == False
+        )
+    ) or 0
+    await db.execute(
+        _insert(db)
+        .values(user_id=user_id, unread_count=count, updated_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=[NotificationCounter.user_id])
+    )
+    await db.commit()
+    return count
+
+
+async def reconcile_counters(db: AsyncSession, grace_seconds: float = NOTIFICATION_COUNTER_RECONCILE_GRACE_SECONDS) -> int:
+    """Recompute drifted counters from notifications; returns how many rows were corrected"""
+    now = datetime.utcnow()
+    settled = now - timedelta(seconds=grace_seconds)
+    actual = _actual_unread(NotificationCounter.user_id)
+
+    corrected = (await db.execute(
+        update(NotificationCounter)
+        .where(NotificationCounter.updated_at < settled, NotificationCounter.unread_count != actual)
+        .values(unread_count=actual, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )).rowcount or 0
+
+    missing = (await db.execute(
+        _insert(db)
+        .from_select(
+            ["user_id", "unread_count", "updated_at"],
+            select(Notification.recipient_user_id, func.count(Notification.id), literal(now))
+            .where(
+                Notification.read == False,
+                ~exists().where(NotificationCounter.user_id == Notification.recipient_user_id),
+            )
+            .group_by(Notification.recipient_user_id)
+        )
+        .on_conflict_do_nothing(index_elements=[NotificationCounter.user_id])
+    )).rowcount or 0
+
+    await db.commit()
+    return corrected + max(missing, 0)
+
+
+class NotificationCounterReconciler:
+    """Background task that periodically runs reconcile_counters"""
+
+    def __init__(self, session_factory: Callable = AsyncSessionLocal,
+                 interval_seconds: float = NOTIFICATION_COUNTER_RECONCILE_SECONDS):
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.corrected = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="notification-counter-reconciler")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("Notification counter reconciliation failed", error=str(e))
+
+    async def run_once(self) -> int:
+        async with self.session_factory() as db:
+            corrected = await reconcile_counters(db)
+        self.runs += 1
+        self.corrected += corrected
+        self.last_run_at = datetime.utcnow()
+        if corrected:
+            logger.warning("Corrected drifted notification counters", corrected=corrected)
+        return corrected
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "runs": self.runs,
+            "corrected": self.corrected,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_error": self.last_error,
+        }
+
+
+# Global counter reconciler
+notification_counter_reconciler = NotificationCounterReconciler()
@@ -0,0 +1,161 @@
+"""
+Push delivery of notification events
+
+NotificationBroker is an in-process pub/sub keyed by recipient user id. The
+SSE endpoint (GET /api/notifications/stream) subscribes one bounded queue per
+open connection, and NotificationService publishes after its commits:
+
+    notification    a new notification record
+    unread_count    {"delta": n}, applied by the client to its unread badge
+
+With several workers a client is connected to only one of them, so
+NOTIFICATION_PUBSUB_BACKEND=postgres routes every publish through
+PostgreSQL NOTIFY on one channel; each worker LISTENs on a dedicated
+asyncpg connection and dispatches to its own subscribers.
+
+A subscriber that stops reading loses events once its queue is full instead
+of holding memory; it gets the exact count again on reconnect.
+"""
+import asyncio
+import json
+import os
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger("notification_events")
+
+NOTIFICATION_PUBSUB_BACKEND = os.getenv("NOTIFICATION_PUBSUB_BACKEND", "memory").lower()
+NOTIFICATION_PG_CHANNEL = os.getenv("NOTIFICATION_PG_CHANNEL", "notification_events")
+NOTIFICATION_STREAM_QUEUE_SIZE = int(os.getenv("NOTIFICATION_STREAM_QUEUE_SIZE", 100))
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = float(os.getenv("NOTIFICATION_STREAM_HEARTBEAT_SECONDS", 15))
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+_PG_PAYLOAD_LIMIT = 7900
+
+Event = Tuple[str, str, Dict[str, Any]]  # (user_id, event, data)
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str, separators=(',', ':'))}\n\n"
+
+
+class NotificationBroker:
+    """Fan notification events out to the open streams of each user"""
+
+    def __init__(self, backend: str = NOTIFICATION_PUBSUB_BACKEND, dsn: Optional[str] = None,
+                 channel: str = NOTIFICATION_PG_CHANNEL, queue_size: int = NOTIFICATION_STREAM_QUEUE_SIZE):
+        self.backend = backend
+        self.dsn = dsn
+        self.channel = channel
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._connection = None
+        self._publish_lock: Optional[asyncio.Lock] = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    async def start(self) -> None:
+        """Start listening on PostgreSQL when that backend is configured"""
+        if self.backend != "postgres" or self._connection is not None:
+            return
+        import asyncpg
+
+        if self.dsn is None:
+            from .database import DATABASE_URL
+            self.dsn = DATABASE_URL
+        try:
+            self._connection = await asyncpg.connect(self.dsn)
+            await self._connection.add_listener(self.channel, self._on_pg_notify)
+            self._publish_lock = asyncio.Lock()
+            logger.info("Listening for notification events", channel=self.channel)
+        except Exception as e:
+            # Streams still work for clients connected to this worker
+            self._connection = None
+            logger.error("Notification LISTEN failed, publishing in-process only", error=str(e))
+
+    async def stop(self) -> None:
+        if self._connection is None:
+            return
+        try:
+            await self._connection.close()
+        except Exception as e:
+            logger.warning("Closing notification listener failed", error=str(e))
+        self._connection = None
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    async def publish(self, user_id: str, event: str, data: Dict[str, Any]) -> None:
+        await self.publish_many([(user_id, event, data)])
+
+    async def publish_many(self, events: Iterable[Event]) -> None:
+        """Publish committed events; never raises, delivery is best effort"""
+        events = list(events)
+        if not events:
+            return
+        self.published += len(events)
+
+        if self._connection is None:
+            for user_id, event, data in events:
+                self._dispatch(user_id, event, data)
+            return
+
+        try:
+            async with self._publish_lock:
+                for user_id, event, data in events:
+                    await self._connection.execute("SELECT pg_notify($1, $2)", self.channel,
+                                                   self._pg_payload(user_id, event, data))
+        except Exception as e:
+            logger.error("Publishing notification events failed", error=str(e), events=len(events))
+
+    def _pg_payload(self, user_id: str, event: str, data: Dict[str, Any]) -> str:
+        payload = json.dumps({"user_id": user_id, "event": event, "data": data}, default=str)
+        if len(payload.encode("utf-8")) > _PG_PAYLOAD_LIMIT:
+            # Clients fetch the full notification when the body does not fit
+            data = {key: value for key, value in data.items() if key != "message"}
+            data["truncated"] = True
+            payload = json.dumps({"user_id": user_id, "event": event, "data": data}, default=str)
+        return payload
+
+    def _on_pg_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            message = json.loads(payload)
+            self._dispatch(message["user_id"], message["event"], message["data"])
+        except Exception as e:
+            logger.warning("Ignoring malformed notification event", error=str(e))
+
+    def _dispatch(self, user_id: str, event: str, data: Dict[str, Any]) -> None:
+        for queue in tuple(self._subscribers.get(user_id, ())):
+            try:
+                queue.put_nowait((event, data))
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend if self._connection is not None else "memory",
+            "users": len(self._subscribers),
+            "streams": sum(len(queues) for queues in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+# Global notification broker
+notification_broker = NotificationBroker()
@@ -0,0 +1,100 @@
+"""
+Keyset (cursor) pagination helpers
+
+List endpoints page with "WHERE (sort_key, id) < (:last_sort_key, :last_id)
+ORDER BY sort_key DESC, id DESC LIMIT :n" instead of OFFSET, so every page
+is an index range scan no matter how deep the client pages. The position is
+handed to the client as an opaque, URL-safe cursor string.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def encode_cursor(sort_value: Any, row_id: Any, kind: Optional[str] = None) -> str:
+    """
+    Encode the last row's (sort key, id) as an opaque cursor
+    kind tags cursors of endpoints with more than one sort order, so a cursor
+    from one ordering cannot be replayed against another
+    """
+    if isinstance(sort_value, datetime):
+        sort_value = {"dt": sort_value.isoformat()}
+    position = [sort_value, row_id] if kind is None else [sort_value, row_id, kind]
+    payload = json.dumps(position, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: Optional[str] = None) -> Tuple[Any, Any]:
+    """Decode a cursor produced by encode_cursor, 400 if it is malformed or of another kind"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        sort_value, row_id = position[:2]
+        cursor_kind = position[2] if len(position) == 3 else None
+        if isinstance(sort_value, dict):
+            sort_value = datetime.fromisoformat(sort_value["dt"])
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    if cursor_kind != kind:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor does not belong to this query"
+        )
+    return sort_value, row_id
+
+
+def parse_fields(fields: Optional[str], allowed: Tuple[str, ...], required: Tuple[str, ...] = ("id",)) -> Tuple[str, ...]:
+    """
+    Parse a comma-separated fields= projection against a whitelist
+    Returns every allowed field when no projection was requested
+    """
+    if not fields:
+        return allowed
+
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    return tuple(name for name in allowed if name in requested or name in required)
+
+
+async def estimate_row_count(db: AsyncSession, table: str, where_sql: str = "", params: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Cheap row count for list totals
+
+    On PostgreSQL this reads the planner statistics (pg_class.reltuples for
+    the whole table, the EXPLAIN row estimate when filtered) instead of
+    scanning. Other databases fall back to an exact COUNT(*).
+    """
+    params = params or {}
+    where_clause = f" WHERE {where_sql}" if where_sql else ""
+
+    if db.bind.dialect.name == "postgresql":
+        if not where_sql:
+            estimate = (await db.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+                {"table": table}
+            )).scalar()
+            # -1 means the table was never analyzed
+            if estimate is not None and estimate >= 0:
+                return int(estimate)
+        else:
+            plan = (await db.execute(
+                text(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {table}{where_clause}"), params
+            )).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+
+    return int((await db.execute(text(f"SELECT COUNT(*) FROM {table}{where_clause}"), params)).scalar() or 0)
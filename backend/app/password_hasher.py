@@ -0,0 +1,116 @@
+"""
+Bounded worker pool for password hashing and verification
+
+bcrypt is deliberately slow (hundreds of milliseconds per call), and the
+endpoints that use it are async, so calling passlib directly blocks the event
+loop and stalls every other request on the worker. These helpers run the
+work on a dedicated thread pool instead (bcrypt releases the GIL while it
+works).
+
+The pool is bounded: once PASSWORD_HASH_WORKERS calls are running and
+PASSWORD_HASH_MAX_QUEUE more are waiting, new calls fail fast with 503 rather
+than queueing behind a login burst.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from .auth import get_password_hash, verify_password, verify_password_and_update
+from .hash_policy import BCRYPT_ROUNDS
+from .logging_config import get_logger
+
+logger = get_logger("password_hasher")
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 32))
+
+
+class PasswordHasher:
+    """Runs hash/verify calls on a bounded thread pool with an async API"""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self.in_flight = 0
+        self.peak_queue_depth = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.workers)
+
+    @staticmethod
+    def _timed(func: Callable, submitted_at: float, *args):
+        started_at = time.perf_counter()
+        result = func(*args)
+        return result, started_at - submitted_at, time.perf_counter() - started_at
+
+    async def _run(self, func: Callable, *args) -> Any:
+        # Counters are only touched from the event loop thread
+        if self.in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            logger.warning("Password hash pool saturated", in_flight=self.in_flight, queue_depth=self.queue_depth)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        self.in_flight += 1
+        self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth)
+        try:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            loop = asyncio.get_running_loop()
+            result, waited, ran = await loop.run_in_executor(
+                self._executor, self._timed, func, time.perf_counter(), *args
+            )
+            self.total_wait_seconds += waited
+            self.total_run_seconds += ran
+            return result
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        """Hash a password off the event loop"""
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password off the event loop"""
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password off the event loop, rehashing it if the policy changed"""
+        return await self._run(verify_password_and_update, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "peak_queue_depth": self.peak_queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            "avg_run_ms": round(self.total_run_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+        }
+
+
+# Global password hashing pool
+password_hasher = PasswordHasher()
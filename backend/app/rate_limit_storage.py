@@ -0,0 +1,194 @@
+"""
+Shared storage for the slowapi limiter
+
+limits' default memory:// storage counts per process, so with N workers or
+replicas every "5/minute" really allows 5 × N. SyncedCounterStorage (scheme
+appdb://) keeps the cluster-wide count in the rate_limit_counters table
+(see app/rate_limiter.py) without a database round trip per request:
+
+- incr/get only touch an in-process table of counters
+- a background thread flushes the local deltas every
+  RATE_LIMIT_SYNC_SECONDS in ONE multi-row upsert (atomic count = count + n)
+  and reads back the cluster totals from its RETURNING clause
+- expired windows are dropped locally on each flush and deleted from the
+  table at most every RATE_LIMIT_PURGE_SECONDS
+
+Windows are aligned to the clock so every process agrees on them. Between
+syncs a key can overshoot by what the other processes admitted in the last
+interval; if the database is unreachable each process keeps limiting on its
+own counts until it comes back.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+from limits.storage import Storage
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+
+from .logging_config import get_logger
+from .models import RateLimitCounter
+from .rate_limiter import RATE_LIMIT_PURGE_SECONDS
+
+logger = get_logger("rate_limit_storage")
+
+RATE_LIMIT_SYNC_SECONDS = float(os.getenv("RATE_LIMIT_SYNC_SECONDS", 1.0))
+
+
+class SyncedCounterStorage(Storage):
+    """limits storage backed by local counters synced to the rate_limit_counters table"""
+
+    STORAGE_SCHEME = ["appdb"]
+
+    def __init__(self, uri: str = None, wrap_exceptions: bool = False, engine=None,
+                 sync_seconds: float = RATE_LIMIT_SYNC_SECONDS,
+                 purge_seconds: float = RATE_LIMIT_PURGE_SECONDS, **options):
+        if engine is None:
+            from .database import engine
+        self.engine = engine
+        self.sync_seconds = float(sync_seconds)
+        self.purge_seconds = float(purge_seconds)
+        # key -> [window_start, expiry_seconds, shared count at last sync, local hits not yet flushed]
+        self._counters: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._last_purge = 0.0
+        self.syncs = 0
+        self.sync_errors = 0
+        self.last_error = None
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return SQLAlchemyError
+
+    def _entry(self, key: str, expiry: int, now: float) -> list:
+        window_start = int(now // expiry) * expiry
+        entry = self._counters.get(key)
+        if entry is None or entry[0] != window_start or entry[1] != expiry:
+            entry = self._counters[key] = [window_start, expiry, 0, 0]
+        return entry
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        with self._lock:
+            entry = self._entry(key, int(expiry), time.time())
+            entry[3] += amount
+            count = entry[2] + entry[3]
+        self._ensure_sync_thread()
+        return count
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is None or entry[0] + entry[1] <= time.time():
+                return 0
+            return entry[2] + entry[3]
+
+    def get_expiry(self, key: str) -> float:
+        with self._lock:
+            entry = self._counters.get(key)
+        if entry is None:
+            return time.time()
+        return float(entry[0] + entry[1])
+
+    def check(self) -> bool:
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(select(1))
+            return True
+        except SQLAlchemyError:
+            return False
+
+    def reset(self) -> int:
+        with self._lock:
+            cleared = len(self._counters)
+            self._counters.clear()
+        with self.engine.begin() as conn:
+            conn.execute(delete(RateLimitCounter).where(RateLimitCounter.bucket_key.like("LIMITER/%")))
+        return cleared
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._counters.pop(key, None)
+        with self.engine.begin() as conn:
+            conn.execute(delete(RateLimitCounter).where(RateLimitCounter.bucket_key == key))
+
+    def _ensure_sync_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stopped.clear()
+                    self._thread = threading.Thread(target=self._run, name="rate-limit-sync", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.sync_seconds):
+            try:
+                self.sync()
+            except Exception as e:
+                self.sync_errors += 1
+                self.last_error = str(e)
+                logger.error("Rate limit sync failed, limiting on local counts", error=str(e))
+
+    def stop(self) -> None:
+        """Stop the sync thread after a final flush"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.sync_seconds + 5)
+            self._thread = None
+        try:
+            self.sync()
+        except Exception as e:
+            logger.error("Final rate limit sync failed", error=str(e))
+
+    def sync(self) -> int:
+        """Flush local hits and refresh shared counts for live windows; returns keys synced"""
+        now = time.time()
+        with self._lock:
+            for key in [key for key, entry in self._counters.items() if entry[0] + entry[1] <= now]:
+                del self._counters[key]
+            # Snapshot the deltas; hits arriving during the round trip stay pending
+            batch = {key: (entry[0], entry[1], entry[3]) for key, entry in self._counters.items()}
+        if batch:
+            totals = self._upsert(batch)
+            with self._lock:
+                for key, (window_start, expiry, flushed) in batch.items():
+                    entry = self._counters.get(key)
+                    if entry is not None and entry[0] == window_start and entry[1] == expiry:
+                        entry[3] -= flushed
+                        entry[2] = totals.get((key, window_start), entry[2] + flushed)
+        if now - self._last_purge > self.purge_seconds:
+            self._purge(now)
+        self.syncs += 1
+        self.last_error = None
+        return len(batch)
+
+    def _upsert(self, batch: Dict[str, Tuple[int, int, int]]) -> Dict[Tuple[str, int], int]:
+        dialect = postgresql if self.engine.dialect.name == "postgresql" else sqlite
+        statement = dialect.insert(RateLimitCounter).values([
+            {"bucket_key": key, "window_start": window_start, "count": delta, "expires_at": window_start + expiry}
+            for key, (window_start, expiry, delta) in batch.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[RateLimitCounter.bucket_key, RateLimitCounter.window_start],
+            set_={"count": RateLimitCounter.count + statement.excluded.count}
+        ).returning(RateLimitCounter.bucket_key, RateLimitCounter.window_start, RateLimitCounter.count)
+        with self.engine.begin() as conn:
+            return {(row.bucket_key, row.window_start): row.count for row in conn.execute(statement)}
+
+    def _purge(self, now: float) -> None:
+        self._last_purge = now
+        with self.engine.begin() as conn:
+            conn.execute(delete(RateLimitCounter).where(RateLimitCounter.expires_at < int(now)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "appdb",
+            "keys": len(self._counters),
+            "syncs": self.syncs,
+            "sync_errors": self.sync_errors,
+            "last_error": self.last_error,
+        }
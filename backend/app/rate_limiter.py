@@ -0,0 +1,230 @@
+"""
+Sliding-window rate limiter for application-level limits
+
+SlidingWindowLimiter answers "has this key used up its budget?" without
+touching business tables. It uses the sliding window counter algorithm: one
+counter per (key, fixed window), with the previous window's count weighted
+by how much of it still overlaps the sliding window. That is O(1) storage
+per key and never over-counts by more than one window boundary's worth.
+try_hit() records and checks a hit in one step (increment, then compare the
+returned count), so concurrent requests cannot overrun the limit.
+
+Counters live in a backend:
+
+- memory (default): per-process dict, no I/O at all
+- database: the rate_limit_counters table (UNLOGGED on PostgreSQL), updated
+  with an atomic upsert so every worker and replica shares one budget; it
+  goes through the async engine, so checks never block the event loop
+
+Select with RATE_LIMIT_BACKEND. If the shared backend fails the limiter
+fails open and logs, so an outage never locks users out.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+
+from .logging_config import get_logger
+
+logger = get_logger("rate_limiter")
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()  # memory | database
+RATE_LIMIT_MEMORY_MAX_KEYS = int(os.getenv("RATE_LIMIT_MEMORY_MAX_KEYS", 100000))
+# How often the database backend deletes expired counters
+RATE_LIMIT_PURGE_SECONDS = float(os.getenv("RATE_LIMIT_PURGE_SECONDS", 60))
+
+
+class MemoryCounterBackend:
+    """Thread-safe in-process counters keyed by (key, window start)"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MEMORY_MAX_KEYS):
+        self.max_keys = max_keys
+        self._counters: Dict[Tuple[str, int], Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str, window_start: int) -> int:
+        with self._lock:
+            entry = self._counters.get((key, window_start))
+        if entry is None or entry[1] <= time.time():
+            return 0
+        return entry[0]
+
+    async def incr(self, key: str, window_start: int, amount: int, expires_at: float) -> int:
+        with self._lock:
+            if len(self._counters) >= self.max_keys:
+                self._purge_locked()
+            count = self._counters.get((key, window_start), (0, expires_at))[0] + amount
+            self._counters[(key, window_start)] = (count, expires_at)
+            return count
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._purge_locked()
+
+    def _purge_locked(self) -> int:
+        now = time.time()
+        expired = [counter for counter, (_, expires_at) in self._counters.items() if expires_at <= now]
+        for counter in expired:
+            del self._counters[counter]
+        if len(self._counters) >= self.max_keys:
+            # Still full of live keys: drop the oldest windows rather than grow without bound
+            for counter in sorted(self._counters, key=lambda c: c[1])[:len(self._counters) // 10 or 1]:
+                del self._counters[counter]
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "counters": len(self._counters)}
+
+
+class DatabaseCounterBackend:
+    """Counters shared through the rate_limit_counters table (async engine)"""
+
+    def __init__(self, engine=None, purge_seconds: float = RATE_LIMIT_PURGE_SECONDS):
+        if engine is None:
+            from .database import async_engine as engine
+        self.engine = engine
+        self.purge_seconds = purge_seconds
+        self._last_purge = 0.0
+
+    async def get(self, key: str, window_start: int) -> int:
+        async with self.engine.connect() as conn:
+            count = (await conn.execute(
+                text("SELECT count FROM rate_limit_counters WHERE bucket_key = :key AND window_start = :window_start"),
+                {"key": key, "window_start": window_start}
+            )).scalar()
+        return count or 0
+
+    async def incr(self, key: str, window_start: int, amount: int, expires_at: float) -> int:
+        async with self.engine.begin() as conn:
+            count = (await conn.execute(
+                text(
+                    "INSERT INTO rate_limit_counters (bucket_key, window_start, count, expires_at) "
+                    "VALUES (:key, :window_start, :amount, :expires_at) "
+                    "ON CONFLICT (bucket_key, window_start) "
+                    "DO UPDATE SET count = rate_limit_counters.count + excluded.count "
+                    "RETURNING count"
+                ),
+                {"key": key, "window_start": window_start, "amount": amount, "expires_at": int(expires_at)}
+            )).scalar()
+        if time.monotonic() - self._last_purge > self.purge_seconds:
+            await self.purge_expired()
+        return count
+
+    async def purge_expired(self) -> int:
+        self._last_purge = time.monotonic()
+        async with self.engine.begin() as conn:
+            return (await conn.execute(
+                text("DELETE FROM rate_limit_counters WHERE expires_at < :now"), {"now": int(time.time())}
+            )).rowcount or 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "database"}
+
+
+_backends: Dict[str, Any] = {}
+
+
+def counter_backend(name: str = RATE_LIMIT_BACKEND):
+    """Shared backend instance by name (created on first use)"""
+    if name not in _backends:
+        if name == "database":
+            _backends[name] = DatabaseCounterBackend()
+        elif name == "memory":
+            _backends[name] = MemoryCounterBackend()
+        else:
+            raise ValueError(f"Unknown rate limit backend: {name}")
+    return _backends[name]
+
+
+class SlidingWindowLimiter:
+    """Allow at most `limit` cost units per key in any `window_seconds` span"""
+
+    def __init__(self, name: str, limit: int, window_seconds: int, backend: Optional[Any] = None):
+        self.name = name
+        self.limit = limit
+        self.window_seconds = int(window_seconds)
+        self.backend = backend if backend is not None else counter_backend()
+        self.rejected = 0
+
+    def _windows(self, now: float) -> Tuple[int, float]:
+        window_start = int(now // self.window_seconds) * self.window_seconds
+        # Share of the previous window still inside the sliding window
+        previous_weight = 1 - (now - window_start) / self.window_seconds
+        return window_start, previous_weight
+
+    async def usage(self, key: str) -> float:
+        """Estimated cost spent by key over the last window_seconds"""
+        window_start, previous_weight = self._windows(time.time())
+        bucket = f"{self.name}:{key}"
+        current = await self.backend.get(bucket, window_start)
+        previous = await self.backend.get(bucket, window_start - self.window_seconds)
+        return previous * previous_weight + current
+
+    async def allowed(self, key: str, cost: int = 1) -> bool:
+        """True if key can spend cost now (does not record anything)"""
+        try:
+            if await self.usage(key) + cost <= self.limit:
+                return True
+        except Exception as e:
+            logger.error("Rate limit check failed, allowing request", limiter=self.name, error=str(e))
+            return True
+        self.rejected += 1
+        return False
+
+    async def hit(self, key: str, cost: int = 1) -> None:
+        """Record cost spent by key"""
+        window_start, _ = self._windows(time.time())
+        try:
+            # Kept for two windows: the current one and its turn as the previous one
+            await self.backend.incr(f"{self.name}:{key}", window_start, cost, window_start + 2 * self.window_seconds)
+        except Exception as e:
+            logger.error("Recording rate limit usage failed", limiter=self.name, error=str(e))
+
+    async def try_hit(self, key: str, cost: int = 1) -> bool:
+        """
+        Spend cost for key if it fits the limit, in one step
+        The counter is incremented first and the returned count decides, so
+        concurrent requests cannot all pass a check made before any of them
+        recorded its hit. A rejected attempt gives its cost back.
+        """
+        window_start, previous_weight = self._windows(time.time())
+        bucket = f"{self.name}:{key}"
+        expires_at = window_start + 2 * self.window_seconds
+        try:
+            current = await self.backend.incr(bucket, window_start, cost, expires_at)
+            previous = await self.backend.get(bucket, window_start - self.window_seconds)
+        except Exception as e:
+            logger.error("Rate limit check failed, allowing request", limiter=self.name, error=str(e))
+            return True
+        if previous * previous_weight + current <= self.limit:
+            return True
+
+        await self.release(key, cost)
+        self.rejected += 1
+        return False
+
+    async def release(self, key: str, cost: int = 1) -> None:
+        """Give back cost spent by try_hit (for attempts that should not count)"""
+        window_start, _ = self._windows(time.time())
+        try:
+            await self.backend.incr(f"{self.name}:{key}", window_start, -cost, window_start + 2 * self.window_seconds)
+        except Exception as e:
+            logger.error("Returning rate limit usage failed", limiter=self.name, error=str(e))
+
+    def retry_after(self, key: str) -> int:
+        """Seconds until the current window rolls over (an upper bound for the caller)"""
+        now = time.time()
+        window_start, _ = self._windows(now)
+        return max(1, int(window_start + self.window_seconds - now) + 1)
+
+    async def enforce(self, key: str, cost: int = 1, detail: str = "Too many requests. Please try again later.") -> None:
+        """Spend cost for key, raising 429 with Retry-After when it is over its limit"""
+        if not await self.try_hit(key, cost):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=detail,
+                headers={"Retry-After": str(self.retry_after(key))}
+            )
@@ -0,0 +1,237 @@
+"""
+Retention for notifications and email logs
+
+RetentionJob runs in the application's event loop every
+RETENTION_INTERVAL_SECONDS and applies two policies:
+
+- Read notifications older than NOTIFICATION_RETENTION_DAYS are deleted.
+  NOTIFICATION_RETENTION_POLICIES overrides the age per type, e.g.
+  "employee_added=30,assignment_completed=180" (0 keeps that type forever).
+  Unread notifications are never pruned.
+- Sent or failed email_logs rows older than EMAIL_LOG_RETENTION_DAYS are
+  moved out of the queue table: into email_logs_archive
+  (EMAIL_LOG_ARCHIVE_MODE=table), appended to a gzip JSONL file per day under
+  EMAIL_LOG_ARCHIVE_DIR (jsonl), or just deleted (delete).
+
+Work is done in batches of RETENTION_BATCH_SIZE rows, each in its own short
+transaction, so locks are held briefly and the job yields between batches.
+Every worker runs the job; batches are claimed with FOR UPDATE SKIP LOCKED
+on PostgreSQL, so concurrent runs split the rows instead of archiving the
+same batch, and the archive-table insert ignores ids already archived.
+Archiving is at-least-once: a crash between writing a JSONL batch and
+deleting it can archive the batch twice.
+"""
+import asyncio
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, literal, select
+
+from .database import AsyncSessionLocal
+from .logging_config import get_logger
+from .models import EmailLog, EmailLogArchive, Notification
+
+logger = get_logger("retention")
+
+RETENTION_ENABLED = (os.getenv("RETENTION_ENABLED") or "true").lower() in ("1", "true", "yes", "on")
+RETENTION_INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", 6 * 3600))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", 1000))
+RETENTION_BATCH_PAUSE_SECONDS = float(os.getenv("RETENTION_BATCH_PAUSE_SECONDS", 0.05))
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", 90))
+NOTIFICATION_RETENTION_POLICIES = os.getenv("NOTIFICATION_RETENTION_POLICIES", "")
+EMAIL_LOG_RETENTION_DAYS = int(os.getenv("EMAIL_LOG_RETENTION_DAYS", 30))
+EMAIL_LOG_ARCHIVE_MODE = os.getenv("EMAIL_LOG_ARCHIVE_MODE", "table").lower()  # table | jsonl | delete
+EMAIL_LOG_ARCHIVE_DIR = os.getenv("EMAIL_LOG_ARCHIVE_DIR", "logs/email_archive")
+
+# Columns kept when an email log is archived (bodies are already cleared)
+ARCHIVED_EMAIL_COLUMNS = (
+    "id", "template_name", "recipient_email", "subject", "created_at", "sent_at",
+    "status", "employee_id", "user_id", "attempts", "last_error",
+)
+
+
+def _insert(db, model):
+    """Dialect insert() with ON CONFLICT support"""
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
+def parse_retention_policies(spec: str) -> Dict[str, int]:
+    """Parse "type=days,type=days" into {type: days}"""
+    policies = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        notification_type, _, days = item.partition("=")
+        try:
+            policies[notification_type.strip()] = int(days)
+        except ValueError:
+            logger.warning("Ignoring invalid notification retention policy", policy=item)
+    return policies
+
+
+class RetentionJob:
+    """Background task that prunes notifications and archives email logs"""
+
+    def __init__(self, session_factory: Callable = AsyncSessionLocal,
+                 interval_seconds: float = RETENTION_INTERVAL_SECONDS, batch_size: int = RETENTION_BATCH_SIZE,
+                 batch_pause_seconds: float = RETENTION_BATCH_PAUSE_SECONDS,
+                 notification_days: int = NOTIFICATION_RETENTION_DAYS,
+                 notification_policies: Optional[Dict[str, int]] = None,
+                 email_log_days: int = EMAIL_LOG_RETENTION_DAYS, archive_mode: str = EMAIL_LOG_ARCHIVE_MODE,
+                 archive_dir: str = EMAIL_LOG_ARCHIVE_DIR):
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.batch_pause_seconds = batch_pause_seconds
+        self.notification_days = notification_days
+        self.notification_policies = (
+            parse_retention_policies(NOTIFICATION_RETENTION_POLICIES)
+            if notification_policies is None else notification_policies
+        )
+        self.email_log_days = email_log_days
+        self.archive_mode = archive_mode
+        self.archive_dir = archive_dir
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.last_report: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="retention-job")
+        logger.info("Retention job started", interval_seconds=self.interval_seconds)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("Retention run failed", error=str(e))
+            await asyncio.sleep(self.interval_seconds)
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Apply every policy once; returns rows processed per policy"""
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        report: Dict[str, Any] = {"notifications_deleted": {}, "email_logs_archived": 0}
+
+        # Types with their own policy first, then the default for every other type
+        for notification_type, days in self.notification_policies.items():
+            if days > 0:
+                report["notifications_deleted"][notification_type] = await self._prune_notifications(
+                    now - timedelta(days=days), Notification.type == notification_type
+                )
+        if self.notification_days > 0:
+            report["notifications_deleted"]["*"] = await self._prune_notifications(
+                now - timedelta(days=self.notification_days),
+                Notification.type.notin_(list(self.notification_policies)) if self.notification_policies else None
+            )
+
+        if self.email_log_days > 0:
+            report["email_logs_archived"] = await self._archive_email_logs(now - timedelta(days=self.email_log_days))
+
+        report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self.runs += 1
+        self.last_report = report
+        self.last_error = None
+        logger.info("Retention run finished", **report)
+        return report
+
+    async def _prune_notifications(self, cutoff: datetime, type_filter=None) -> int:
+        conditions = [Notification.read == True, Notification.created_at < cutoff]
+        if type_filter is not None:
+            conditions.append(type_filter)
+
+        deleted = 0
+        while True:
+            async with self.session_factory() as db:
+                ids = (await db.execute(
+                    select(Notification.id)
+                    .where(*conditions)
+                    .order_by(Notification.id)
+                    .limit(self.batch_size)
+                    .with_for_update(skip_locked=True)
+                )).scalars().all()
+                if not ids:
+                    return deleted
+                await db.execute(delete(Notification).where(Notification.id.in_(ids)))
+                await db.commit()
+            deleted += len(ids)
+            if len(ids) < self.batch_size:
+                return deleted
+            await asyncio.sleep(self.batch_pause_seconds)
+
+    async def _archive_email_logs(self, cutoff: datetime) -> int:
+        columns = [getattr(EmailLog, name) for name in ARCHIVED_EMAIL_COLUMNS]
+        archived = 0
+        while True:
+            async with self.session_factory() as db:
+                ids = (await db.execute(
+                    select(EmailLog.id)
+                    .where(EmailLog.status.in_(("sent", "failed")), EmailLog.created_at < cutoff)
+                    .order_by(EmailLog.id)
+                    .limit(self.batch_size)
+                    .with_for_update(skip_locked=True)
+                )).scalars().all()
+                if not ids:
+                    return archived
+
+                if self.archive_mode == "table":
+                    await db.execute(
+                        _insert(db, EmailLogArchive).from_select(
+                            list(ARCHIVED_EMAIL_COLUMNS) + ["archived_at"],
+                            select(*columns, literal(datetime.utcnow())).where(EmailLog.id.in_(ids))
+                        ).on_conflict_do_nothing(index_elements=[EmailLogArchive.id])
+                    )
+                elif self.archive_mode == "jsonl":
+                    rows = (await db.execute(select(*columns).where(EmailLog.id.in_(ids)))).mappings().all()
+                    await asyncio.get_running_loop().run_in_executor(None, self._append_jsonl, rows)
+
+                await db.execute(delete(EmailLog).where(EmailLog.id.in_(ids)))
+                await db.commit()
+            archived += len(ids)
+            if len(ids) < self.batch_size:
+                return archived
+            await asyncio.sleep(self.batch_pause_seconds)
+
+    def _append_jsonl(self, rows: List[Any]) -> None:
+        """Append rows as one gzip member to today's archive file (gzip readers concatenate members)"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"email_logs-{datetime.utcnow():%Y%m%d}.jsonl.gz")
+        lines = "".join(json.dumps(dict(row), default=str) + "\n" for row in rows)
+        with gzip.open(path, "at", encoding="utf-8") as archive:
+            archive.write(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "runs": self.runs,
+            "last_report": self.last_report,
+            "last_error": self.last_error,
+        }
+
+
+# Global retention job
+retention_job = RetentionJob()
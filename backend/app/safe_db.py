@@ -6,6 +6,11 @@ from sqlalchemy.orm import Session
 from typing import Optional, Dict, Any
 import uuid
 from datetime import datetime
+from .auth_cache import principal_cache
+from .token_versions import token_versions
+
+# Changing any of these invalidates access tokens issued for the user
+TOKEN_REVOKING_FIELDS = ('username', 'role', 'is_active', 'hashed_password', 'employee_id')
 
 class SafeUser:
     """
@@ -129,10 +134,15 @@ def safe_update_user(db: Session, user_id: str, updates: Dict[str, Any]) -> bool
         
         if not set_clauses:
             return False
+        
+        if any(key in TOKEN_REVOKING_FIELDS for key in updates):
+            set_clauses.append("token_version = COALESCE(token_version, 0) + 1")
             
         query = f"UPDATE users SET {', '.join(set_clauses)} WHERE id = :user_id"
         result = db.execute(text(query), params)
         db.commit()
+        principal_cache.invalidate(user_id=user_id)
+        token_versions.mark_stale(user_id)
         
         return result.rowcount > 0
         
@@ -151,6 +161,8 @@ def safe_delete_user(db: Session, user_id: str) -> bool:
             {"user_id": user_id}
         )
         db.commit()
+        principal_cache.invalidate(user_id=user_id)
+        token_versions.mark_stale(user_id)
         return result.rowcount > 0
         
     except Exception as e:
@@ -0,0 +1,177 @@
+"""
+Async equivalents of the safe database operations in safe_db.py
+
+Same raw-SQL queries and return values, for routers that take an
+AsyncSession from get_async_db.
+"""
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Dict, Any
+from .auth_cache import principal_cache
+from .safe_db import SafeUser, TOKEN_REVOKING_FIELDS
+from .token_versions import token_versions
+
+async def safe_get_user_by_username(db: AsyncSession, username: str) -> Optional[SafeUser]:
+    """
+    Safely get user by username using raw SQL to avoid model conflicts
+    """
+    try:
+        result = (await db.execute(
+            text("""
+            SELECT id, username, email, hashed_password, role, is_active,
+                   created_at, last_login, employee_id
+            FROM users
+            WHERE username = :username
+            LIMIT 1
+            """),
+            {"username": username}
+        )).fetchone()
+
+        if result:
+            return SafeUser(
+                id=result.id,
+                username=result.username,
+                email=result.email,
+                hashed_password=result.hashed_password,
+                role=result.role,
+                is_active=result.is_active,
+                created_at=result.created_at,
+                last_login=result.last_login,
+                employee_id=result.employee_id
+            )
+        return None
+
+    except Exception as e:
+        print(f"Safe user query failed: {e}")
+        return None
+
+async def safe_get_user_by_id(db: AsyncSession, user_id: str) -> Optional[SafeUser]:
+    """
+    Safely get user by ID with minimal data exposure
+    """
+    try:
+        result = await db.execute(
+            text("SELECT id, username, email, role, is_active, created_at, last_login, employee_id FROM users WHERE id = :user_id"),
+            {"user_id": user_id}
+        )
+        row = result.fetchone()
+
+        if row:
+            return SafeUser(
+                id=row.id,
+                username=row.username,
+                email=row.email,
+                role=row.role,
+                is_active=row.is_active,
+                created_at=row.created_at,
+                last_login=row.last_login,
+                employee_id=row.employee_id
+            )
+        return None
+    except Exception as e:
+        print(f"Safe user fetch by ID failed: {e}")
+        return None
+
+async def safe_check_user_exists(db: AsyncSession, username: str = None, email: str = None) -> bool:
+    """
+    Check if user exists by username or email
+    """
+    try:
+        if username and email:
+            result = await db.execute(
+                text("SELECT id FROM users WHERE username = :username OR email = :email"),
+                {"username": username, "email": email}
+            )
+        elif username:
+            result = await db.execute(
+                text("SELECT id FROM users WHERE username = :username"),
+                {"username": username}
+            )
+        elif email:
+            result = await db.execute(
+                text("SELECT id FROM users WHERE email = :email"),
+                {"email": email}
+            )
+        else:
+            return False
+
+        return result.fetchone() is not None
+
+    except Exception as e:
+        print(f"Safe user exists check failed: {e}")
+        return True  # Assume exists to prevent duplicates on error
+
+async def safe_update_user(db: AsyncSession, user_id: str, updates: Dict[str, Any]) -> bool:
+    """
+    Safely update user with only essential fields
+    """
+    try:
+        set_clauses = []
+        params = {"user_id": user_id}
+
+        for key, value in updates.items():
+            if key in ['username', 'email', 'role', 'is_active', 'hashed_password', 'last_login', 'employee_id']:
+                set_clauses.append(f"{key} = :{key}")
+                params[key] = value
+
+        if not set_clauses:
+            return False
+
+        if any(key in TOKEN_REVOKING_FIELDS for key in updates):
+            set_clauses.append("token_version = COALESCE(token_version, 0) + 1")
+
+        query = f"UPDATE users SET {', '.join(set_clauses)} WHERE id = :user_id"
+        result = await db.execute(text(query), params)
+        await db.commit()
+        principal_cache.invalidate(user_id=user_id)
+        token_versions.mark_stale(user_id)
+
+        return result.rowcount > 0
+
+    except Exception as e:
+        await db.rollback()
+        print(f"Safe user update failed: {e}")
+        return False
+
+async def safe_delete_user(db: AsyncSession, user_id: str) -> bool:
+    """
+    Safely delete user by ID
+    """
+    try:
+        result = await db.execute(
+            text("DELETE FROM users WHERE id = :user_id"),
+            {"user_id": user_id}
+        )
+        await db.commit()
+        principal_cache.invalidate(user_id=user_id)
+        token_versions.mark_stale(user_id)
+        return result.rowcount > 0
+
+    except Exception as e:
+        await db.rollback()
+        print(f"Safe user delete failed: {e}")
+        return False
+
+async def check_table_schema(db: AsyncSession) -> Dict[str, Any]:
+    """
+    Check what columns exist in the users table
+    """
+    try:
+        result = (await db.execute(text("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name = 'users'
+        """))).fetchall()
+
+        columns = [row.column_name for row in result]
+        return {
+            "columns": columns,
+            "has_employee_fields": any(
+                col in columns for col in ["employee_code", "department", "position"]
+            ),
+            "essential_columns": [col for col in columns if col in [
+                "id", "username", "email", "hashed_password", "role", "is_active", "created_at", "last_login"
+            ]]
+        }
+    except Exception as e:
+        return {"error": str(e), "columns": [], "has_employee_fields": False}
@@ -2,7 +2,7 @@
 Enhanced Pydantic schemas with comprehensive validation
 """
 from pydantic import BaseModel, validator, Field
-from typing import Optional, Dict, Any, Literal
+from typing import Optional, Dict, Any, List, Literal
 from datetime import datetime
 import re
 from email_validator import validate_email, EmailNotValidError
@@ -405,3 +405,126 @@ class AssignmentResponse(BaseModel):
     user_id: Optional[str] = None
     employee_id: Optional[int] = None
 
+
+# ===== Notification Schemas =====
+class NotificationCreate(BaseModel):
+    """In-app notification to be stored for a recipient"""
+    type: str = Field(..., max_length=50)
+    recipient_user_id: str
+    title: str = Field(..., max_length=200)
+    message: str
+    action_url: Optional[str] = Field(None, max_length=500)
+    employee_id: Optional[int] = None
+    user_id: Optional[str] = None
+
+class NotificationRecord(BaseModel):
+    """Notification as returned to its recipient"""
+    id: int
+    type: str
+    recipient_user_id: str
+    title: str
+    message: str
+    action_url: Optional[str] = None
+    read: bool
+    created_at: datetime
+    employee_id: Optional[int] = None
+    user_id: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class NotificationUpdate(BaseModel):
+    """Mark a notification as read"""
+    read: Optional[bool] = None
+
+class StreamTicket(BaseModel):
+    """Single-use ticket for opening the notification stream"""
+    ticket: str
+    expires_in: int
+
+class NotificationRecipients(BaseModel):
+    """Recipient set for a bulk notification; users matching any criterion are included"""
+    roles: List[str] = []
+    user_ids: List[str] = []
+    departments: List[str] = []
+    active_only: bool = True
+
+class BulkNotificationCreate(BaseModel):
+    """Same in-app notification for every user in a recipient set"""
+    recipients: NotificationRecipients
+    type: str = Field(..., max_length=50)
+    title: str = Field(..., max_length=200)
+    message: str
+    action_url: Optional[str] = Field(None, max_length=500)
+    employee_id: Optional[int] = None
+
+class BulkNotificationResult(BaseModel):
+    """Notification id created for each recipient"""
+    created: int
+    notification_ids: Dict[str, int]
+
+class EmailLogCreate(BaseModel):
+    """Outbound email to be queued for delivery"""
+    template_name: str = Field(..., max_length=100)
+    recipient_email: str = Field(..., max_length=255)
+    subject: str = Field(..., max_length=500)
+    status: str = Field("queued", max_length=20)
+    employee_id: Optional[int] = None
+    user_id: Optional[str] = None
+    body_text: Optional[str] = None
+    body_html: Optional[str] = None
+
+# ===== User-Employee Assignment Service Schemas =====
+class UserAssignmentRequest(BaseModel):
+    """Assign a new or existing user account to an employee"""
+    employee_id: int
+    create_new_user: bool = True
+    username: Optional[str] = None
+    email: Optional[str] = None
+    role: str = "employee"
+    existing_user_id: Optional[str] = None
+    send_welcome_email: bool = True
+
+class UserAssignmentResponse(BaseModel):
+    """Result of an assignment made by the assignment service"""
+    success: bool
+    message: str
+    employee_id: int
+    user_id: str
+    username: str
+    role: str
+    notifications_sent: Dict[str, Any] = {}
+
+class UnassignedEmployee(BaseModel):
+    """Active employee still waiting for a user account"""
+    employee_id: int
+    emp_code: str
+    first_name: str
+    last_name: str
+    position: Optional[str] = None
+    department: Optional[str] = None
+    created_at: Optional[datetime] = None
+    days_since_creation: int = 0
+
+class AssignmentSummary(BaseModel):
+    """Dashboard counters for user-employee assignments"""
+    total_employees: int
+    assigned_employees: int
+    unassigned_employees: int
+    pending_notifications: int
+    recent_assignments: int
+
+class RequestLogSamplingUpdate(BaseModel):
+    """Runtime access log sampling settings; omitted fields keep their current value"""
+    default_rate: Optional[float] = Field(None, ge=0, le=1)
+    path_rates: Optional[Dict[str, float]] = None
+    slow_ms: Optional[float] = Field(None, ge=0)
+    log_start: Optional[bool] = None
+
+    @validator('path_rates')
+    def validate_path_rates(cls, v):
+        if v is not None:
+            for prefix, rate in v.items():
+                if not prefix.startswith('/') or not 0 <= rate <= 1:
+                    raise ValueError('path_rates maps path prefixes starting with "/" to rates between 0 and 1')
+        return v
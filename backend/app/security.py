@@ -6,46 +6,184 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from starlette.concurrency import run_in_threadpool
+import os
 import re
 import logging
-from typing import Optional
+from typing import Dict, Optional
 
-# Rate limiter setup
-limiter = Limiter(key_func=get_remote_address)
+from . import rate_limit_storage  # registers the appdb:// limiter storage
+
+# Rate limiter setup: memory:// counts per process, appdb:// shares counts through
+# the database (see app/rate_limit_storage.py); redis:// also works if redis is installed
+RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI", "memory://")
+# Add X-RateLimit-Limit/Remaining/Reset to responses of rate limited routes
+RATE_LIMIT_HEADERS = (os.getenv("RATE_LIMIT_HEADERS") or "false").lower() in ("1", "true", "yes", "on")
+# Per-route cost weights, e.g. "/auth/login=2,/auth/me=1" (unlisted routes cost 1)
+RATE_LIMIT_COSTS = os.getenv("RATE_LIMIT_COSTS", "")
+
+limiter = Limiter(key_func=get_remote_address, storage_uri=RATE_LIMIT_STORAGE_URI)
+
+
+def limiter_storage_stats() -> dict:
+    """Health info for the limiter storage"""
+    storage = limiter._storage
+    if hasattr(storage, "stats"):
+        return storage.stats()
+    return {"backend": RATE_LIMIT_STORAGE_URI.split(":", 1)[0]}
+
+
+def stop_limiter_storage() -> None:
+    """Flush pending hits of a shared storage on shutdown"""
+    if isinstance(limiter._storage, rate_limit_storage.SyncedCounterStorage):
+        limiter._storage.stop()
+
+
+def parse_route_costs(spec: str) -> Dict[str, int]:
+    """Parse "path=weight,path=weight" into {path: weight}"""
+    costs = {}
+    for item in spec.split(","):
+        path, _, weight = item.strip().partition("=")
+        if path and weight.strip().isdigit():
+            costs[path] = int(weight)
+    return costs
+
+
+route_costs = parse_route_costs(RATE_LIMIT_COSTS)
+
+
+def request_cost(request: Request) -> int:
+    """Cost of one hit for the matched route (pass as cost= to limiter.limit)"""
+    route = request.scope.get("route")
+    return route_costs.get(getattr(route, "path", request.url.path), 1)
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Adds X-RateLimit-* headers for the limit slowapi evaluated on this request
+
+    slowapi's own headers_enabled needs a `response` parameter on every limited
+    endpoint, so the headers are added here instead. The window lookup goes to
+    the limiter storage (a network round trip with redis://), so it runs in the
+    threadpool rather than on the event loop.
+    """
+
+    def __init__(self, app, limiter: Limiter = limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                current_limit = scope.get("state", {}).get("view_rate_limit")
+                if current_limit is not None:
+                    item, identifiers = current_limit
+                    try:
+                        reset_at, remaining = await run_in_threadpool(
+                            self.limiter.limiter.get_window_stats, item, *identifiers
+                        )
+                    except Exception as e:
+                        # The response itself is fine; only its headers are missing
+                        logging.warning(f"Rate limit headers skipped: {e}")
+                    else:
+                        message["headers"] = list(message.get("headers", [])) + [
+                            (b"x-ratelimit-limit", str(item.amount).encode()),
+                            (b"x-ratelimit-remaining", str(remaining).encode()),
+                            (b"x-ratelimit-reset", str(int(reset_at)).encode()),
+                        ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
 
 # Security headers middleware
+SECURITY_HEADERS = (
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+    (b"content-security-policy", b"default-src 'self'"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    (b"permissions-policy", b"geolocation=(), microphone=(), camera=()"),
+)
+
+# Swagger UI and ReDoc load their scripts, styles and favicon from CDNs and use inline scripts
+DOCS_CONTENT_SECURITY_POLICY = (
+    b"default-src 'self'; "
+    b"script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; "
+    b"style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://fonts.googleapis.com; "
+    b"font-src 'self' https://fonts.gstatic.com; "
+    b"img-src 'self' data: https://fastapi.tiangolo.com https://cdn.redoc.ly; "
+    b"worker-src 'self' blob:"
+)
+
+
+def header_profile(overrides: Dict[bytes, bytes], base=SECURITY_HEADERS) -> tuple:
+    """base headers with some values replaced"""
+    return tuple((name, overrides.get(name, value)) for name, value in base)
+
+
+DEFAULT_HEADER_PROFILES = (
+    ("/docs", header_profile({b"content-security-policy": DOCS_CONTENT_SECURITY_POLICY})),
+    ("/redoc", header_profile({b"content-security-policy": DOCS_CONTENT_SECURITY_POLICY})),
+)
+
+
 class SecurityHeadersMiddleware:
-    def __init__(self, app):
+    """
+    Adds security headers to every HTTP response
+
+    Header tuples are built once; per response the middleware only appends the
+    ones the application did not set itself, leaving every other header
+    (including repeated ones such as set-cookie) untouched. profiles maps path
+    prefixes to their own header tuple, checked in order before the default.
+    """
+
+    def __init__(self, app, headers: tuple = SECURITY_HEADERS, profiles: tuple = DEFAULT_HEADER_PROFILES):
         self.app = app
+        self.default = self._compile(headers)
+        self.profiles = tuple((prefix, self._compile(profile)) for prefix, profile in profiles)
+
+    @staticmethod
+    def _compile(headers) -> tuple:
+        headers = tuple(headers)
+        return headers, frozenset(name for name, _ in headers)
+
+    def headers_for(self, path: str) -> tuple:
+        """(headers, header names) for the first profile whose prefix matches path"""
+        for prefix, profile in self.profiles:
+            if path.startswith(prefix):
+                return profile
+        return self.default
 
     async def __call__(self, scope, receive, send):
-        if scope["type"] == "http":
-            async def send_wrapper(message):
-                if message["type"] == "http.response.start":
-                    headers = dict(message.get("headers", []))
-                    
-                    # Add security headers
-                    security_headers = {
-                        b"x-content-type-options": b"nosniff",
-                        b"x-frame-options": b"DENY",
-                        b"x-xss-protection": b"1; mode=block",
-                        b"strict-transport-security": b"max-age=31536000; includeSubDomains",
-                        b"content-security-policy": b"default-src 'self'",
-                        b"referrer-policy": b"strict-origin-when-cross-origin",
-                        b"permissions-policy": b"geolocation=(), microphone=(), camera=()"
-                    }
-                    
-                    # Update headers
-                    for key, value in security_headers.items():
-                        headers[key] = value
-                    
-                    message["headers"] = list(headers.items())
-                
-                await send(message)
-            
-            await self.app(scope, receive, send_wrapper)
-        else:
+        if scope["type"] != "http":
             await self.app(scope, receive, send)
+            return
+
+        security_headers, names = self.headers_for(scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = message.get("headers")
+                if not headers:
+                    message["headers"] = list(security_headers)
+                else:
+                    present = {name.lower() for name, _ in headers}
+                    if present.isdisjoint(names):
+                        missing = security_headers
+                    else:
+                        missing = [header for header in security_headers if header[0] not in present]
+                    if isinstance(headers, list):
+                        headers.extend(missing)
+                    else:
+                        message["headers"] = [*headers, *missing]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
 
 # Input validation utilities
 class InputValidator:
@@ -0,0 +1,168 @@
+"""
+Pool of persistent, authenticated SMTP connections
+
+Opening an SMTP session costs a TCP connect, STARTTLS handshake and AUTH
+(several round trips, often hundreds of milliseconds). The pool keeps
+sessions open between messages so a batch (e.g. one email per system
+admin) pays that cost once.
+
+A connection is retired after SMTP_MAX_MESSAGES_PER_CONNECTION messages
+(many providers cap messages per session) or once it has been idle for
+SMTP_IDLE_TIMEOUT_SECONDS (before the server drops it). A send that fails
+on a reused connection because the server hung up is retried once on a
+fresh connection.
+"""
+import os
+import smtplib
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger("smtp_pool")
+
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 2))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", 100))
+SMTP_IDLE_TIMEOUT_SECONDS = float(os.getenv("SMTP_IDLE_TIMEOUT_SECONDS", 60))
+
+# Errors meaning the cached session is gone, not that the message was refused
+_STALE_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, OSError)
+
+
+class _PooledConnection:
+    __slots__ = ("smtp", "messages_sent", "last_used")
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    """Thread-safe pool of reusable SMTP sessions"""
+
+    def __init__(self, connect: Callable[[], smtplib.SMTP], max_idle: int = SMTP_POOL_SIZE,
+                 max_messages_per_connection: int = SMTP_MAX_MESSAGES_PER_CONNECTION,
+                 idle_timeout_seconds: float = SMTP_IDLE_TIMEOUT_SECONDS):
+        self._connect = connect
+        self.max_idle = max_idle
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self._idle: List[_PooledConnection] = []
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.connections_closed = 0
+        self.messages_sent = 0
+        self.reused = 0
+        self.stale_retries = 0
+
+    def _checkout(self) -> Tuple[_PooledConnection, bool]:
+        """Return (connection, reused) - an idle session if one is fresh, else a new one"""
+        expired = []
+        connection = None
+        with self._lock:
+            now = time.monotonic()
+            while self._idle:
+                candidate = self._idle.pop()
+                if now - candidate.last_used < self.idle_timeout_seconds:
+                    connection = candidate
+                    break
+                expired.append(candidate)
+        for stale in expired:
+            self._close(stale)
+
+        if connection is not None:
+            return connection, True
+
+        smtp = self._connect()
+        with self._lock:
+            self.connections_opened += 1
+        return _PooledConnection(smtp), False
+
+    def _checkin(self, connection: _PooledConnection) -> None:
+        connection.last_used = time.monotonic()
+        if connection.messages_sent >= self.max_messages_per_connection:
+            self._close(connection)
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                return
+        self._close(connection)
+
+    def _close(self, connection: _PooledConnection) -> None:
+        try:
+            connection.smtp.quit()
+        except Exception:
+            try:
+                connection.smtp.close()
+            except Exception:
+                pass
+        with self._lock:
+            self.connections_closed += 1
+
+    def send(self, msg: Any) -> None:
+        """Send a message on a pooled session (blocking, raises on failure)"""
+        connection, reused = self._checkout()
+        try:
+            connection.smtp.send_message(msg)
+        except _STALE_CONNECTION_ERRORS as e:
+            self._close(connection)
+            if not reused:
+                raise
+            # The server closed the idle session; retry once on a new one
+            with self._lock:
+                self.stale_retries += 1
+            logger.debug("Pooled SMTP connection was stale, reconnecting", error=str(e))
+            connection, reused = self._checkout()
+            try:
+                connection.smtp.send_message(msg)
+            except Exception:
+                self._close(connection)
+                raise
+        except smtplib.SMTPRecipientsRefused:
+            # Message-level rejection; the session itself is still usable
+            self._checkin(connection)
+            raise
+        except Exception:
+            self._close(connection)
+            raise
+
+        connection.messages_sent += 1
+        with self._lock:
+            self.messages_sent += 1
+            if reused:
+                self.reused += 1
+        self._checkin(connection)
+
+    def reap_idle(self) -> int:
+        """Close sessions idle longer than the timeout; returns how many were closed"""
+        with self._lock:
+            now = time.monotonic()
+            expired = [c for c in self._idle if now - c.last_used >= self.idle_timeout_seconds]
+            self._idle = [c for c in self._idle if c not in expired]
+        for connection in expired:
+            self._close(connection)
+        return len(expired)
+
+    def close(self) -> None:
+        """Close every idle session"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._close(connection)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "idle": len(self._idle),
+                "max_idle": self.max_idle,
+                "max_messages_per_connection": self.max_messages_per_connection,
+                "idle_timeout_seconds": self.idle_timeout_seconds,
+                "connections_opened": self.connections_opened,
+                "connections_closed": self.connections_closed,
+                "messages_sent": self.messages_sent,
+                "reused": self.reused,
+                "stale_retries": self.stale_retries,
+            }
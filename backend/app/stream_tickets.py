@@ -0,0 +1,112 @@
+"""
+Single-use tickets for the notification event stream
+
+EventSource cannot send an Authorization header, and a JWT in the query
+string ends up in access logs, proxy logs and browser history. Instead the
+client POSTs /api/notifications/stream-ticket with its bearer token and opens
+GET /api/notifications/stream?ticket=... within NOTIFICATION_STREAM_TICKET_SECONDS.
+
+A ticket is a signed JWT (typ "stream") carrying a stream grant: the user id,
+the token_version and the expiry of the access token it was issued for, so
+an open stream can close itself once that token would stop working. Each
+ticket id is redeemed once, through the rate limiter's counter backend
+(shared by every worker with RATE_LIMIT_BACKEND=database).
+"""
+import os
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException, status
+from jose import JWTError, jwt
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .auth import ALGORITHM, SIGNING_KEY
+from .logging_config import get_logger
+from .rate_limiter import counter_backend
+from .token_versions import token_versions
+
+logger = get_logger("stream_tickets")
+
+NOTIFICATION_STREAM_TICKET_SECONDS = int(os.getenv("NOTIFICATION_STREAM_TICKET_SECONDS", 30))
+
+TICKET_TYPE = "stream"
+
+
+def _ticket_exception(detail: str = "Invalid or expired stream ticket") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def _load_token_state(db: AsyncSession, user_id: str):
+    return (await db.execute(
+        text("SELECT token_version, is_active FROM users WHERE id = :user_id"),
+        {"user_id": str(user_id)}
+    )).fetchone()
+
+
+async def grant_for_token(db: AsyncSession, user_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Stream grant for a decoded access token (its version claim, else the user's current one)"""
+    version = payload.get("ver")
+    if version is None:
+        row = await _load_token_state(db, user_id)
+        version = int(row.token_version or 0) if row is not None else 0
+    return {"sub": payload["sub"], "uid": str(user_id), "ver": int(version), "tok_exp": int(payload["exp"])}
+
+
+def issue_stream_ticket(grant: Dict[str, Any], ttl_seconds: int = NOTIFICATION_STREAM_TICKET_SECONDS) -> str:
+    """Signed single-use ticket for a stream grant; never outlives the access token"""
+    expires_at = min(int(time.time()) + ttl_seconds, grant["tok_exp"])
+    claims = dict(grant, typ=TICKET_TYPE, jti=uuid.uuid4().hex, exp=expires_at)
+    return jwt.encode(claims, SIGNING_KEY, algorithm=ALGORITHM)
+
+
+async def redeem_stream_ticket(ticket: str) -> Dict[str, Any]:
+    """Validate a ticket and mark it used, returning its stream grant"""
+    try:
+        claims = jwt.decode(ticket, SIGNING_KEY, algorithms=[ALGORITHM])
+    except JWTError as e:
+        logger.warning("Stream ticket rejected", error=str(e))
+        raise _ticket_exception()
+    if claims.get("typ") != TICKET_TYPE or not claims.get("jti"):
+        raise _ticket_exception()
+
+    try:
+        uses = await counter_backend().incr(f"stream_ticket:{claims['jti']}", 0, 1, claims["exp"])
+    except Exception as e:
+        # Fail closed: without the use counter a leaked ticket could be replayed
+        logger.error("Recording stream ticket use failed", error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Notification stream temporarily unavailable"
+        )
+    if uses > 1:
+        logger.warning("Stream ticket replayed", user_id=claims.get("uid"))
+        raise _ticket_exception()
+
+    return {key: claims[key] for key in ("sub", "uid", "ver", "tok_exp")}
+
+
+async def grant_revocation_reason(db: AsyncSession, grant: Dict[str, Any]) -> Optional[str]:
+    """
+    Why a stream grant no longer holds: "expired", "revoked", or None while valid
+    Revocation uses the shared token version map, falling back to the user's
+    row when the map cannot decide. A database outage does not close open
+    streams; the expiry check still applies.
+    """
+    if time.time() >= grant["tok_exp"]:
+        return "expired"
+
+    current = await token_versions.is_current(db, grant["uid"], grant["ver"])
+    if current is None:
+        try:
+            row = await _load_token_state(db, grant["uid"])
+        except Exception as e:
+            logger.error("Stream revocation check failed", user_id=grant["uid"], error=str(e))
+            return None
+        current = row is not None and bool(row.is_active) and int(row.token_version or 0) == grant["ver"]
+    return None if current else "revoked"
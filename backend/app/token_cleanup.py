@@ -0,0 +1,109 @@
+"""
+Periodic cleanup of expired password reset tokens
+
+The reset endpoints already reject expired tokens, so deleting them is pure
+housekeeping. ResetTokenCleanup runs in the application's event loop and
+removes expired rows with set-based DELETEs of up to
+RESET_TOKEN_CLEANUP_BATCH_SIZE rows, each in its own short transaction,
+instead of every reset request loading and deleting them one by one.
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import delete, select
+
+from .database import AsyncSessionLocal
+from .logging_config import get_logger
+from .models import PasswordResetToken
+
+logger = get_logger("token_cleanup")
+
+RESET_TOKEN_CLEANUP_ENABLED = (os.getenv("RESET_TOKEN_CLEANUP_ENABLED") or "true").lower() in ("1", "true", "yes", "on")
+RESET_TOKEN_CLEANUP_INTERVAL_SECONDS = float(os.getenv("RESET_TOKEN_CLEANUP_INTERVAL_SECONDS", 600))
+RESET_TOKEN_CLEANUP_BATCH_SIZE = int(os.getenv("RESET_TOKEN_CLEANUP_BATCH_SIZE", 1000))
+
+
+async def delete_expired_reset_tokens(db, batch_size: int = RESET_TOKEN_CLEANUP_BATCH_SIZE) -> int:
+    """Delete expired reset tokens in batches; returns how many were removed"""
+    deleted = 0
+    while True:
+        expired_ids = (
+            select(PasswordResetToken.id)
+            .where(PasswordResetToken.expires_at < datetime.utcnow())
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        removed = (await db.execute(
+            delete(PasswordResetToken)
+            .where(PasswordResetToken.id.in_(expired_ids))
+            .execution_options(synchronize_session=False)
+        )).rowcount or 0
+        await db.commit()
+        deleted += removed
+        if removed < batch_size:
+            return deleted
+
+
+class ResetTokenCleanup:
+    """Background task that runs delete_expired_reset_tokens periodically"""
+
+    def __init__(self, session_factory: Callable = AsyncSessionLocal,
+                 interval_seconds: float = RESET_TOKEN_CLEANUP_INTERVAL_SECONDS,
+                 batch_size: int = RESET_TOKEN_CLEANUP_BATCH_SIZE):
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.deleted = 0
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="reset-token-cleanup")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("Reset token cleanup failed", error=str(e))
+            await asyncio.sleep(self.interval_seconds)
+
+    async def run_once(self) -> int:
+        async with self.session_factory() as db:
+            deleted = await delete_expired_reset_tokens(db, self.batch_size)
+        self.runs += 1
+        self.deleted += deleted
+        self.last_error = None
+        if deleted:
+            logger.info("Cleaned up expired reset tokens", deleted=deleted)
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "runs": self.runs,
+            "deleted": self.deleted,
+            "last_error": self.last_error,
+        }
+
+
+# Global reset token cleanup task
+reset_token_cleanup = ResetTokenCleanup()
@@ -0,0 +1,148 @@
+"""
+In-memory token version cache for claims-trusted authorization
+
+When AUTH_TRUST_TOKEN_CLAIMS is enabled, access tokens carry the user's id,
+role, employee_id and token_version, and authorization is decided from the
+claims alone. Revocation is handled here: each user's (token_version,
+is_active) pair is loaded by primary key the first time one of their tokens
+is checked and kept for AUTH_TOKEN_VERSION_REFRESH_SECONDS, so a user making
+many requests costs one small lookup per interval and inactive users cost
+nothing (the cache is bounded by AUTH_TOKEN_VERSION_MAX_ENTRIES).
+
+Bumping users.token_version (role change, deactivation, password change,
+employee assignment) or deleting the user revokes every token issued before.
+Other workers notice within AUTH_TOKEN_VERSION_REFRESH_SECONDS; the local
+process drops its copy immediately via mark_stale().
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .logging_config import get_logger
+
+logger = get_logger("token_versions")
+
+AUTH_TRUST_TOKEN_CLAIMS = (os.getenv("AUTH_TRUST_TOKEN_CLAIMS") or "false").lower() in ("1", "true", "yes", "on")
+AUTH_TOKEN_VERSION_REFRESH_SECONDS = float(os.getenv("AUTH_TOKEN_VERSION_REFRESH_SECONDS", 30))
+AUTH_TOKEN_VERSION_MAX_ENTRIES = int(os.getenv("AUTH_TOKEN_VERSION_MAX_ENTRIES", 10000))
+
+# After a failed lookup, checks report "unknown" for this long instead of querying again
+MIN_FORCED_REFRESH_SECONDS = 1.0
+
+# (loaded_at, token_version or None for a deleted user, is_active)
+Entry = Tuple[float, Optional[int], bool]
+
+
+class TokenVersionMap:
+    """Per-user (token_version, is_active) cache with a TTL and an LRU bound"""
+
+    def __init__(self, refresh_seconds: float = AUTH_TOKEN_VERSION_REFRESH_SECONDS,
+                 max_entries: int = AUTH_TOKEN_VERSION_MAX_ENTRIES):
+        self.refresh_seconds = refresh_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Entry]" = OrderedDict()
+        # mark_stale() is also called from sync routes running in the threadpool
+        self._lock = threading.Lock()
+        self._failed_at = float("-inf")
+        self.hits = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def mark_stale(self, user_id: Optional[str] = None) -> None:
+        """Drop a user's cached version, or every one (call after revoking tokens)"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(user_id), None)
+
+    async def refresh(self, db: AsyncSession, user_id: str) -> bool:
+        """Load one user's token version and active flag"""
+        user_id = str(user_id)
+        try:
+            row = (await db.execute(
+                text("SELECT token_version, is_active FROM users WHERE id = :user_id"),
+                {"user_id": user_id}
+            )).fetchone()
+        except Exception as e:
+            # The session belongs to the request: leave it usable for the fallback lookup
+            try:
+                await db.rollback()
+            except Exception:
+                pass
+            self._failed_at = time.monotonic()
+            self.refresh_failures += 1
+            logger.error("Token version lookup failed", error=str(e))
+            return False
+
+        entry = (
+            (time.monotonic(), None, False) if row is None
+            else (time.monotonic(), int(row.token_version or 0), bool(row.is_active))
+        )
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self.refreshes += 1
+        return True
+
+    def _cached(self, user_id: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] >= self.refresh_seconds:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry
+
+    async def is_current(self, db: AsyncSession, user_id: str, version: int) -> Optional[bool]:
+        """
+        Check a token's version claim against the user's current one
+        Returns True/False, or None when it cannot be decided (lookup failed,
+        or the database still shows an older version than the token) and the
+        caller should look the user up instead
+        """
+        user_id = str(user_id)
+        entry = self._cached(user_id)
+        if entry is None or (entry[1] is not None and entry[1] < version):
+            # Not cached, expired, or a token newer than our copy: look the user up
+            if time.monotonic() - self._failed_at < MIN_FORCED_REFRESH_SECONDS:
+                return None
+            if not await self.refresh(db, user_id):
+                return None
+            entry = self._cached(user_id)
+            if entry is None:
+                return None
+        else:
+            self.hits += 1
+
+        _, current_version, is_active = entry
+        if current_version is None:
+            # No such user: deleted after the token was issued
+            return False
+        if current_version < version:
+            # A fresh token is never revoked by a lagging read
+            return None
+        return is_active and current_version == version
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": AUTH_TRUST_TOKEN_CLAIMS,
+            "users": len(self._entries),
+            "refresh_seconds": self.refresh_seconds,
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
+
+
+# Global token version cache
+token_versions = TokenVersionMap()
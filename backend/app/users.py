@@ -1,7 +1,15 @@
+import asyncio
+from fastapi import HTTPException
+from sqlalchemy import text
 from sqlalchemy.orm import Session
+from .database import SessionLocal
 from .models import User
 from .auth import verify_password, get_password_hash
 from .schemas import UserCreate
+from .password_hasher import password_hasher
+from .logging_config import get_logger
+
+logger = get_logger("users")
 
 def get_user_by_username(db: Session, username: str):
     return db.query(User).filter(User.username == username).first()
@@ -22,14 +30,39 @@ def create_user(db: Session, user: UserCreate):
     db.refresh(db_user)
     return db_user
 
-def authenticate_user(db: Session, username: str, password: str):
+def store_rehashed_password(user_id: str, old_hash: str, new_hash: str):
+    """Persist a policy-upgraded hash unless the password changed meanwhile"""
+    db = SessionLocal()
+    try:
+        db.execute(
+            text("UPDATE users SET hashed_password = :new_hash WHERE id = :user_id AND hashed_password = :old_hash"),
+            {"new_hash": new_hash, "user_id": user_id, "old_hash": old_hash}
+        )
+        db.commit()
+        logger.info("Password rehashed to current policy", user_id=user_id)
+    except Exception as e:
+        db.rollback()
+        logger.error("Failed to store rehashed password", user_id=user_id, error=str(e))
+    finally:
+        db.close()
+
+async def authenticate_user(db: Session, username: str, password: str):
     try:
         user = get_user_by_username(db, username)
         if not user:
             return False
-        if not verify_password(password, user.hashed_password):
+        valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+        if not valid:
             return False
+        if new_hash:
+            # Stored hash uses an old cost; save the upgraded one without delaying the login
+            asyncio.get_running_loop().run_in_executor(
+                None, store_rehashed_password, user.id, user.hashed_password, new_hash
+            )
         return user
+    except HTTPException:
+        # Hashing pool back-pressure (503) must reach the client
+        raise
     except Exception as e:
         # Log the error but don't expose it
         print(f"Authentication error for user {username}: {str(e)}")
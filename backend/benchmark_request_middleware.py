@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark: requests/sec on /health with the previous and current request middleware
+
+"previous" is the old stack: RequestLoggingMiddleware logging start and end
+plus the @app.middleware("http") add_request_id (a BaseHTTPMiddleware).
+"current" is the single pure ASGI RequestLoggingMiddleware. /health is a
+stub with the same shape as the real one, so no database is needed and the
+difference is middleware overhead. Log lines are rendered to JSON and dropped.
+
+    python benchmark_request_middleware.py [requests] [rounds]
+"""
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+import structlog
+from fastapi import FastAPI, Request
+
+from app.logging_config import RequestLoggingMiddleware, get_logger
+
+structlog.configure(
+    processors=[
+        structlog.contextvars.merge_contextvars,
+        structlog.processors.TimeStamper(fmt="iso"),
+        structlog.processors.JSONRenderer(),
+    ],
+    logger_factory=structlog.ReturnLoggerFactory(),
+)
+
+
+class PreviousRequestLoggingMiddleware:
+    """The old access log middleware: logs request start and completion"""
+
+    def __init__(self, app):
+        self.app = app
+        self.logger = get_logger("request")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start_time = datetime.now()
+        method, path = scope.get("method", ""), scope.get("path", "")
+        query_string = scope.get("query_string", b"").decode()
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        self.logger.info("Request started", method=method, path=path, query_string=query_string, client_ip=client_ip)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message.get("status", 500)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = (datetime.now() - start_time).total_seconds()
+            self.logger.info("Request completed", method=method, path=path, status_code=status_code,
+                             duration_seconds=duration, client_ip=client_ip)
+
+
+def build_app(previous: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy", "timestamp": datetime.utcnow().isoformat(), "database": "connected"}
+
+    if previous:
+        app.add_middleware(PreviousRequestLoggingMiddleware)
+
+        @app.middleware("http")
+        async def add_request_id(request: Request, call_next):
+            request_id = str(uuid.uuid4())
+            request.state.request_id = request_id
+            response = await call_next(request)
+            response.headers["X-Request-ID"] = request_id
+            return response
+    else:
+        app.add_middleware(RequestLoggingMiddleware)
+    return app
+
+
+async def requests_per_second(app: FastAPI, requests: int) -> float:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        assert "x-request-id" in (await client.get("/health")).headers
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.get("/health")
+        return requests / (time.perf_counter() - started)
+
+
+async def main(requests: int, rounds: int) -> None:
+    results = {}
+    for label, previous in (("previous", True), ("current", False)):
+        app = build_app(previous)
+        results[label] = statistics.median([await requests_per_second(app, requests) for _ in range(rounds)])
+        print(f"{label:>8}: {results[label]:.0f} requests/sec")
+    print(f"speedup: {results['current'] / results['previous']:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 5000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 3,
+    ))
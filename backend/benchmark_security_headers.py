@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-response overhead of SecurityHeadersMiddleware
+
+Runs a minimal ASGI app through the previous implementation (copied below)
+and the current one and prints the median cost per request.
+
+    python benchmark_security_headers.py [requests] [rounds]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from app.security import SecurityHeadersMiddleware
+
+RESPONSE_HEADERS = [
+    (b"content-type", b"application/json"),
+    (b"content-length", b"2"),
+    (b"set-cookie", b"a=1; Path=/"),
+    (b"set-cookie", b"b=2; Path=/"),
+]
+
+
+class PreviousSecurityHeadersMiddleware:
+    """The implementation this benchmark compares against (rebuilds a dict per response)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    headers = dict(message.get("headers", []))
+                    security_headers = {
+                        b"x-content-type-options": b"nosniff",
+                        b"x-frame-options": b"DENY",
+                        b"x-xss-protection": b"1; mode=block",
+                        b"strict-transport-security": b"max-age=31536000; includeSubDomains",
+                        b"content-security-policy": b"default-src 'self'",
+                        b"referrer-policy": b"strict-origin-when-cross-origin",
+                        b"permissions-policy": b"geolocation=(), microphone=(), camera=()"
+                    }
+                    for key, value in security_headers.items():
+                        headers[key] = value
+                    message["headers"] = list(headers.items())
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+        else:
+            await self.app(scope, receive, send)
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": list(RESPONSE_HEADERS)})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def run(middleware, requests: int) -> float:
+    scope = {"type": "http", "path": "/api/users", "method": "GET"}
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await middleware(scope, receive, send)
+    elapsed = time.perf_counter() - started
+    cookies = [value for name, value in sent[0]["headers"] if name == b"set-cookie"]
+    return elapsed / requests * 1e6, len(cookies)
+
+
+async def main(requests: int, rounds: int) -> None:
+    baseline = [(await run(endpoint, requests))[0] for _ in range(rounds)]
+    base = statistics.median(baseline)
+    print(f"bare app: {base:.2f} us/request")
+    for label, middleware in (
+        ("previous", PreviousSecurityHeadersMiddleware(endpoint)),
+        ("current", SecurityHeadersMiddleware(endpoint)),
+    ):
+        results = [await run(middleware, requests) for _ in range(rounds)]
+        median = statistics.median(per_request for per_request, _ in results)
+        print(f"{label:>8}: {median:.2f} us/request "
+              f"(+{median - base:.2f} us over bare app), set-cookie headers kept: {results[0][1]}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+    ))
@@ -3,12 +3,12 @@ from typing import List
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import User
-from app.auth import get_current_user
+from app.auth import get_current_user, get_current_principal
 from app.permissions import has_permission, can_access_role
 
 def require_permission(permission: str):
     """Dependency to require specific permission"""
-    def permission_checker(current_user = Depends(get_current_user)):
+    def permission_checker(current_user = Depends(get_current_principal)):
         if not has_permission(current_user.role, permission):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -19,7 +19,7 @@ def require_permission(permission: str):
 
 def require_roles(allowed_roles: List[str]):
     """Dependency to require specific roles (legacy support)"""
-    def role_checker(current_user = Depends(get_current_user)):
+    def role_checker(current_user = Depends(get_current_principal)):
         if not any(can_access_role(current_user.role, role) for role in allowed_roles):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
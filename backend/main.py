@@ -14,14 +14,31 @@ import json
 from contextlib import asynccontextmanager
 
 # Import our modules
-from app.database import get_db
+from app.database import get_db, engine, async_engine
+from app.db_metrics import pool_metrics, async_pool_metrics
 from app.models import User
-from app.schemas import UserLogin, Token, User as UserSchema, HealthCheck, ErrorResponse
-from app.auth import create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.schemas import UserLogin, Token, User as UserSchema, HealthCheck, ErrorResponse, RequestLogSamplingUpdate
+from app.auth import create_access_token, build_token_claims, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.auth_cache import principal_cache, rejected_tokens
+from app.token_versions import token_versions
 from app.users import authenticate_user
+from app.password_hasher import password_hasher
+from app.email_queue import EMAIL_QUEUE_ENABLED, email_queue
+from app.email_service import email_service
+from app.email_templates import email_templates
+from app.notification_counters import NOTIFICATION_COUNTER_RECONCILE_ENABLED, notification_counter_reconciler
+from app.notification_events import notification_broker
+from app.retention import RETENTION_ENABLED, retention_job
+from app.token_cleanup import RESET_TOKEN_CLEANUP_ENABLED, reset_token_cleanup
+from app.rate_limiter import counter_backend
 from app.security import (
     SecurityHeadersMiddleware, 
+    RateLimitHeadersMiddleware,
+    RATE_LIMIT_HEADERS,
     limiter, 
+    request_cost,
+    limiter_storage_stats,
+    stop_limiter_storage,
     rate_limit_auth, 
     rate_limit_api, 
     rate_limit_public,
@@ -32,11 +49,15 @@ from app.security import (
 )
 
 # Import new routers
-from routers import users, auth, employees
+from routers import users, auth, employees, notifications
+from dependencies.auth import require_superadmin
 from app.logging_config import (
     setup_logging, 
     get_logger, 
     RequestLoggingMiddleware,
+    get_request_id,
+    log_queue,
+    request_log_sampler,
     log_auth_event,
     log_error
 )
@@ -96,8 +117,34 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"❌ Error initializing admin user: {e}")
     
+    # Compile email templates before the first message needs them
+    try:
+        email_templates.warm()
+    except Exception as e:
+        logger.error(f"❌ Error compiling email templates: {e}")
+    
+    if EMAIL_QUEUE_ENABLED:
+        email_queue.start()
+    await notification_broker.start()
+    if NOTIFICATION_COUNTER_RECONCILE_ENABLED:
+        notification_counter_reconciler.start()
+    if RETENTION_ENABLED:
+        retention_job.start()
+    # Expired password reset tokens are removed here, not by the reset endpoints
+    if RESET_TOKEN_CLEANUP_ENABLED:
+        reset_token_cleanup.start()
+    
     yield
     # Shutdown
+    await reset_token_cleanup.stop()
+    await retention_job.stop()
+    await notification_counter_reconciler.stop()
+    await notification_broker.stop()
+    await email_queue.stop()
+    password_hasher.shutdown()
+    # Flush this worker's pending rate limit hits to the shared counters
+    stop_limiter_storage()
+    await async_engine.dispose()
     logger.info("Application shutting down")
 
 # Create FastAPI app with enhanced configuration
@@ -114,8 +161,9 @@ app = FastAPI(
 # Add security headers middleware
 app.add_middleware(SecurityHeadersMiddleware)
 
-# Add request logging middleware
-app.add_middleware(RequestLoggingMiddleware)
+# X-RateLimit-* headers for rate limited routes
+if RATE_LIMIT_HEADERS:
+    app.add_middleware(RateLimitHeadersMiddleware)
 
 # Enhanced CORS middleware with localhost support for development
 app.add_middleware(
@@ -145,9 +193,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["*"],
-    expose_headers=["X-Request-ID"]
+    expose_headers=["X-Request-ID", "X-Next-Cursor", "X-Prev-Cursor"]
 )
 
+# Request ID, timing and access log; added last so it wraps every other middleware
+app.add_middleware(RequestLoggingMiddleware)
+
 # Add rate limiting
 app.state.limiter = limiter
 
@@ -155,7 +206,7 @@ app.state.limiter = limiter
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle validation errors"""
-    request_id = str(uuid.uuid4())
+    request_id = get_request_id(request)
     
     # Convert errors to JSON-serializable format
     try:
@@ -195,7 +246,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """Handle HTTP exceptions"""
-    request_id = str(uuid.uuid4())
+    request_id = get_request_id(request)
     
     # Log security events for certain status codes
     if exc.status_code in [401, 403, 429]:
@@ -218,7 +269,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle unexpected exceptions"""
-    request_id = str(uuid.uuid4())
+    request_id = get_request_id(request)
     # Safely log error without causing JSON serialization issues
     try:
         log_error(exc, {
@@ -252,19 +303,9 @@ async def general_exception_handler(request: Request, exc: Exception):
         }
     )
 
-# Middleware to add request ID to all responses
-@app.middleware("http")
-async def add_request_id(request: Request, call_next):
-    request_id = str(uuid.uuid4())
-    request.state.request_id = request_id
-    
-    response = await call_next(request)
-    response.headers["X-Request-ID"] = request_id
-    return response
-
 # Routes
 @app.get("/", response_model=dict)
-@limiter.limit("200/minute")
+@limiter.limit("200/minute", cost=request_cost)
 async def root(request: Request):
     """Root endpoint with API information"""
     return {
@@ -276,7 +317,7 @@ async def root(request: Request):
     }
 
 @app.post("/auth/login", response_model=Token)
-@limiter.limit("5/minute")  # Strict rate limiting for auth
+@limiter.limit("5/minute", cost=request_cost)  # Strict rate limiting for auth
 async def login(request: Request, user_credentials: UserLogin, db: Session = Depends(get_db)):
     """Enhanced login endpoint with security features"""
     
@@ -308,7 +349,7 @@ async def login(request: Request, user_credentials: UserLogin, db: Session = Dep
             )
         
         # Authenticate user
-        user = authenticate_user(db, user_credentials.username, user_credentials.password)
+        user = await authenticate_user(db, user_credentials.username, user_credentials.password)
         if not user:
             log_auth_event(
                 "login_failed",
@@ -338,7 +379,7 @@ async def login(request: Request, user_credentials: UserLogin, db: Session = Dep
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user.username}, expires_delta=access_token_expires
+            data=build_token_claims(user), expires_delta=access_token_expires
         )
         
         # Log successful login
@@ -372,13 +413,13 @@ async def login(request: Request, user_credentials: UserLogin, db: Session = Dep
         )
 
 @app.get("/auth/me", response_model=UserSchema)
-@limiter.limit("100/minute")
+@limiter.limit("100/minute", cost=request_cost)
 async def read_users_me(request: Request, current_user: User = Depends(get_current_user)):
     """Get current user information"""
     return current_user
 
 @app.get("/dashboard")
-@limiter.limit("100/minute")
+@limiter.limit("100/minute", cost=request_cost)
 async def dashboard(request: Request, current_user: User = Depends(get_current_user)):
     """Enhanced dashboard endpoint with role-based access"""
     
@@ -410,24 +451,22 @@ async def dashboard(request: Request, current_user: User = Depends(get_current_u
     }
 
 @app.get("/health", response_model=HealthCheck)
-@limiter.limit("1000/minute")  # High limit for health checks
+@limiter.limit("1000/minute", cost=request_cost)  # High limit for health checks
 async def health_check(request: Request):
-    """Enhanced health check endpoint"""
+    """Liveness and database status (internal counters are under /admin/diagnostics)"""
     
     # Basic health check
     health_status = {
         "status": "healthy",
         "message": "Auth system is running",
-        "version": "1.0.0",
-        "environment": os.getenv('ENVIRONMENT', 'development')
+        "version": "1.0.0"
     }
     
     # Add database health check
     try:
-        from app.database import engine
         from sqlalchemy import text
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
         health_status["database"] = "connected"
     except Exception as e:
         logger.error("Database health check failed", error=str(e))
@@ -438,7 +477,7 @@ async def health_check(request: Request):
 
 # Additional security endpoints
 @app.get("/auth/validate-token")
-@limiter.limit("100/minute")
+@limiter.limit("100/minute", cost=request_cost)
 async def validate_token(request: Request, current_user: User = Depends(get_current_user)):
     """Validate JWT token"""
     return {
@@ -449,7 +488,7 @@ async def validate_token(request: Request, current_user: User = Depends(get_curr
     }
 
 @app.post("/auth/logout")
-@limiter.limit("100/minute")
+@limiter.limit("100/minute", cost=request_cost)
 async def logout(request: Request, current_user: User = Depends(get_current_user)):
     """Logout endpoint (for logging purposes)"""
     
@@ -729,23 +768,13 @@ async def reset_admin_password(db: Session = Depends(get_db)):
     """Reset admin password to default"""
     try:
         from app.auth import get_password_hash
-        from sqlalchemy import text
+        from app.safe_db import safe_get_user_by_username, safe_update_user
         
-        # Reset admin password
+        # Reset admin password (safe_update_user also revokes the admin's issued tokens)
         new_password = "admin123"
-        hashed_password = get_password_hash(new_password)
+        admin = safe_get_user_by_username(db, "admin")
         
-        result = db.execute(
-            text("""
-            UPDATE users 
-            SET hashed_password = :hashed_password
-            WHERE username = 'admin'
-            """),
-            {"hashed_password": hashed_password}
-        )
-        db.commit()
-        
-        if result.rowcount > 0:
+        if admin is not None and safe_update_user(db, admin.id, {"hashed_password": get_password_hash(new_password)}):
             return {
                 "status": "success",
                 "message": "Admin password reset successfully",
@@ -766,6 +795,47 @@ async def reset_admin_password(db: Session = Depends(get_db)):
 app.include_router(users.router, prefix="/api/users")
 app.include_router(auth.router)
 app.include_router(employees.router, prefix="/api")
+app.include_router(notifications.router, prefix="/api")
+
+# Per-process module counters (cache hit ratios, pools, queues, background jobs)
+@app.get("/admin/diagnostics")
+async def get_diagnostics(current_user = Depends(require_superadmin)):
+    """Internal module statistics, including last errors (SuperAdmin only)"""
+    return {
+        "auth_cache": principal_cache.stats(),
+        "rejected_tokens": rejected_tokens.stats(),
+        "token_versions": token_versions.stats(),
+        "password_hasher": password_hasher.stats(),
+        "db_pool": pool_metrics.snapshot(engine),
+        "db_pool_async": async_pool_metrics.snapshot(async_engine.sync_engine),
+        "email_queue": email_queue.stats(),
+        "smtp_pool": email_service.smtp_pool.stats(),
+        "email_templates": email_templates.stats(),
+        "notification_streams": notification_broker.stats(),
+        "notification_counters": notification_counter_reconciler.stats(),
+        "retention": retention_job.stats(),
+        "reset_token_cleanup": reset_token_cleanup.stats(),
+        "rate_limiter": counter_backend().stats(),
+        "limiter_storage": limiter_storage_stats(),
+        "logging": log_queue.stats(),
+        "request_logging": request_log_sampler.stats()
+    }
+
+# Access log sampling, adjustable without a redeploy (per process)
+@app.get("/admin/request-logging")
+async def get_request_logging(current_user = Depends(require_superadmin)):
+    """Current access log sampling settings and counters (SuperAdmin only)"""
+    return request_log_sampler.stats()
+
+@app.put("/admin/request-logging")
+async def update_request_logging(
+    settings: RequestLogSamplingUpdate,
+    current_user = Depends(require_superadmin)
+):
+    """Change access log sampling at runtime (SuperAdmin only)"""
+    request_log_sampler.configure(**settings.dict())
+    logger.info("Request log sampling updated", updated_by=current_user.username, **request_log_sampler.settings())
+    return request_log_sampler.stats()
 
 # Add missing roles config endpoint
 @app.get("/api/roles/config")
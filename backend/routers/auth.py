@@ -18,10 +18,14 @@ from app.schemas import (
     ResetPasswordRequest,
     ResetPasswordResponse
 )
-from app.auth import get_password_hash
+from app.password_hasher import password_hasher
+from app.auth_cache import principal_cache
+from app.token_versions import token_versions
 from app.security import rate_limit_auth, log_security_event
 from app.logging_config import get_logger
-from app.email_service import send_password_reset_email
+from app.email_service import queue_password_reset_email
+from app.email_queue import email_queue
+from app.rate_limiter import SlidingWindowLimiter
 
 logger = get_logger("auth_router")
 
@@ -43,32 +47,10 @@ def get_client_ip(request: Request) -> str:
         return forwarded.split(",")[0].strip()
     return request.client.host
 
-def cleanup_expired_tokens(db: Session):
-    """Clean up expired reset tokens"""
-    try:
-        expired_tokens = db.query(PasswordResetToken).filter(
-            PasswordResetToken.expires_at < datetime.utcnow()
-        ).all()
-        
-        for token in expired_tokens:
-            db.delete(token)
-        
-        db.commit()
-        logger.info(f"Cleaned up {len(expired_tokens)} expired reset tokens")
-    except Exception as e:
-        logger.error(f"Error cleaning up expired tokens: {e}")
-        db.rollback()
-
-def check_rate_limit(db: Session, ip_address: str) -> bool:
-    """Check if IP has exceeded rate limit for reset requests"""
-    window_start = datetime.utcnow() - timedelta(minutes=RESET_REQUEST_WINDOW_MINUTES)
-    
-    recent_requests = db.query(PasswordResetToken).filter(
-        PasswordResetToken.ip_address == ip_address,
-        PasswordResetToken.created_at >= window_start
-    ).count()
-    
-    return recent_requests < MAX_RESET_REQUESTS_PER_IP
+# Counts issued reset tokens per IP, so unknown or inactive emails never use up the budget
+password_reset_limiter = SlidingWindowLimiter(
+    "password_reset", MAX_RESET_REQUESTS_PER_IP, RESET_REQUEST_WINDOW_MINUTES * 60
+)
 
 @router.post("/forgot-password", response_model=ForgotPasswordResponse)
 async def forgot_password(
@@ -80,14 +62,11 @@ async def forgot_password(
     Request password reset - sends email with reset link
     """
     try:
-        # Clean up expired tokens first
-        cleanup_expired_tokens(db)
-        
         # Get client IP
         client_ip = get_client_ip(request)
         
-        # Check rate limiting
-        if not check_rate_limit(db, client_ip):
+        # Check and record the attempt in one step so concurrent requests share the budget
+        if not await password_reset_limiter.try_hit(client_ip):
             log_security_event(
                 "password_reset_rate_limit_exceeded",
                 {"ip": client_ip, "email": request_data.email},
@@ -95,7 +74,8 @@ async def forgot_password(
             )
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Too many password reset requests. Please try again later."
+                detail="Too many password reset requests. Please try again later.",
+                headers={"Retry-After": str(password_reset_limiter.retry_after(client_ip))}
             )
         
         # Find user by email
@@ -105,6 +85,7 @@ async def forgot_password(
             # For security, always return success even if email doesn't exist
             # This prevents email enumeration attacks
             logger.warning(f"Password reset requested for non-existent email: {request_data.email}")
+            await password_reset_limiter.release(client_ip)
             return ForgotPasswordResponse(
                 message="Password reset link sent to your email",
                 email=request_data.email
@@ -112,6 +93,7 @@ async def forgot_password(
         
         if not user.is_active:
             logger.warning(f"Password reset requested for inactive user: {request_data.email}")
+            await password_reset_limiter.release(client_ip)
             return ForgotPasswordResponse(
                 message="Password reset link sent to your email",
                 email=request_data.email
@@ -130,7 +112,10 @@ async def forgot_password(
         )
         
         db.add(token_record)
+        # Queued in the same transaction as the token; the email queue worker sends it
+        queue_password_reset_email(db, user.email, user.username, reset_token, user_id=user.id)
         db.commit()
+        email_queue.wake()
         
         # Log security event
         log_security_event(
@@ -144,13 +129,7 @@ async def forgot_password(
             request
         )
         
-        logger.info(f"Password reset token generated for user {user.email}")
-        
-        # Send email with reset link
-        email_sent = await send_password_reset_email(user.email, user.username, reset_token)
-        
-        if not email_sent:
-            logger.warning(f"Failed to send reset email to {user.email}, but token was created")
+        logger.info(f"Password reset token generated and email queued for user {user.email}")
         
         return ForgotPasswordResponse(
             message="Password reset link sent to your email",
@@ -176,9 +155,6 @@ async def verify_reset_token(
     Verify if reset token is valid and not expired
     """
     try:
-        # Clean up expired tokens first
-        cleanup_expired_tokens(db)
-        
         if not token:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -244,9 +220,6 @@ async def reset_password(
     Reset password using valid token
     """
     try:
-        # Clean up expired tokens first
-        cleanup_expired_tokens(db)
-        
         # Find token record
         token_record = db.query(PasswordResetToken).filter(
             PasswordResetToken.token == request_data.token
@@ -287,15 +260,18 @@ async def reset_password(
             )
         
         # Hash new password
-        hashed_password = get_password_hash(request_data.new_password)
+        hashed_password = await password_hasher.hash(request_data.new_password)
         
-        # Update user password
+        # Update user password and revoke previously issued access tokens
         user.hashed_password = hashed_password
+        user.token_version = (user.token_version or 0) + 1
         
         # Mark token as used
         token_record.used_at = datetime.utcnow()
         
         db.commit()
+        principal_cache.invalidate(user_id=user.id)
+        token_versions.mark_stale(user.id)
         
         # Get client IP
         client_ip = get_client_ip(request)
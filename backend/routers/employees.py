@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import case, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+from datetime import datetime
+from app.database import get_async_db
 from app.models_hr import HREmployee
 from app.models import User
+from app.export import export_response
+from app.pagination import decode_cursor, encode_cursor
 from app.schemas import EmployeeCreate, EmployeeUpdate, EmployeeRecord
 from dependencies.auth import require_employee_manage, require_hr_access
 from app.auth import get_current_user
@@ -11,15 +15,17 @@ from app.auth import get_current_user
 router = APIRouter(prefix="/employees", tags=["employees"])
 
 @router.post("/", response_model=EmployeeRecord, status_code=status.HTTP_201_CREATED)
-async def create_employee(payload: EmployeeCreate, db: Session = Depends(get_db), current_user=Depends(require_employee_manage)):
+async def create_employee(payload: EmployeeCreate, db: AsyncSession = Depends(get_async_db), current_user=Depends(require_employee_manage)):
     # Check duplicate emp_code
-    exists = db.query(HREmployee).filter(HREmployee.emp_code == payload.emp_code.upper()).first()
+    exists = (await db.execute(
+        select(HREmployee.employee_id).where(HREmployee.emp_code == payload.emp_code.upper())
+    )).first()
     if exists:
         raise HTTPException(status_code=409, detail="emp_code already exists")
 
     # Optional user linkage validation
     if payload.user_id:
-        user = db.query(User).filter(User.id == payload.user_id).first()
+        user = (await db.execute(select(User.id).where(User.id == payload.user_id))).first()
         if not user:
             raise HTTPException(status_code=404, detail="Linked user not found")
 
@@ -41,57 +47,147 @@ async def create_employee(payload: EmployeeCreate, db: Session = Depends(get_db)
         updated_by=current_user.id,
     )
     db.add(employee)
-    db.commit()
-    db.refresh(employee)
+    await db.commit()
+    await db.refresh(employee)
     return employee
 
+EMPLOYEE_LIST_DEFAULT_LIMIT = 100
+EMPLOYEE_LIST_MAX_LIMIT = 500
+
+def _search_rank(dialect: str, term: str):
+    """
+    Relevance of an employee row for a search term
+
+    PostgreSQL ranks by pg_trgm similarity (the ILIKE filter itself is served
+    by the gin_trgm_ops indexes). Other databases get a coarse
+    exact > prefix > substring ranking.
+    """
+    if dialect == "postgresql":
+        return func.greatest(
+            func.similarity(HREmployee.emp_code, term),
+            func.similarity(HREmployee.first_name, term),
+            func.similarity(HREmployee.last_name, term),
+        )
+
+    lowered = term.lower()
+    prefix = f"{lowered}%"
+    return case(
+        (func.lower(HREmployee.emp_code) == lowered, 1.0),
+        ((func.lower(HREmployee.first_name) == lowered) | (func.lower(HREmployee.last_name) == lowered), 0.9),
+        (func.lower(HREmployee.emp_code).like(prefix), 0.7),
+        ((func.lower(HREmployee.first_name).like(prefix)) | (func.lower(HREmployee.last_name).like(prefix)), 0.6),
+        else_=0.3,
+    )
+
 @router.get("/", response_model=List[EmployeeRecord])
 async def list_employees(
+    response: Response,
     department: Optional[str] = Query(None),
     active: Optional[bool] = Query(None),
-    q: Optional[str] = Query(None, description="Search first/last name or emp_code"),
-    db: Session = Depends(get_db),
+    q: Optional[str] = Query(None, description="Search first/last name or emp_code (results ranked by relevance)"),
+    limit: Optional[int] = Query(None, ge=1, le=EMPLOYEE_LIST_MAX_LIMIT, description="Page size (omit with cursor for every employee)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header from the previous page"),
+    db: AsyncSession = Depends(get_async_db),
     current_user=Depends(require_hr_access)
 ):
-    query = db.query(HREmployee)
+    """
+    List employees, optionally one page at a time
+
+    Without q the list is ordered by emp_code; with q it is ordered by search
+    rank. Sending limit or cursor pages the list: when more rows exist the
+    cursor for the next page is returned in the X-Next-Cursor header. With
+    neither, every matching employee is returned.
+    """
+    paged = limit is not None or cursor is not None
+    if paged and limit is None:
+        limit = EMPLOYEE_LIST_DEFAULT_LIMIT
+    query = select(HREmployee)
     if department:
-        query = query.filter(HREmployee.department == department)
+        query = query.where(HREmployee.department == department)
     if active is not None:
-        query = query.filter(HREmployee.active_status == active)
+        query = query.where(HREmployee.active_status == active)
+
     if q:
         like_term = f"%{q}%"
-        query = query.filter(
+        query = query.where(
             (HREmployee.first_name.ilike(like_term)) |
             (HREmployee.last_name.ilike(like_term)) |
             (HREmployee.emp_code.ilike(like_term))
         )
-    return query.order_by(HREmployee.emp_code.asc()).all()
+        rank = _search_rank(db.bind.dialect.name, q).label("rank")
+        query = query.add_columns(rank)
+        if cursor:
+            last_rank, last_id = decode_cursor(cursor, kind="rank")
+            query = query.where(tuple_(rank, HREmployee.employee_id) < tuple_(last_rank, last_id))
+        query = query.order_by(rank.desc(), HREmployee.employee_id.desc())
+    else:
+        if cursor:
+            last_code, last_id = decode_cursor(cursor, kind="emp_code")
+            query = query.where(tuple_(HREmployee.emp_code, HREmployee.employee_id) > tuple_(last_code, last_id))
+        query = query.order_by(HREmployee.emp_code.asc(), HREmployee.employee_id.asc())
+
+    if not paged:
+        return [row.HREmployee for row in (await db.execute(query)).all()]
+
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = (
+            encode_cursor(float(last.rank), last.HREmployee.employee_id, kind="rank") if q
+            else encode_cursor(last.HREmployee.emp_code, last.HREmployee.employee_id, kind="emp_code")
+        )
+    return [row.HREmployee for row in rows]
+
+EMPLOYEE_EXPORT_FIELDS = tuple(EmployeeRecord.model_fields)
+
+@router.get("/export")
+async def export_employees(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="ndjson or csv"),
+    department: Optional[str] = Query(None),
+    active: Optional[bool] = Query(None),
+    current_user=Depends(require_hr_access)
+):
+    """Stream every employee as NDJSON or CSV"""
+    table = HREmployee.__table__
+    query = select(*(table.c[field] for field in EMPLOYEE_EXPORT_FIELDS))
+    if department:
+        query = query.where(table.c.department == department)
+    if active is not None:
+        query = query.where(table.c.active_status == active)
+
+    return export_response(
+        query.order_by(table.c.emp_code.asc()),
+        EMPLOYEE_EXPORT_FIELDS,
+        format,
+        f"employees-{datetime.utcnow():%Y%m%d}",
+    )
 
 @router.get("/{employee_id}", response_model=EmployeeRecord)
-async def get_employee(employee_id: int, db: Session = Depends(get_db), current_user=Depends(require_hr_access)):
-    emp = db.query(HREmployee).filter(HREmployee.employee_id == employee_id).first()
+async def get_employee(employee_id: int, db: AsyncSession = Depends(get_async_db), current_user=Depends(require_hr_access)):
+    emp = await db.get(HREmployee, employee_id)
     if not emp:
         raise HTTPException(status_code=404, detail="Employee not found")
     return emp
 
 @router.patch("/{employee_id}", response_model=EmployeeRecord)
-async def update_employee(employee_id: int, payload: EmployeeUpdate, db: Session = Depends(get_db), current_user=Depends(require_employee_manage)):
-    emp = db.query(HREmployee).filter(HREmployee.employee_id == employee_id).first()
+async def update_employee(employee_id: int, payload: EmployeeUpdate, db: AsyncSession = Depends(get_async_db), current_user=Depends(require_employee_manage)):
+    emp = await db.get(HREmployee, employee_id)
     if not emp:
         raise HTTPException(status_code=404, detail="Employee not found")
     data = payload.dict(exclude_unset=True)
     for field, value in data.items():
         setattr(emp, field, value)
     emp.updated_by = current_user.id
-    db.commit()
-    db.refresh(emp)
+    await db.commit()
+    await db.refresh(emp)
     return emp
 
 @router.delete("/{employee_id}")
-async def delete_employee(employee_id: int, db: Session = Depends(get_db), current_user=Depends(require_employee_manage)):
-    emp = db.query(HREmployee).filter(HREmployee.employee_id == employee_id).first()
+async def delete_employee(employee_id: int, db: AsyncSession = Depends(get_async_db), current_user=Depends(require_employee_manage)):
+    emp = await db.get(HREmployee, employee_id)
     if not emp:
         raise HTTPException(status_code=404, detail="Employee not found")
-    db.delete(emp)
-    db.commit()
+    await db.delete(emp)
+    await db.commit()
     return {"message": "Employee deleted"}
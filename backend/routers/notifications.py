@@ -2,13 +2,30 @@
 API Router for Notification Management
 Handles in-app notifications and assignment summaries
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List
+import asyncio
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Query
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
-from app.database import get_db
-from app.models import User
-from app.schemas import NotificationRecord, NotificationUpdate, AssignmentSummary
+from app import safe_db_async
+from app.auth import decode_token, security
+from app.database import AsyncSessionLocal, get_async_db
+from app.models import Notification, User
+from app.notification_counters import adjust_unread
+from app.pagination import decode_cursor, encode_cursor
+from app.notification_events import NOTIFICATION_STREAM_HEARTBEAT_SECONDS, format_sse, notification_broker
+from app.stream_tickets import (
+    NOTIFICATION_STREAM_TICKET_SECONDS, grant_for_token, grant_revocation_reason,
+    issue_stream_ticket, redeem_stream_ticket
+)
+from app.schemas import (
+    NotificationRecord, NotificationUpdate, AssignmentSummary,
+    BulkNotificationCreate, BulkNotificationResult, StreamTicket
+)
 from dependencies.auth import get_current_user, require_roles
 from services.notification_service import NotificationService
 from services.user_assignment_service import UserAssignmentService
@@ -18,38 +35,77 @@ logger = structlog.get_logger()
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
+# EventSource cannot set headers, so the stream also accepts a single-use ?ticket=
+stream_bearer = HTTPBearer(auto_error=False)
+
+def _notification_position(cursor: str):
+    created_at, notification_id = decode_cursor(cursor)
+    if not isinstance(created_at, datetime) or not isinstance(notification_id, int):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return created_at, notification_id
+
 @router.get("/", response_model=List[NotificationRecord])
 async def get_notifications(
+    response: Response,
     unread_only: bool = Query(False, description="Return only unread notifications"),
     limit: int = Query(50, ge=1, le=100, description="Maximum number of notifications to return"),
-    db: Session = Depends(get_db),
+    before: Optional[str] = Query(None, description="X-Next-Cursor of a previous page: older notifications"),
+    after: Optional[str] = Query(None, description="X-Prev-Cursor of a previous page: newer notifications"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Get notifications for current user
+    Get notifications for current user, newest first
+
+    X-Next-Cursor (pass as before=) is set when older notifications remain;
+    X-Prev-Cursor (pass as after=) points at the newest one returned.
     """
+    if before and after:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use either before or after, not both"
+        )
+    before_position = _notification_position(before) if before else None
+    after_position = _notification_position(after) if after else None
+    
     try:
         notification_service = NotificationService(db)
         notifications = await notification_service.get_notifications(
             user_id=current_user.id,
-            unread_only=unread_only
+            unread_only=unread_only,
+            limit=limit + 1,
+            before=before_position,
+            after=after_position
         )
         
-        # Limit results
-        limited_notifications = notifications[:limit]
-        
-        return [NotificationRecord.from_orm(notif) for notif in limited_notifications]
-        
     except Exception as e:
         logger.error(f"Failed to get notifications for user {current_user.id}: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve notifications"
         )
+    
+    if after_position:
+        # The extra row is the one furthest from the cursor, i.e. the newest
+        notifications = notifications[-limit:]
+    elif len(notifications) > limit:
+        notifications = notifications[:limit]
+        oldest = notifications[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(oldest.created_at, oldest.id)
+    
+    if notifications:
+        response.headers["X-Prev-Cursor"] = encode_cursor(notifications[0].created_at, notifications[0].id)
+    elif after:
+        response.headers["X-Prev-Cursor"] = after
+    
+    return [NotificationRecord.from_orm(notif) for notif in notifications]
 
 @router.get("/count")
 async def get_unread_count(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -68,11 +124,136 @@ async def get_unread_count(
             detail="Failed to get unread count"
         )
 
+@router.post("/bulk", response_model=BulkNotificationResult, status_code=status.HTTP_201_CREATED)
+async def create_bulk_notifications(
+    bulk: BulkNotificationCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_roles(["system_admin", "superadmin", "hr"]))
+):
+    """
+    Send the same notification to every user matching roles, user ids or departments
+    All rows are inserted in one statement and one transaction
+    """
+    try:
+        notification_service = NotificationService(db)
+        notification_ids = await notification_service.notify_recipients(
+            recipients=bulk.recipients,
+            notification_type=bulk.type,
+            title=bulk.title,
+            message=bulk.message,
+            action_url=bulk.action_url,
+            employee_id=bulk.employee_id,
+            user_id=current_user.id
+        )
+        
+        logger.info(f"Bulk notification sent by {current_user.username}", 
+                   type=bulk.type, recipients=len(notification_ids))
+        
+        return BulkNotificationResult(created=len(notification_ids), notification_ids=notification_ids)
+        
+    except Exception as e:
+        logger.error(f"Failed to create bulk notifications: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create notifications"
+        )
+
+@router.post("/stream-ticket", response_model=StreamTicket)
+async def create_stream_ticket(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Single-use ticket for GET /notifications/stream?ticket=...
+    EventSource cannot send the Authorization header, and the access token
+    itself must not travel in a URL.
+    """
+    grant = await grant_for_token(db, current_user.id, decode_token(credentials.credentials))
+    return StreamTicket(ticket=issue_stream_ticket(grant), expires_in=NOTIFICATION_STREAM_TICKET_SECONDS)
+
+@router.get("/stream")
+async def stream_notifications(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(stream_bearer),
+    ticket: Optional[str] = Query(None, description="Single-use ticket from POST /notifications/stream-ticket")
+):
+    """
+    Server-Sent Events stream of the current user's notifications
+    Sends the unread count on connect, then "notification" and "unread_count"
+    (delta) events as they happen, with a keep-alive comment in between.
+    The access token's expiry and revocation are re-checked every heartbeat;
+    the stream ends with a "session_expired" event when either fails.
+    """
+    if credentials:
+        payload = decode_token(credentials.credentials)
+        grant = None
+    elif ticket:
+        grant = await redeem_stream_ticket(ticket)
+        payload = grant
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    # A short-lived session: the stream must not hold a pool connection open
+    async with AsyncSessionLocal() as db:
+        user = await safe_db_async.safe_get_user_by_username(db, payload["sub"])
+        if user is None or not user.is_active or (grant and grant["uid"] != str(user.id)):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        if grant is None:
+            grant = await grant_for_token(db, user.id, payload)
+        if await grant_revocation_reason(db, grant):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        unread_count = await NotificationService(db).get_unread_count(user.id)
+    
+    queue = notification_broker.subscribe(user.id)
+    
+    async def event_stream():
+        loop = asyncio.get_running_loop()
+        next_check = loop.time() + NOTIFICATION_STREAM_HEARTBEAT_SECONDS
+        try:
+            yield "retry: 5000\n\n"
+            yield format_sse("unread_count", {"unread_count": unread_count})
+            while not await request.is_disconnected():
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=NOTIFICATION_STREAM_HEARTBEAT_SECONDS)
+                    frame = format_sse(event, data)
+                except asyncio.TimeoutError:
+                    frame = ": keep-alive\n\n"
+                if loop.time() >= next_check:
+                    next_check = loop.time() + NOTIFICATION_STREAM_HEARTBEAT_SECONDS
+                    async with AsyncSessionLocal() as db:
+                        reason = await grant_revocation_reason(db, grant)
+                    if reason:
+                        logger.info("Closing notification stream", user_id=user.id, reason=reason)
+                        yield format_sse("session_expired", {"reason": reason})
+                        return
+                yield frame
+        finally:
+            notification_broker.unsubscribe(user.id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.patch("/{notification_id}", response_model=NotificationRecord)
 async def update_notification(
     notification_id: int,
     notification_update: NotificationUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -93,11 +274,12 @@ async def update_notification(
                 )
         
         # Return updated notification
-        from app.models import Notification
-        notification = db.query(Notification).filter(
-            Notification.id == notification_id,
-            Notification.recipient_user_id == current_user.id
-        ).first()
+        notification = (await db.execute(
+            select(Notification).where(
+                Notification.id == notification_id,
+                Notification.recipient_user_id == current_user.id
+            )
+        )).scalars().first()
         
         if not notification:
             raise HTTPException(
@@ -118,22 +300,28 @@ async def update_notification(
 
 @router.post("/mark-all-read")
 async def mark_all_read(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Mark all notifications as read for current user
     """
     try:
-        from app.models import Notification
-        
         # Update all unread notifications for current user
-        updated_count = db.query(Notification).filter(
-            Notification.recipient_user_id == current_user.id,
-            Notification.read == False
-        ).update({"read": True})
+        result = await db.execute(
+            update(Notification)
+            .where(
+                Notification.recipient_user_id == current_user.id,
+                Notification.read == False
+            )
+            .values(read=True)
+        )
+        updated_count = result.rowcount
+        await adjust_unread(db, [current_user.id], -updated_count)
         
-        db.commit()
+        await db.commit()
+        if updated_count:
+            await notification_broker.publish(current_user.id, "unread_count", {"delta": -updated_count})
         
         logger.info(f"Marked {updated_count} notifications as read for user {current_user.username}")
         
@@ -141,7 +329,7 @@ async def mark_all_read(
         
     except Exception as e:
         logger.error(f"Failed to mark all notifications as read for user {current_user.id}: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to mark notifications as read"
@@ -149,7 +337,7 @@ async def mark_all_read(
 
 @router.get("/assignment-summary", response_model=AssignmentSummary)
 async def get_assignment_summary(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(require_roles(["system_admin", "superadmin", "hr"]))
 ):
     """
@@ -171,28 +359,35 @@ async def get_assignment_summary(
 @router.delete("/{notification_id}")
 async def delete_notification(
     notification_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Delete notification for current user
     """
     try:
-        from app.models import Notification
-        
-        notification = db.query(Notification).filter(
-            Notification.id == notification_id,
-            Notification.recipient_user_id == current_user.id
-        ).first()
+        # DELETE ... RETURNING: a concurrent mark-read or delete cannot make us decrement twice
+        deleted = (await db.execute(
+            delete(Notification)
+            .where(
+                Notification.id == notification_id,
+                Notification.recipient_user_id == current_user.id
+            )
+            .returning(Notification.read)
+            .execution_options(synchronize_session=False)
+        )).all()
         
-        if not notification:
+        if not deleted:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Notification not found"
             )
         
-        db.delete(notification)
-        db.commit()
+        unread_deleted = sum(1 for row in deleted if not row.read)
+        await adjust_unread(db, [current_user.id], -unread_deleted)
+        await db.commit()
+        if unread_deleted:
+            await notification_broker.publish(current_user.id, "unread_count", {"delta": -unread_deleted})
         
         logger.info(f"Notification {notification_id} deleted by user {current_user.username}")
         
@@ -202,7 +397,7 @@ async def delete_notification(
         raise
     except Exception as e:
         logger.error(f"Failed to delete notification {notification_id}: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete notification"
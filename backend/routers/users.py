@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List, Dict, Any
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any, Literal, Optional, Tuple
+from app.database import get_async_db
 from app.schemas import UserCreate, UserUpdate, PasswordChange
 from app.auth import get_current_user
-from app.safe_db import (
+from app.auth_cache import principal_cache
+from app.token_versions import token_versions
+from app.safe_db_async import (
     safe_get_user_by_id, 
     safe_get_user_by_username,
     safe_check_user_exists,
@@ -13,61 +15,145 @@ from app.safe_db import (
     check_table_schema
 )
 from dependencies.auth import require_admin_or_superadmin, require_superadmin
-from passlib.context import CryptContext
+from app.export import export_response
+from app.pagination import decode_cursor, encode_cursor, estimate_row_count, parse_fields
+from app.password_hasher import password_hasher
 from datetime import datetime
-from sqlalchemy import text
+from sqlalchemy import Boolean, DateTime, bindparam, text
 import uuid
 
 router = APIRouter(tags=["users"])
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Columns a client may request through fields= on the list endpoint
+USER_LIST_FIELDS = ("id", "username", "email", "role", "is_active", "created_at", "last_login", "employee_id")
+USER_LIST_DEFAULT_LIMIT = 50
+USER_LIST_MAX_LIMIT = 500
 
 # Simple response model
-def user_response(row) -> Dict[str, Any]:
-    """Convert database row to response dict"""
-    return {
-        "id": row.id,
-        "username": row.username,
-        "email": row.email,
-        "role": row.role,
-        "is_active": row.is_active,
-        "created_at": row.created_at.isoformat() if row.created_at else None,
-        "last_login": row.last_login.isoformat() if row.last_login else None,
-        "employee_id": getattr(row, 'employee_id', None)
-    }
+def user_response(row, fields: Tuple[str, ...] = USER_LIST_FIELDS) -> Dict[str, Any]:
+    """Convert database row to response dict, limited to fields"""
+    data = {}
+    for field in fields:
+        value = getattr(row, field, None)
+        data[field] = value.isoformat() if isinstance(value, datetime) else value
+    return data
 
 @router.get("")
 async def list_users(
-    db: Session = Depends(get_db),
+    limit: Optional[int] = Query(None, ge=1, le=USER_LIST_MAX_LIMIT, description="Page size (omit with cursor for every user)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    role: Optional[str] = Query(None, description="Only users with this role"),
+    is_active: Optional[bool] = Query(None, description="Only active/inactive users"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return (id is always included)"),
+    include_total: bool = Query(False, description="Also return an estimated total for the filters"),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(require_admin_or_superadmin)
 ):
-    """List all users (Admin/SuperAdmin only)"""
+    """
+    List users newest first (Admin/SuperAdmin only)
+
+    Pages with a keyset cursor on (created_at, id), backed by
+    ix_users_created_at_id, so deep pages cost the same as the first one.
+    Without limit or cursor every user is returned in one response, as the
+    user management page expects.
+    """
+    paged = limit is not None or cursor is not None
+    if paged and limit is None:
+        limit = USER_LIST_DEFAULT_LIMIT
+    columns = parse_fields(fields, USER_LIST_FIELDS)
+    conditions = []
+    params: Dict[str, Any] = {}
+
+    if role:
+        conditions.append("role = :role")
+        params["role"] = role
+    if is_active is not None:
+        conditions.append("is_active = :is_active")
+        params["is_active"] = is_active
+    filter_sql = " AND ".join(conditions)
+
+    page_conditions = list(conditions)
+    if cursor:
+        params["cursor_created_at"], params["cursor_id"] = decode_cursor(cursor)
+        page_conditions.append("(created_at, id) < (:cursor_created_at, :cursor_id)")
+
     try:
-        # Use raw SQL to avoid model conflicts
-        result = db.execute(
-            text("SELECT id, username, email, role, is_active, created_at, last_login, employee_id FROM users ORDER BY created_at DESC")
-        ).fetchall()
-        
-        users = [user_response(row) for row in result]
-        return {"users": users, "total": len(users)}
+        # created_at and id are always selected, the cursor is built from them
+        select_columns = ", ".join(dict.fromkeys(columns + ("created_at",)))
+        query = text(f"""
+            SELECT {select_columns} FROM users
+            {"WHERE " + " AND ".join(page_conditions) if page_conditions else ""}
+            ORDER BY created_at DESC, id DESC
+            {"LIMIT :limit" if paged else ""}
+        """)
+        if cursor:
+            query = query.bindparams(bindparam("cursor_created_at", type_=DateTime))
+        query = query.columns(
+            created_at=DateTime,
+            **{name: type_ for name, type_ in (("is_active", Boolean), ("last_login", DateTime)) if name in columns}
+        )
+
+        rows = (await db.execute(query, {**params, "limit": limit + 1} if paged else params)).fetchall()
+        has_more = paged and len(rows) > limit
+        rows = rows[:limit]
+
+        response = {
+            "users": [user_response(row, columns) for row in rows],
+            "count": len(rows),
+            "has_more": has_more,
+            "next_cursor": encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+        }
+        if not paged:
+            response["total"] = len(rows)
+        elif include_total:
+            response["total"] = await estimate_row_count(db, "users", filter_sql, params)
+        return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to fetch users: {str(e)}"
         )
 
+@router.get("/export")
+async def export_users(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="ndjson or csv"),
+    role: Optional[str] = Query(None, description="Only users with this role"),
+    is_active: Optional[bool] = Query(None, description="Only active/inactive users"),
+    current_user = Depends(require_admin_or_superadmin)
+):
+    """Stream every user as NDJSON or CSV (Admin/SuperAdmin only)"""
+    conditions = []
+    params: Dict[str, Any] = {}
+    if role:
+        conditions.append("role = :role")
+        params["role"] = role
+    if is_active is not None:
+        conditions.append("is_active = :is_active")
+        params["is_active"] = is_active
+
+    query = text(f"""
+        SELECT {", ".join(USER_LIST_FIELDS)} FROM users
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY created_at DESC, id DESC
+    """).bindparams(**params).columns(is_active=Boolean, created_at=DateTime, last_login=DateTime)
+
+    return export_response(query, USER_LIST_FIELDS, format, f"users-{datetime.utcnow():%Y%m%d}")
+
 @router.post("")
 async def create_user(
     user_data: UserCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(require_admin_or_superadmin)
 ):
     """Create new user (Admin/SuperAdmin only)"""
     try:
         # Check if user already exists using safe function
-        if safe_check_user_exists(db, username=user_data.username, email=user_data.email):
+        if await safe_check_user_exists(db, username=user_data.username, email=user_data.email):
             # More specific check to determine which field conflicts
-            if safe_check_user_exists(db, username=user_data.username):
+            if await safe_check_user_exists(db, username=user_data.username):
                 raise HTTPException(
                     status_code=status.HTTP_409_CONFLICT,
                     detail="Username already registered"
@@ -79,12 +165,12 @@ async def create_user(
                 )
 
         # Hash password and create user
-        hashed_password = pwd_context.hash(user_data.password)
+        hashed_password = await password_hasher.hash(user_data.password)
         user_id = str(uuid.uuid4())
         
         try:
             # Insert new user with essential fields only
-            db.execute(
+            await db.execute(
                 text("""
                 INSERT INTO users (id, username, email, hashed_password, role, is_active, created_at)
                 VALUES (:id, :username, :email, :hashed_password, :role, :is_active, :created_at)
@@ -99,18 +185,18 @@ async def create_user(
                     "created_at": datetime.utcnow()
                 }
             )
-            db.commit()
+            await db.commit()
             
             # Return created user data directly for frontend compatibility
-            new_user = db.execute(
+            new_user = (await db.execute(
                 text("SELECT id, username, email, role, is_active, created_at, last_login, employee_id FROM users WHERE id = :id"),
                 {"id": user_id}
-            ).fetchone()
+            )).fetchone()
             
             return user_response(new_user)
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to create user: {str(e)}"
@@ -127,12 +213,12 @@ async def create_user(
 @router.get("/{user_id}")
 async def get_user(
     user_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(require_admin_or_superadmin)
 ):
     """Get specific user by ID"""
     try:
-        user = safe_get_user_by_id(db, user_id)
+        user = await safe_get_user_by_id(db, user_id)
         
         if not user:
             raise HTTPException(
@@ -162,13 +248,13 @@ async def get_user(
 async def update_user(
     user_id: str,
     user_data: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(require_admin_or_superadmin)
 ):
     """Update user (Admin/SuperAdmin only)"""
     try:
         # Check if user exists using safe function
-        existing_user = safe_get_user_by_id(db, user_id)
+        existing_user = await safe_get_user_by_id(db, user_id)
         
         if not existing_user:
             raise HTTPException(
@@ -192,7 +278,7 @@ async def update_user(
             updates["is_active"] = user_data.is_active
         
         if hasattr(user_data, 'password') and user_data.password:
-            updates["hashed_password"] = pwd_context.hash(user_data.password)
+            updates["hashed_password"] = await password_hasher.hash(user_data.password)
         
         # Handle employee_id assignment
         if hasattr(user_data, 'employee_id'):
@@ -202,7 +288,7 @@ async def update_user(
                     SELECT employee_id, user_id FROM hr_employees 
                     WHERE employee_id = :employee_id
                 """)
-                employee_result = db.execute(check_employee_query, {"employee_id": user_data.employee_id})
+                employee_result = await db.execute(check_employee_query, {"employee_id": user_data.employee_id})
                 employee = employee_result.fetchone()
                 
                 if not employee:
@@ -220,25 +306,25 @@ async def update_user(
                 # Unassign previous employee if user had one
                 if existing_user.employee_id and existing_user.employee_id != user_data.employee_id:
                     unassign_prev_query = text("UPDATE hr_employees SET user_id = NULL WHERE employee_id = :employee_id")
-                    db.execute(unassign_prev_query, {"employee_id": existing_user.employee_id})
+                    await db.execute(unassign_prev_query, {"employee_id": existing_user.employee_id})
                 
                 # Update employee assignment (only if not already assigned to this user)
                 if employee.user_id != user_id:
                     update_employee_query = text("UPDATE hr_employees SET user_id = :user_id WHERE employee_id = :employee_id")
-                    db.execute(update_employee_query, {"user_id": user_id, "employee_id": user_data.employee_id})
+                    await db.execute(update_employee_query, {"user_id": user_id, "employee_id": user_data.employee_id})
                 
                 updates["employee_id"] = user_data.employee_id
             else:
                 # Unassign employee if employee_id is None
                 if existing_user.employee_id:
                     unassign_employee_query = text("UPDATE hr_employees SET user_id = NULL WHERE employee_id = :employee_id")
-                    db.execute(unassign_employee_query, {"employee_id": existing_user.employee_id})
+                    await db.execute(unassign_employee_query, {"employee_id": existing_user.employee_id})
                 
                 updates["employee_id"] = None
         
         # Use safe update function
         if updates:
-            success = safe_update_user(db, user_id, updates)
+            success = await safe_update_user(db, user_id, updates)
             if not success:
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -246,7 +332,7 @@ async def update_user(
                 )
         
         # Return updated user using safe function
-        updated_user = safe_get_user_by_id(db, user_id)
+        updated_user = await safe_get_user_by_id(db, user_id)
         
         return {
             "id": updated_user.id,
@@ -261,7 +347,7 @@ async def update_user(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to update user: {str(e)}"
@@ -270,13 +356,13 @@ async def update_user(
 @router.delete("/{user_id}")
 async def delete_user(
     user_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(require_superadmin)  # Only SuperAdmin can delete
 ):
     """Delete user (SuperAdmin only)"""
     try:
         # Check if user exists using safe function
-        existing_user = safe_get_user_by_id(db, user_id)
+        existing_user = await safe_get_user_by_id(db, user_id)
         
         if not existing_user:
             raise HTTPException(
@@ -292,7 +378,7 @@ async def delete_user(
             )
         
         # Delete user using safe SQL
-        result = db.execute(
+        result = await db.execute(
             text("DELETE FROM users WHERE id = :user_id"),
             {"user_id": user_id}
         )
@@ -303,7 +389,9 @@ async def delete_user(
                 detail="User not found or already deleted"
             )
         
-        db.commit()
+        await db.commit()
+        principal_cache.invalidate(user_id=user_id)
+        token_versions.mark_stale(user_id)
         
         return {
             "message": "User deleted successfully", 
@@ -314,7 +402,7 @@ async def delete_user(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to delete user: {str(e)}"
@@ -324,13 +412,13 @@ async def delete_user(
 async def change_user_password(
     user_id: str,
     password_data: PasswordChange,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(require_admin_or_superadmin)
 ):
     """Change user password (Admin/SuperAdmin only)"""
     try:
         # Check if user exists
-        existing_user = safe_get_user_by_id(db, user_id)
+        existing_user = await safe_get_user_by_id(db, user_id)
         
         if not existing_user:
             raise HTTPException(
@@ -339,10 +427,10 @@ async def change_user_password(
             )
         
         # Hash new password
-        hashed_password = pwd_context.hash(password_data.new_password)
+        hashed_password = await password_hasher.hash(password_data.new_password)
         
         # Update password using safe function
-        success = safe_update_user(db, user_id, {"hashed_password": hashed_password})
+        success = await safe_update_user(db, user_id, {"hashed_password": hashed_password})
         
         if not success:
             raise HTTPException(
@@ -369,7 +457,7 @@ async def change_user_password(
 @router.post("/assign-employee")
 async def assign_employee(
     assignment: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(require_superadmin)
 ):
     """Assign user to employee (SystemAdmin only)"""
@@ -385,7 +473,7 @@ async def assign_employee(
 
         # Check if user exists
         user_query = text("SELECT id, username, employee_id FROM users WHERE id = :user_id")
-        user_result = db.execute(user_query, {"user_id": user_id}).fetchone()
+        user_result = (await db.execute(user_query, {"user_id": user_id})).fetchone()
         
         if not user_result:
             raise HTTPException(
@@ -405,7 +493,7 @@ async def assign_employee(
             FROM hr_employees 
             WHERE employee_id = :employee_id
         """)
-        employee_result = db.execute(employee_query, {"employee_id": employee_id}).fetchone()
+        employee_result = (await db.execute(employee_query, {"employee_id": employee_id})).fetchone()
         
         if not employee_result:
             raise HTTPException(
@@ -420,13 +508,18 @@ async def assign_employee(
             )
 
         # Create bidirectional assignment
-        update_user_query = text("UPDATE users SET employee_id = :employee_id WHERE id = :user_id")
+        update_user_query = text("""
+            UPDATE users SET employee_id = :employee_id, token_version = COALESCE(token_version, 0) + 1
+            WHERE id = :user_id
+        """)
         update_employee_query = text("UPDATE hr_employees SET user_id = :user_id WHERE employee_id = :employee_id")
         
-        db.execute(update_user_query, {"employee_id": employee_id, "user_id": user_id})
-        db.execute(update_employee_query, {"user_id": user_id, "employee_id": employee_id})
+        await db.execute(update_user_query, {"employee_id": employee_id, "user_id": user_id})
+        await db.execute(update_employee_query, {"user_id": user_id, "employee_id": employee_id})
         
-        db.commit()
+        await db.commit()
+        principal_cache.invalidate(user_id=user_id)
+        token_versions.mark_stale(user_id)
         
         return {
             "success": True,
@@ -442,7 +535,7 @@ async def assign_employee(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to assign employee: {str(e)}"
@@ -451,7 +544,7 @@ async def assign_employee(
 @router.post("/unassign-employee")
 async def unassign_employee(
     request: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(require_superadmin)
 ):
     """Unassign user from employee (SystemAdmin only)"""
@@ -466,7 +559,7 @@ async def unassign_employee(
 
         # Get current assignment
         user_query = text("SELECT id, username, employee_id FROM users WHERE id = :user_id")
-        user_result = db.execute(user_query, {"user_id": user_id}).fetchone()
+        user_result = (await db.execute(user_query, {"user_id": user_id})).fetchone()
         
         if not user_result:
             raise HTTPException(
@@ -481,13 +574,18 @@ async def unassign_employee(
             )
 
         # Remove bidirectional assignment
-        update_user_query = text("UPDATE users SET employee_id = NULL WHERE id = :user_id")
+        update_user_query = text("""
+            UPDATE users SET employee_id = NULL, token_version = COALESCE(token_version, 0) + 1
+            WHERE id = :user_id
+        """)
         update_employee_query = text("UPDATE hr_employees SET user_id = NULL WHERE employee_id = :employee_id")
         
-        db.execute(update_user_query, {"user_id": user_id})
-        db.execute(update_employee_query, {"employee_id": user_result.employee_id})
+        await db.execute(update_user_query, {"user_id": user_id})
+        await db.execute(update_employee_query, {"employee_id": user_result.employee_id})
         
-        db.commit()
+        await db.commit()
+        principal_cache.invalidate(user_id=user_id)
+        token_versions.mark_stale(user_id)
         
         return {
             "success": True,
@@ -499,7 +597,7 @@ async def unassign_employee(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to unassign employee: {str(e)}"
@@ -507,12 +605,12 @@ async def unassign_employee(
 
 @router.get("/debug/schema")
 async def debug_schema(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(require_superadmin)
 ):
     """Debug endpoint to check database schema (SuperAdmin only)"""
     try:
-        schema_info = check_table_schema(db)
+        schema_info = await check_table_schema(db)
         return {
             "message": "Database schema information",
             "schema": schema_info,
@@ -526,7 +624,7 @@ async def debug_schema(
 
 @router.get("/employees/unassigned")
 async def get_unassigned_employees(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(require_admin_or_superadmin)
 ):
     """Get all employees that are not assigned to any user"""
@@ -539,7 +637,7 @@ async def get_unassigned_employees(
             ORDER BY emp_code
         """)
         
-        result = db.execute(query)
+        result = await db.execute(query)
         employees = result.fetchall()
         
         return [
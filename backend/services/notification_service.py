@@ -1,47 +1,42 @@
 """
 Notification service for User-Employee Assignment system
 Handles email notifications and in-app notifications
+
+A fan-out (e.g. every system admin) resolves its recipients with one query,
+inserts all in-app notifications with one INSERT ... RETURNING and commits
+them together with the queued emails in a single transaction.
+
+Changes that affect a user's notifications are published to connected
+streams (app/notification_events.py) only after their transaction commits.
 """
-import smtplib
 import os
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Dict, List, Optional
-from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, insert, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 import secrets
 import string
 import structlog
 
-from app.models import Notification, EmailLog, User, HREmployee
-from app.schemas import NotificationCreate, EmailLogCreate
+from app.email_queue import email_queue, enqueue_email
+from app.email_templates import email_templates
+from app.models import Notification, User
+from app.notification_counters import adjust_unread, get_unread_count
+from app.notification_events import notification_broker
+from app.models_hr import HREmployee
+from app.schemas import NotificationCreate, NotificationRecipients
 
 logger = structlog.get_logger()
-import smtplib
-import os
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Dict, List, Optional
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-import secrets
-import string
 
-from app.models import Notification, EmailLog, User, HREmployee
-from app.schemas import NotificationCreate, EmailLogCreate
-import structlog
-
-logger = structlog.get_logger()
+# Rows per INSERT statement, keeps bulk inserts under driver bind-parameter limits
+NOTIFICATION_BULK_CHUNK_SIZE = int(os.getenv("NOTIFICATION_BULK_CHUNK_SIZE", 1000))
 
 class NotificationService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
-        self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-        self.smtp_port = int(os.getenv('SMTP_PORT', '587'))
-        self.smtp_username = os.getenv('SMTP_USERNAME', '')
-        self.smtp_password = os.getenv('SMTP_PASSWORD', '')
-        self.from_email = os.getenv('FROM_EMAIL', self.smtp_username)
         self.frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:3001')
+        # Stream events held back until the transaction that caused them commits
+        self._pending_events = []
         
     def generate_temporary_password(self, length: int = 12) -> str:
         """Generate a secure temporary password"""
@@ -58,22 +53,21 @@ class NotificationService:
         
         try:
             # Get employee details
-            employee = self.db.query(HREmployee).filter(HREmployee.employee_id == employee_id).first()
+            employee = await self.db.get(HREmployee, employee_id)
             if not employee:
                 logger.error(f"Employee not found: {employee_id}")
                 return {"error": True, "message": "Employee not found"}
             
             # Get HR user details
-            hr_user = self.db.query(User).filter(User.id == hr_user_id).first()
+            hr_user = await self.db.get(User, hr_user_id)
             hr_name = hr_user.username if hr_user else "HR Manager"
             
             # Get all system admins and superadmins
-            system_admins = self.db.query(User).filter(
-                User.role.in_(["system_admin", "superadmin"]),
-                User.is_active == True
-            ).all()
+            system_admins = await self.resolve_recipients(
+                NotificationRecipients(roles=["system_admin", "superadmin"])
+            )
             
-            # Send email notifications to system admins
+            # Queue email notifications to system admins
             for admin in system_admins:
                 email_sent = await self._send_system_admin_notification_email(
                     admin_email=admin.email,
@@ -81,23 +75,28 @@ class NotificationService:
                     hr_manager_name=hr_name
                 )
                 results[f"email_to_{admin.username}"] = email_sent
-                
-                # Create in-app notification
-                notification_created = await self._create_in_app_notification(
-                    recipient_user_id=admin.id,
-                    notification_type="employee_added",
-                    title="🆕 New Employee Requires User Account",
-                    message=f"Employee {employee.first_name} {employee.last_name} ({employee.position}, {employee.department}) needs a user account assignment.",
-                    action_url=f"/system-admin/pending-assignments",
-                    employee_id=employee_id
-                )
-                results[f"notification_to_{admin.username}"] = notification_created
+            
+            # Create in-app notifications, committed together with the emails
+            notification_ids = await self.create_bulk_notifications(
+                recipient_user_ids=[admin.id for admin in system_admins],
+                notification_type="employee_added",
+                title="🆕 New Employee Requires User Account",
+                message=f"Employee {employee.first_name} {employee.last_name} ({employee.position}, {employee.department}) needs a user account assignment.",
+                action_url=f"/system-admin/pending-assignments",
+                employee_id=employee_id
+            )
+            await self._commit()
+            email_queue.wake()
+            
+            for admin in system_admins:
+                results[f"notification_to_{admin.username}"] = admin.id in notification_ids
             
             logger.info(f"Employee addition notifications sent for {employee.first_name} {employee.last_name}", 
                        employee_id=employee_id, results=results)
             
         except Exception as e:
             logger.error(f"Failed to send employee addition notifications: {str(e)}")
+            await self._rollback()
             results["error"] = True
             results["message"] = str(e)
             
@@ -113,9 +112,9 @@ class NotificationService:
         
         try:
             # Get employee and user details
-            employee = self.db.query(HREmployee).filter(HREmployee.employee_id == employee_id).first()
-            user = self.db.query(User).filter(User.id == user_id).first()
-            admin = self.db.query(User).filter(User.id == admin_user_id).first()
+            employee = await self.db.get(HREmployee, employee_id)
+            user = await self.db.get(User, user_id)
+            admin = await self.db.get(User, admin_user_id)
             
             if not all([employee, user, admin]):
                 return {"error": True, "message": "Required records not found"}
@@ -132,10 +131,7 @@ class NotificationService:
                 results["welcome_email_to_employee"] = email_sent
             
             # Send confirmation email to HR managers
-            hr_managers = self.db.query(User).filter(
-                User.role == "hr",
-                User.is_active == True
-            ).all()
+            hr_managers = await self.resolve_recipients(NotificationRecipients(roles=["hr"]))
             
             for hr_manager in hr_managers:
                 email_sent = await self._send_hr_confirmation_email(
@@ -145,24 +141,29 @@ class NotificationService:
                     admin_name=admin.username
                 )
                 results[f"confirmation_email_to_{hr_manager.username}"] = email_sent
-                
-                # Create in-app notification for HR
-                notification_created = await self._create_in_app_notification(
-                    recipient_user_id=hr_manager.id,
-                    notification_type="assignment_completed",
-                    title="✅ User Account Assigned",
-                    message=f"User account '{user.username}' has been assigned to {employee.first_name} {employee.last_name} with role '{user.role}'.",
-                    action_url=f"/hr/employees/{employee_id}",
-                    employee_id=employee_id,
-                    user_id=user_id
-                )
-                results[f"notification_to_{hr_manager.username}"] = notification_created
+            
+            # Create in-app notifications for HR, committed together with the emails
+            notification_ids = await self.create_bulk_notifications(
+                recipient_user_ids=[hr_manager.id for hr_manager in hr_managers],
+                notification_type="assignment_completed",
+                title="✅ User Account Assigned",
+                message=f"User account '{user.username}' has been assigned to {employee.first_name} {employee.last_name} with role '{user.role}'.",
+                action_url=f"/hr/employees/{employee_id}",
+                employee_id=employee_id,
+                user_id=user_id
+            )
+            await self._commit()
+            email_queue.wake()
+            
+            for hr_manager in hr_managers:
+                results[f"notification_to_{hr_manager.username}"] = hr_manager.id in notification_ids
             
             logger.info(f"User assignment notifications sent", 
                        employee_id=employee_id, user_id=user_id, results=results)
             
         except Exception as e:
             logger.error(f"Failed to send user assignment notifications: {str(e)}")
+            await self._rollback()
             results["error"] = True
             results["message"] = str(e)
             
@@ -174,60 +175,20 @@ class NotificationService:
         try:
             subject = "🆕 New Employee Requires User Account Assignment"
             
-            body = f"""
-            <html>
-            <head><style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }}
-                .container {{ max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-                .header {{ color: #2563eb; border-bottom: 2px solid #e5e7eb; padding-bottom: 20px; margin-bottom: 30px; }}
-                .employee-info {{ background-color: #f8fafc; padding: 20px; border-radius: 8px; margin: 20px 0; border-left: 4px solid #3b82f6; }}
-                .action-button {{ display: inline-block; background-color: #2563eb; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; font-weight: bold; margin: 20px 0; }}
-                .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #e5e7eb; color: #6b7280; font-size: 14px; }}
-            </style></head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>🆕 New Employee Added</h1>
-                        <p>A new employee has been added to the system and requires a user account assignment.</p>
-                    </div>
-                    
-                    <div class="employee-info">
-                        <h3>Employee Details:</h3>
-                        <ul>
-                            <li><strong>Name:</strong> {employee.first_name} {employee.last_name}</li>
-                            <li><strong>Position:</strong> {employee.position or 'Not specified'}</li>
-                            <li><strong>Department:</strong> {employee.department or 'Not specified'}</li>
-                            <li><strong>Employee Code:</strong> {employee.emp_code}</li>
-                            <li><strong>Added by:</strong> {hr_manager_name}</li>
-                            <li><strong>Date Added:</strong> {employee.created_at.strftime('%B %d, %Y at %H:%M')}</li>
-                        </ul>
-                    </div>
-                    
-                    <p><strong>Action Required:</strong></p>
-                    <p>Please log in to the system to assign a user account and appropriate role to this employee.</p>
-                    
-                    <a href="{self.frontend_url}/system-admin/pending-assignments" class="action-button">
-                        Assign User Account
-                    </a>
-                    
-                    <div class="footer">
-                        <p>Best regards,<br>SME Management System</p>
-                        <p><em>This is an automated notification. Please do not reply to this email.</em></p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            # Send email
-            success = await self._send_email(admin_email, subject, body, is_html=True)
-            
-            # Log email attempt
-            await self._log_email(
+            body = email_templates.render(
+                "system_admin_notification.html",
+                employee=employee,
+                hr_manager_name=hr_manager_name,
+                date_added=employee.created_at.strftime('%B %d, %Y at %H:%M'),
+                frontend_url=self.frontend_url
+            )
+            
+            # Queue email (delivered by the email queue worker)
+            success = await self._queue_email(
                 template_name="system_admin_notification",
                 recipient_email=admin_email,
                 subject=subject,
-                status="sent" if success else "failed",
+                body_html=body,
                 employee_id=employee.employee_id
             )
             
@@ -243,81 +204,21 @@ class NotificationService:
         try:
             subject = f"🎉 Welcome to SME Management System - Your Account is Ready!"
             
-            password_info = ""
-            if temporary_password:
-                password_info = f"""
-                    <div style="background-color: #fef3c7; padding: 15px; border-radius: 6px; border-left: 4px solid #f59e0b; margin: 15px 0;">
-                        <p><strong>🔑 Your Login Credentials:</strong></p>
-                        <ul>
-                            <li><strong>Username:</strong> {user.username}</li>
-                            <li><strong>Temporary Password:</strong> <code style="background-color: #374151; color: #f3f4f6; padding: 4px 8px; border-radius: 4px;">{temporary_password}</code></li>
-                            <li><strong>Login URL:</strong> <a href="{self.frontend_url}/login">{self.frontend_url}/login</a></li>
-                        </ul>
-                        <p><strong>⚠️ Important:</strong> Please change your password immediately after your first login for security.</p>
-                    </div>
-                """
-            
-            body = f"""
-            <html>
-            <head><style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }}
-                .container {{ max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-                .header {{ color: #059669; border-bottom: 2px solid #e5e7eb; padding-bottom: 20px; margin-bottom: 30px; }}
-                .welcome-info {{ background-color: #f0fdf4; padding: 20px; border-radius: 8px; margin: 20px 0; border-left: 4px solid #10b981; }}
-                .next-steps {{ background-color: #eff6ff; padding: 20px; border-radius: 8px; margin: 20px 0; border-left: 4px solid #3b82f6; }}
-                .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #e5e7eb; color: #6b7280; font-size: 14px; }}
-            </style></head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>🎉 Welcome to Our Organization!</h1>
-                        <p>Dear {employee.first_name} {employee.last_name},</p>
-                        <p>Your system account has been created and is ready to use.</p>
-                    </div>
-                    
-                    <div class="welcome-info">
-                        <h3>Account Information:</h3>
-                        <ul>
-                            <li><strong>Your Role:</strong> {self._get_role_display_name(user.role)}</li>
-                            <li><strong>Department:</strong> {employee.department or 'Not specified'}</li>
-                            <li><strong>Position:</strong> {employee.position or 'Not specified'}</li>
-                        </ul>
-                    </div>
-                    
-                    {password_info}
-                    
-                    <div class="next-steps">
-                        <h3>📋 Next Steps:</h3>
-                        <ol>
-                            <li>Click the login link above</li>
-                            <li>Enter your username and password</li>
-                            <li>Change your password on first login</li>
-                            <li>Complete your profile information</li>
-                            <li>Explore the system features available to your role</li>
-                        </ol>
-                    </div>
-                    
-                    <p>If you need any assistance or have questions about using the system, please contact the IT support team.</p>
-                    
-                    <div class="footer">
-                        <p>Welcome aboard!<br>
-                        <strong>HR Department</strong></p>
-                        <p><em>This is an automated notification. Please contact HR if you have any questions.</em></p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            # Send email
-            success = await self._send_email(recipient_email, subject, body, is_html=True)
-            
-            # Log email attempt  
-            await self._log_email(
+            body = email_templates.render(
+                "employee_welcome.html",
+                employee=employee,
+                username=user.username,
+                role_name=self._get_role_display_name(user.role),
+                temporary_password=temporary_password,
+                frontend_url=self.frontend_url
+            )
+            
+            # Queue email (delivered by the email queue worker)
+            success = await self._queue_email(
                 template_name="employee_welcome",
                 recipient_email=recipient_email,
                 subject=subject,
-                status="sent" if success else "failed",
+                body_html=body,
                 employee_id=employee.employee_id,
                 user_id=user.id
             )
@@ -334,55 +235,22 @@ class NotificationService:
         try:
             subject = f"✅ User Account Assigned - {employee.first_name} {employee.last_name}"
             
-            body = f"""
-            <html>
-            <head><style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }}
-                .container {{ max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-                .header {{ color: #059669; border-bottom: 2px solid #e5e7eb; padding-bottom: 20px; margin-bottom: 30px; }}
-                .assignment-info {{ background-color: #f0fdf4; padding: 20px; border-radius: 8px; margin: 20px 0; border-left: 4px solid #10b981; }}
-                .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #e5e7eb; color: #6b7280; font-size: 14px; }}
-            </style></head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>✅ Assignment Completed</h1>
-                        <p>The user account assignment has been successfully completed.</p>
-                    </div>
-                    
-                    <div class="assignment-info">
-                        <h3>Assignment Details:</h3>
-                        <ul>
-                            <li><strong>Employee:</strong> {employee.first_name} {employee.last_name}</li>
-                            <li><strong>Employee Code:</strong> {employee.emp_code}</li>
-                            <li><strong>Username:</strong> {user.username}</li>
-                            <li><strong>Email:</strong> {user.email}</li>
-                            <li><strong>Role Assigned:</strong> {self._get_role_display_name(user.role)}</li>
-                            <li><strong>Assigned by:</strong> {admin_name}</li>
-                            <li><strong>Date Completed:</strong> {datetime.now().strftime('%B %d, %Y at %H:%M')}</li>
-                        </ul>
-                    </div>
-                    
-                    <p>✉️ <strong>The employee has been notified via email with login instructions.</strong></p>
-                    
-                    <div class="footer">
-                        <p>Best regards,<br>SME Management System</p>
-                        <p><em>This is an automated notification. Please do not reply to this email.</em></p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            # Send email
-            success = await self._send_email(hr_email, subject, body, is_html=True)
-            
-            # Log email attempt
-            await self._log_email(
+            body = email_templates.render(
+                "hr_assignment_confirmation.html",
+                employee=employee,
+                username=user.username,
+                email=user.email,
+                role_name=self._get_role_display_name(user.role),
+                admin_name=admin_name,
+                date_completed=datetime.now().strftime('%B %d, %Y at %H:%M')
+            )
+            
+            # Queue email (delivered by the email queue worker)
+            success = await self._queue_email(
                 template_name="hr_assignment_confirmation",
                 recipient_email=hr_email,
                 subject=subject,
-                status="sent" if success else "failed",
+                body_html=body,
                 employee_id=employee.employee_id,
                 user_id=user.id
             )
@@ -393,84 +261,130 @@ class NotificationService:
             logger.error(f"Failed to send HR confirmation email: {str(e)}")
             return False
 
-    async def _create_in_app_notification(self, recipient_user_id: str, notification_type: str,
+    async def resolve_recipients(self, recipients: NotificationRecipients) -> List[User]:
+        """Users matching any of the recipient roles, ids or employee departments, in one query"""
+        conditions = []
+        if recipients.roles:
+            conditions.append(User.role.in_(recipients.roles))
+        if recipients.user_ids:
+            conditions.append(User.id.in_(recipients.user_ids))
+        if recipients.departments:
+            conditions.append(User.id.in_(
+                select(HREmployee.user_id).where(
+                    HREmployee.department.in_(recipients.departments),
+                    HREmployee.user_id.isnot(None)
+                )
+            ))
+        if not conditions:
+            return []
+        
+        query = select(User).where(or_(*conditions))
+        if recipients.active_only:
+            query = query.where(User.is_active == True)
+        return (await self.db.execute(query.order_by(User.id))).scalars().all()
+
+    async def create_bulk_notifications(self, recipient_user_ids: Iterable[str], notification_type: str,
                                         title: str, message: str, action_url: Optional[str] = None,
-                                        employee_id: Optional[int] = None, user_id: Optional[str] = None) -> bool:
-        """Create in-app notification"""
+                                        employee_id: Optional[int] = None,
+                                        user_id: Optional[str] = None) -> Dict[str, int]:
+        """
+        Create the same in-app notification for many recipients
+        Uses one INSERT ... RETURNING per NOTIFICATION_BULK_CHUNK_SIZE rows in the
+        caller's transaction (the caller commits). Returns {recipient_user_id: notification_id}
+        """
+        recipient_user_ids = list(dict.fromkeys(recipient_user_ids))
+        if not recipient_user_ids:
+            return {}
+        
+        created_at = datetime.utcnow()
+        rows = [
+            {
+                **NotificationCreate(
+                    type=notification_type,
+                    recipient_user_id=recipient_user_id,
+                    title=title,
+                    message=message,
+                    action_url=action_url,
+                    employee_id=employee_id,
+                    user_id=user_id
+                ).dict(),
+                "read": False,
+                "created_at": created_at,
+            }
+            for recipient_user_id in recipient_user_ids
+        ]
+        
+        notification_ids = {}
+        for start in range(0, len(rows), NOTIFICATION_BULK_CHUNK_SIZE):
+            result = await self.db.execute(
+                insert(Notification)
+                .values(rows[start:start + NOTIFICATION_BULK_CHUNK_SIZE])
+                .returning(Notification.recipient_user_id, Notification.id)
+            )
+            notification_ids.update({row.recipient_user_id: row.id for row in result})
+        await adjust_unread(self.db, notification_ids, 1)
+        
+        for row in rows:
+            record = {**row, "id": notification_ids[row["recipient_user_id"]], "created_at": created_at.isoformat()}
+            self._pending_events.append((row["recipient_user_id"], "notification", record))
+            self._pending_events.append((row["recipient_user_id"], "unread_count", {"delta": 1}))
+        
+        logger.info(f"In-app notifications created", type=notification_type, count=len(notification_ids))
+        return notification_ids
+
+    async def notify_recipients(self, recipients: NotificationRecipients, notification_type: str,
+                                title: str, message: str, action_url: Optional[str] = None,
+                                employee_id: Optional[int] = None,
+                                user_id: Optional[str] = None) -> Dict[str, int]:
+        """Resolve a recipient set and notify all of them in one transaction"""
         try:
-            notification_data = NotificationCreate(
-                type=notification_type,
-                recipient_user_id=recipient_user_id,
+            users = await self.resolve_recipients(recipients)
+            notification_ids = await self.create_bulk_notifications(
+                recipient_user_ids=[user.id for user in users],
+                notification_type=notification_type,
                 title=title,
                 message=message,
                 action_url=action_url,
                 employee_id=employee_id,
                 user_id=user_id
             )
-            
-            notification = Notification(**notification_data.dict())
-            self.db.add(notification)
-            self.db.commit()
-            
-            logger.info(f"In-app notification created", notification_id=notification.id, 
-                       recipient=recipient_user_id, type=notification_type)
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to create in-app notification: {str(e)}")
-            self.db.rollback()
-            return False
+            await self._commit()
+            return notification_ids
+        except Exception:
+            await self._rollback()
+            raise
 
-    async def _send_email(self, to_email: str, subject: str, body: str, is_html: bool = False) -> bool:
-        """Send email using SMTP"""
-        try:
-            if not all([self.smtp_username, self.smtp_password]):
-                logger.warning("SMTP credentials not configured - email not sent")
-                return False
-            
-            msg = MimeMultipart('alternative')
-            msg['From'] = self.from_email
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            if is_html:
-                msg.attach(MimeText(body, 'html'))
-            else:
-                msg.attach(MimeText(body, 'plain'))
-            
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
-            
-            logger.info(f"Email sent successfully to {to_email}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to send email to {to_email}: {str(e)}")
-            return False
-
-    async def _log_email(self, template_name: str, recipient_email: str, subject: str,
-                        status: str, employee_id: Optional[int] = None, user_id: Optional[str] = None):
-        """Log email attempt to database"""
+    async def _queue_email(self, template_name: str, recipient_email: str, subject: str,
+                           body_html: str, employee_id: Optional[int] = None, user_id: Optional[str] = None) -> bool:
+        """
+        Queue an email in the current transaction; the email_logs row doubles as its log entry
+        The notify_* caller commits and wakes the email queue once for the whole fan-out
+        """
         try:
-            email_log_data = EmailLogCreate(
+            enqueue_email(
+                self.db,
                 template_name=template_name,
                 recipient_email=recipient_email,
                 subject=subject,
-                status=status,
+                body_html=body_html,
                 employee_id=employee_id,
                 user_id=user_id
             )
-            
-            email_log = EmailLog(**email_log_data.dict())
-            self.db.add(email_log)
-            self.db.commit()
+            return True
             
         except Exception as e:
-            logger.error(f"Failed to log email: {str(e)}")
-            self.db.rollback()
+            logger.error(f"Failed to queue email to {recipient_email}: {str(e)}")
+            return False
+
+    async def _commit(self) -> None:
+        """Commit, then publish the stream events the transaction produced"""
+        await self.db.commit()
+        events, self._pending_events = self._pending_events, []
+        await notification_broker.publish_many(events)
+
+    async def _rollback(self) -> None:
+        self._pending_events = []
+        await self.db.rollback()
 
     def _get_role_display_name(self, role: str) -> str:
         """Get display name for role"""
@@ -482,37 +396,72 @@ class NotificationService:
         }
         return role_names.get(role, role.title())
 
-    async def get_notifications(self, user_id: str, unread_only: bool = False) -> List[Notification]:
-        """Get notifications for a user"""
-        query = self.db.query(Notification).filter(Notification.recipient_user_id == user_id)
+    async def get_notifications(self, user_id: str, unread_only: bool = False, limit: Optional[int] = None,
+                                before: Optional[Tuple[datetime, int]] = None,
+                                after: Optional[Tuple[datetime, int]] = None) -> List[Notification]:
+        """
+        Get notifications for a user, newest first
+        before/after are (created_at, id) positions: before pages back through
+        history, after returns the (up to limit) notifications following it
+        """
+        query = select(Notification).where(Notification.recipient_user_id == user_id)
         
         if unread_only:
-            query = query.filter(Notification.read == False)
-            
-        return query.order_by(Notification.created_at.desc()).all()
+            query = query.where(Notification.read == False)
+        
+        position = tuple_(Notification.created_at, Notification.id)
+        if before:
+            query = query.where(position < tuple_(*before))
+        
+        if after:
+            # Take the oldest rows after the cursor, then flip them to newest first
+            query = query.where(position > tuple_(*after)).order_by(
+                Notification.created_at.asc(), Notification.id.asc()
+            )
+        else:
+            query = query.order_by(Notification.created_at.desc(), Notification.id.desc())
+        
+        if limit is not None:
+            query = query.limit(limit)
+        
+        notifications = list((await self.db.execute(query)).scalars().all())
+        if after:
+            notifications.reverse()
+        return notifications
 
     async def mark_notification_read(self, notification_id: int, user_id: str) -> bool:
         """Mark notification as read"""
         try:
-            notification = self.db.query(Notification).filter(
-                Notification.id == notification_id,
-                Notification.recipient_user_id == user_id
-            ).first()
-            
-            if notification:
-                notification.read = True
-                self.db.commit()
+            # Conditional update: of two concurrent calls only one flips the row and decrements
+            result = await self.db.execute(
+                update(Notification)
+                .where(
+                    Notification.id == notification_id,
+                    Notification.recipient_user_id == user_id,
+                    Notification.read == False
+                )
+                .values(read=True)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                await adjust_unread(self.db, [user_id], -result.rowcount)
+                self._pending_events.append((user_id, "unread_count", {"delta": -result.rowcount}))
+                await self._commit()
                 return True
-            return False
+            
+            # Nothing changed: already read, or not this user's notification
+            return (await self.db.execute(
+                select(Notification.id).where(
+                    Notification.id == notification_id,
+                    Notification.recipient_user_id == user_id
+                )
+            )).scalar() is not None
             
         except Exception as e:
             logger.error(f"Failed to mark notification as read: {str(e)}")
-            self.db.rollback()
+            await self._rollback()
             return False
 
     async def get_unread_count(self, user_id: str) -> int:
-        """Get count of unread notifications"""
-        return self.db.query(Notification).filter(
-            Notification.recipient_user_id == user_id,
-            Notification.read == False
-        ).count()
+        """Get count of unread notifications (materialized counter, O(1))"""
+        return await get_unread_count(self.db, user_id)
@@ -2,31 +2,52 @@
 User-Employee Assignment Service
 Handles the core logic for assigning users to employees in a one-to-one relationship
 """
+import os
+import time
 from typing import Dict, List, Optional, Tuple
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
 import secrets
 import string
 import structlog
 
-from app.models import User, HREmployee, Notification
+from app.models import User, Notification
+from app.models_hr import HREmployee
+from app.auth_cache import principal_cache
+from app.password_hasher import password_hasher
+from app.safe_db_async import safe_update_user
+from app.token_versions import token_versions
 from app.schemas import UserAssignmentRequest, UserAssignmentResponse, UnassignedEmployee, AssignmentSummary
+from services.notification_service import NotificationService
 
 logger = structlog.get_logger()
 
+# The dashboard summary is polled constantly; serve it from memory for this long
+ASSIGNMENT_SUMMARY_CACHE_SECONDS = float(os.getenv("ASSIGNMENT_SUMMARY_CACHE_SECONDS", 30))
+
+# (expires_at, summary) shared by all requests in this process
+_summary_cache: Optional[Tuple[float, AssignmentSummary]] = None
+
+def invalidate_assignment_summary() -> None:
+    """Drop the cached summary after an assignment changes"""
+    global _summary_cache
+    _summary_cache = None
+
 class UserAssignmentService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
         self.notification_service = NotificationService(db)
 
     async def get_unassigned_employees(self) -> List[UnassignedEmployee]:
         """Get list of employees without user accounts"""
         try:
-            employees = self.db.query(HREmployee).filter(
-                HREmployee.user_id.is_(None),
-                HREmployee.active_status == True
-            ).order_by(HREmployee.created_at.desc()).all()
+            employees = (await self.db.execute(
+                select(HREmployee).where(
+                    HREmployee.user_id.is_(None),
+                    HREmployee.active_status == True
+                ).order_by(HREmployee.created_at.desc())
+            )).scalars().all()
             
             unassigned_list = []
             for emp in employees:
@@ -53,15 +74,17 @@ class UserAssignmentService:
         """Get list of users not assigned to any employee"""
         try:
             # Get user IDs that are already assigned to employees
-            assigned_user_ids = self.db.query(HREmployee.user_id).filter(
+            assigned_user_ids = select(HREmployee.user_id).where(
                 HREmployee.user_id.isnot(None)
-            ).subquery()
+            )
             
             # Get users not in the assigned list
-            available_users = self.db.query(User).filter(
-                ~User.id.in_(assigned_user_ids),
-                User.is_active == True
-            ).order_by(User.username).all()
+            available_users = (await self.db.execute(
+                select(User).where(
+                    ~User.id.in_(assigned_user_ids),
+                    User.is_active == True
+                ).order_by(User.username)
+            )).scalars().all()
             
             return available_users
             
@@ -76,10 +99,12 @@ class UserAssignmentService:
         """
         try:
             # Validate employee exists and is not assigned
-            employee = self.db.query(HREmployee).filter(
-                HREmployee.employee_id == assignment_request.employee_id,
-                HREmployee.active_status == True
-            ).first()
+            employee = (await self.db.execute(
+                select(HREmployee).where(
+                    HREmployee.employee_id == assignment_request.employee_id,
+                    HREmployee.active_status == True
+                )
+            )).scalars().first()
             
             if not employee:
                 return UserAssignmentResponse(
@@ -107,10 +132,12 @@ class UserAssignmentService:
             # Create new user or use existing
             if assignment_request.create_new_user:
                 # Validate username and email are not taken
-                existing_user = self.db.query(User).filter(
-                    (User.username == assignment_request.username) |
-                    (User.email == assignment_request.email)
-                ).first()
+                existing_user = (await self.db.execute(
+                    select(User).where(
+                        (User.username == assignment_request.username) |
+                        (User.email == assignment_request.email)
+                    )
+                )).scalars().first()
                 
                 if existing_user:
                     return UserAssignmentResponse(
@@ -129,14 +156,14 @@ class UserAssignmentService:
                 user = User(
                     username=assignment_request.username,
                     email=assignment_request.email,
-                    hashed_password=get_password_hash(temporary_password),
+                    hashed_password=await password_hasher.hash(temporary_password),
                     role=assignment_request.role,
                     is_active=True,
                     created_at=datetime.utcnow()
                 )
                 
                 self.db.add(user)
-                self.db.flush()  # Get the ID without committing
+                await self.db.flush()  # Get the ID without committing
                 
                 logger.info(f"New user created for employee assignment", 
                            username=assignment_request.username, 
@@ -154,10 +181,12 @@ class UserAssignmentService:
                         role=""
                     )
                 
-                user = self.db.query(User).filter(
-                    User.id == assignment_request.existing_user_id,
-                    User.is_active == True
-                ).first()
+                user = (await self.db.execute(
+                    select(User).where(
+                        User.id == assignment_request.existing_user_id,
+                        User.is_active == True
+                    )
+                )).scalars().first()
                 
                 if not user:
                     return UserAssignmentResponse(
@@ -170,10 +199,12 @@ class UserAssignmentService:
                     )
                 
                 # Check if user is already assigned to another employee
-                existing_assignment = self.db.query(HREmployee).filter(
-                    HREmployee.user_id == user.id,
-                    HREmployee.active_status == True
-                ).first()
+                existing_assignment = (await self.db.execute(
+                    select(HREmployee).where(
+                        HREmployee.user_id == user.id,
+                        HREmployee.active_status == True
+                    )
+                )).scalars().first()
                 
                 if existing_assignment:
                     return UserAssignmentResponse(
@@ -185,8 +216,9 @@ class UserAssignmentService:
                         role=user.role
                     )
                 
-                # Update user role if specified
+                # Update user role if specified (revokes tokens carrying the old role)
                 user.role = assignment_request.role
+                user.token_version = (user.token_version or 0) + 1
                 
                 logger.info(f"Existing user assigned to employee", 
                            username=user.username, 
@@ -198,7 +230,10 @@ class UserAssignmentService:
             employee.updated_by = admin_user_id
             
             # Commit the assignment
-            self.db.commit()
+            await self.db.commit()
+            principal_cache.invalidate(user_id=user.id)
+            token_versions.mark_stale(user.id)
+            invalidate_assignment_summary()
             
             # Send notifications if requested
             notifications_sent = {}
@@ -228,7 +263,7 @@ class UserAssignmentService:
             
         except Exception as e:
             logger.error(f"Failed to assign user to employee: {str(e)}")
-            self.db.rollback()
+            await self.db.rollback()
             return UserAssignmentResponse(
                 success=False,
                 message=f"Assignment failed: {str(e)}",
@@ -243,10 +278,12 @@ class UserAssignmentService:
         Remove user assignment from employee
         """
         try:
-            employee = self.db.query(HREmployee).filter(
-                HREmployee.employee_id == employee_id,
-                HREmployee.active_status == True
-            ).first()
+            employee = (await self.db.execute(
+                select(HREmployee).where(
+                    HREmployee.employee_id == employee_id,
+                    HREmployee.active_status == True
+                )
+            )).scalars().first()
             
             if not employee:
                 return {"success": False, "message": "Employee not found or inactive"}
@@ -255,7 +292,7 @@ class UserAssignmentService:
                 return {"success": False, "message": "Employee does not have a user account assigned"}
             
             user_id = employee.user_id
-            user = self.db.query(User).filter(User.id == user_id).first()
+            user = await self.db.get(User, user_id)
             username = user.username if user else "Unknown"
             
             # Remove assignment
@@ -263,7 +300,14 @@ class UserAssignmentService:
             employee.updated_at = datetime.utcnow()
             employee.updated_by = admin_user_id
             
-            self.db.commit()
+            if user is None:
+                await self.db.commit()
+            else:
+                # Committed by safe_update_user, which also revokes tokens carrying the old "emp" claim
+                employee_link = None if user.employee_id == employee_id else user.employee_id
+                if not await safe_update_user(self.db, user_id, {"employee_id": employee_link}):
+                    return {"success": False, "message": "Unassignment failed: could not update the user"}
+            invalidate_assignment_summary()
             
             logger.info(f"User unassigned from employee", 
                        employee_id=employee_id, 
@@ -280,47 +324,58 @@ class UserAssignmentService:
             
         except Exception as e:
             logger.error(f"Failed to unassign user from employee: {str(e)}")
-            self.db.rollback()
+            await self.db.rollback()
             return {"success": False, "message": f"Unassignment failed: {str(e)}"}
 
     async def get_assignment_summary(self) -> AssignmentSummary:
         """
         Get summary statistics for user-employee assignments
+        One aggregate query over hr_employees plus one over notifications,
+        cached for ASSIGNMENT_SUMMARY_CACHE_SECONDS
         """
+        global _summary_cache
+        if _summary_cache is not None and _summary_cache[0] > time.monotonic():
+            return _summary_cache[1]
+        
         try:
-            total_employees = self.db.query(HREmployee).filter(
-                HREmployee.active_status == True
-            ).count()
-            
-            assigned_employees = self.db.query(HREmployee).filter(
-                HREmployee.user_id.isnot(None),
-                HREmployee.active_status == True
-            ).count()
+            # Recent assignments: last 7 days
+            seven_days_ago = datetime.utcnow() - timedelta(days=7)
+            counts = (await self.db.execute(
+                select(
+                    func.count(HREmployee.employee_id).filter(HREmployee.active_status == True),
+                    func.count(HREmployee.employee_id).filter(
+                        HREmployee.user_id.isnot(None),
+                        HREmployee.active_status == True
+                    ),
+                    func.count(HREmployee.employee_id).filter(
+                        HREmployee.user_id.isnot(None),
+                        HREmployee.updated_at >= seven_days_ago
+                    )
+                )
+            )).one()
+            total_employees, assigned_employees, recent_assignments = counts
             
             unassigned_employees = total_employees - assigned_employees
             
             # Get pending notifications count
             one_day_ago = datetime.utcnow() - timedelta(days=1)
-            pending_notifications = self.db.query(Notification).filter(
-                Notification.type == "employee_added",
-                Notification.read == False,
-                Notification.created_at >= one_day_ago
-            ).count()
-            
-            # Get recent assignments count (last 7 days)
-            seven_days_ago = datetime.utcnow() - timedelta(days=7)
-            recent_assignments = self.db.query(HREmployee).filter(
-                HREmployee.user_id.isnot(None),
-                HREmployee.updated_at >= seven_days_ago
-            ).count()
+            pending_notifications = await self.db.scalar(
+                select(func.count(Notification.id)).where(
+                    Notification.type == "employee_added",
+                    Notification.read == False,
+                    Notification.created_at >= one_day_ago
+                )
+            )
             
-            return AssignmentSummary(
+            summary = AssignmentSummary(
                 total_employees=total_employees,
                 assigned_employees=assigned_employees,
                 unassigned_employees=unassigned_employees,
                 pending_notifications=pending_notifications,
                 recent_assignments=recent_assignments
             )
+            _summary_cache = (time.monotonic() + ASSIGNMENT_SUMMARY_CACHE_SECONDS, summary)
+            return summary
             
         except Exception as e:
             logger.error(f"Failed to get assignment summary: {str(e)}")
@@ -384,18 +439,18 @@ class UserAssignmentService:
 
     async def get_employee_by_user(self, user_id: str) -> Optional[HREmployee]:
         """Get employee record by user ID"""
-        return self.db.query(HREmployee).filter(
-            HREmployee.user_id == user_id,
-            HREmployee.active_status == True
-        ).first()
+        return (await self.db.execute(
+            select(HREmployee).where(
+                HREmployee.user_id == user_id,
+                HREmployee.active_status == True
+            )
+        )).scalars().first()
 
     async def get_user_by_employee(self, employee_id: int) -> Optional[User]:
         """Get user record by employee ID"""
-        employee = self.db.query(HREmployee).filter(
-            HREmployee.employee_id == employee_id
-        ).first()
+        employee = await self.db.get(HREmployee, employee_id)
         
         if employee and employee.user_id:
-            return self.db.query(User).filter(User.id == employee.user_id).first()
+            return await self.db.get(User, employee.user_id)
         
         return None
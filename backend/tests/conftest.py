@@ -1,7 +1,9 @@
+import asyncio
 import os
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.database import Base, get_db
@@ -33,3 +35,23 @@ def superadmin_token():
     
     assert response.status_code == 200, f"Failed to login with superadmin: {response.text}"
     return response.json()["access_token"]
+
+
+@pytest.fixture
+def run_async_db(tmp_path):
+    """Run `scenario(db)` against a fresh SQLite AsyncSession with all tables created"""
+    def run(scenario):
+        async def runner():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            session_factory = async_sessionmaker(engine, expire_on_commit=False)
+            try:
+                async with session_factory() as db:
+                    return await scenario(db)
+            finally:
+                await engine.dispose()
+
+        return asyncio.run(runner())
+
+    return run
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, text
+
+from app import safe_db_async
+from app.models import EmailLog, Notification, User
+from app.models_hr import HREmployee
+from app.schemas import NotificationRecipients
+from services.notification_service import NotificationService
+
+
+def test_safe_helpers_round_trip(run_async_db):
+    async def scenario(db):
+        db.add(User(id="u1", username="alice", email="alice@example.com", hashed_password="x", role="hr"))
+        await db.commit()
+
+        user = await safe_db_async.safe_get_user_by_username(db, "alice")
+        assert user.id == "u1" and user.role == "hr"
+        assert (await safe_db_async.safe_get_user_by_id(db, "u1")).username == "alice"
+        assert await safe_db_async.safe_check_user_exists(db, email="alice@example.com") is True
+        assert await safe_db_async.safe_check_user_exists(db, username="bob") is False
+
+        assert await safe_db_async.safe_update_user(db, "u1", {"role": "admin"}) is True
+        row = (await db.execute(text("SELECT role, token_version FROM users WHERE id = 'u1'"))).fetchone()
+        assert (row.role, row.token_version) == ("admin", 1)
+
+        assert await safe_db_async.safe_delete_user(db, "u1") is True
+        assert await safe_db_async.safe_get_user_by_id(db, "u1") is None
+
+    run_async_db(scenario)
+
+
+def test_notification_service_reads_and_marks(run_async_db):
+    async def scenario(db):
+        db.add(User(id="u1", username="alice", email="alice@example.com", hashed_password="x"))
+        now = datetime.utcnow()
+        for i in range(3):
+            db.add(Notification(
+                type="employee_added", recipient_user_id="u1", title=f"n{i}",
+                message="m", created_at=now - timedelta(minutes=i),
+            ))
+        await db.commit()
+
+        service = NotificationService(db)
+        notifications = await service.get_notifications("u1")
+        assert [n.title for n in notifications] == ["n0", "n1", "n2"]
+        assert await service.get_unread_count("u1") == 3
+
+        assert await service.mark_notification_read(notifications[0].id, "u1") is True
+        assert await service.mark_notification_read(notifications[1].id, "someone-else") is False
+        assert await service.get_unread_count("u1") == 2
+        assert len(await service.get_notifications("u1", unread_only=True)) == 2
+
+    run_async_db(scenario)
+
+
+def test_bulk_notification_fan_out(run_async_db):
+    async def scenario(db):
+        db.add_all([
+            User(id="a1", username="admin1", email="a1@example.com", hashed_password="x", role="system_admin"),
+            User(id="a2", username="admin2", email="a2@example.com", hashed_password="x", role="superadmin"),
+            User(id="a3", username="retired", email="a3@example.com", hashed_password="x",
+                 role="system_admin", is_active=False),
+            User(id="h1", username="hr1", email="h1@example.com", hashed_password="x", role="hr"),
+            User(id="e1", username="emp1", email="e1@example.com", hashed_password="x", role="employee"),
+        ])
+        db.add(HREmployee(employee_id=1, emp_code="E001", first_name="Ana", last_name="Diaz",
+                          department="Sales", user_id="e1"))
+        await db.commit()
+
+        service = NotificationService(db)
+        recipients = NotificationRecipients(roles=["hr"], departments=["Sales"], user_ids=["a3"])
+        assert [u.id for u in await service.resolve_recipients(recipients)] == ["e1", "h1"]
+
+        ids = await service.notify_recipients(recipients, "announcement", "Hi", "Hello")
+        assert set(ids) == {"e1", "h1"} and len(set(ids.values())) == 2
+
+        results = await service.notify_employee_added(1, "h1")
+        assert results["notification_to_admin1"] and results["email_to_admin2"]
+        assert "notification_to_retired" not in results
+
+        assert await service.get_unread_count("a1") == 1
+        emails = (await db.execute(select(EmailLog.recipient_email).order_by(EmailLog.id))).scalars().all()
+        assert emails == ["a1@example.com", "a2@example.com"]
+
+    run_async_db(scenario)
+
+
+def test_async_url_keeps_only_parameters_asyncpg_accepts():
+    from sqlalchemy.dialects.postgresql.asyncpg import PGDialect_asyncpg
+    from sqlalchemy.engine import make_url
+
+    from app.database import async_database_url
+
+    url = async_database_url(
+        "postgresql://app:p%40ss@db:5432/sme?sslmode=require&channel_binding=require"
+        "&target_session_attrs=read-write&options=-csearch_path%3Dpublic"
+    )
+    assert make_url(url).drivername == "postgresql+asyncpg"
+    assert dict(make_url(url).query) == {"ssl": "require"}
+    assert make_url(url).password == "p@ss"
+
+    # Every remaining parameter is a keyword asyncpg.connect() understands
+    _, connect_kwargs = PGDialect_asyncpg().create_connect_args(make_url(url))
+    assert connect_kwargs["ssl"] == "require" and "channel_binding" not in connect_kwargs
+
+    assert async_database_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
@@ -0,0 +1,124 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app import auth
+from app.auth_cache import PrincipalCache, RejectedTokenCache
+from app.safe_db import SafeUser
+
+
+def test_cache_hit_and_miss_counters():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=10, enabled=True)
+    user = SafeUser(id="u1", username="alice", role="admin")
+
+    assert cache.get("alice", 1000) is None
+    cache.set("alice", 1000, user)
+    assert cache.get("alice", 1000) is user
+    # A different token (iat) for the same user is a separate entry
+    assert cache.get("alice", 2000) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_cache_expires_entries():
+    cache = PrincipalCache(ttl_seconds=0.01, max_entries=10, enabled=True)
+    cache.set("alice", 1000, SafeUser(id="u1", username="alice"))
+    time.sleep(0.02)
+    assert cache.get("alice", 1000) is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=2, enabled=True)
+    cache.set("a", 1, SafeUser(id="1", username="a"))
+    cache.set("b", 1, SafeUser(id="2", username="b"))
+    cache.get("a", 1)  # "b" is now least recently used
+    cache.set("c", 1, SafeUser(id="3", username="c"))
+
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_invalidate_by_user_id_drops_all_tokens():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=10, enabled=True)
+    user = SafeUser(id="u1", username="alice")
+    cache.set("alice", 1, user)
+    cache.set("alice", 2, user)
+    cache.set("bob", 1, SafeUser(id="u2", username="bob"))
+
+    assert cache.invalidate(user_id="u1") == 2
+    assert cache.get("alice", 1) is None
+    assert cache.get("bob", 1) is not None
+
+
+def test_disabled_cache_never_stores():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=10, enabled=False)
+    cache.set("alice", 1, SafeUser(id="u1", username="alice"))
+    assert cache.get("alice", 1) is None
+
+
+def test_rejected_token_cache_remembers_and_expires():
+    rejected = RejectedTokenCache(ttl_seconds=0.05, max_entries=10)
+    assert rejected.contains("bad.token.value") is False
+    rejected.add("bad.token.value")
+    assert rejected.contains("bad.token.value") is True
+    time.sleep(0.06)
+    assert rejected.contains("bad.token.value") is False
+
+
+def test_invalid_token_is_decoded_only_once(monkeypatch):
+    calls = []
+    real_decode = auth.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(1)
+        return real_decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth.jwt, "decode", counting_decode)
+    token = auth.create_access_token({"sub": "alice"}) + "tampered"
+
+    for _ in range(3):
+        with pytest.raises(HTTPException) as exc:
+            auth.decode_token(token)
+        assert exc.value.status_code == 401
+    assert len(calls) == 1
+
+
+def test_current_user_is_loaded_through_the_async_session(run_async_db):
+    from fastapi.security import HTTPAuthorizationCredentials
+    from app.models import User
+
+    async def scenario(db):
+        db.add(User(id="u1", username="carol", email="c@example.com", hashed_password="x", role="hr"))
+        await db.commit()
+        token = auth.create_access_token({"sub": "carol"})
+
+        user = await auth.get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token), db)
+        assert (user.id, user.role) == ("u1", "hr")
+
+    run_async_db(scenario)
+
+
+def test_unassigning_an_employee_revokes_the_users_tokens(run_async_db):
+    from sqlalchemy import select
+    from app.models import User
+    from app.models_hr import HREmployee
+    from services.user_assignment_service import UserAssignmentService
+
+    async def scenario(db):
+        db.add(User(id="u1", username="dave", email="d@example.com", hashed_password="x", employee_id=7))
+        db.add(HREmployee(employee_id=7, emp_code="E-7", first_name="Dave", last_name="D", user_id="u1",
+                          active_status=True))
+        await db.commit()
+
+        result = await UserAssignmentService(db).unassign_user_from_employee(7, "admin")
+        assert result["success"] is True
+
+        row = (await db.execute(select(User.token_version, User.employee_id).where(User.id == "u1"))).one()
+        assert tuple(row) == (1, None)
+        assert (await db.get(HREmployee, 7)).user_id is None
+
+    run_async_db(scenario)
@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from app.db_metrics import InstrumentedQueuePool, pool_metrics
+
+
+def test_pool_checkouts_are_counted_and_timed(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=0.05)
+    pool_metrics.reset()
+    pool_metrics.install(engine)
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        # Second checkout cannot get a connection and times out
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+
+    snapshot = pool_metrics.snapshot(engine)
+    assert snapshot["checkouts"] == 1
+    assert snapshot["checkins"] == 1
+    assert snapshot["timeouts"] == 1
+    assert sum(snapshot["wait_histogram"].values()) == 2
+    assert snapshot["checked_out"] == 0
+    engine.dispose()
+
+
+def test_module_stats_are_only_on_the_diagnostics_endpoint():
+    from types import SimpleNamespace
+
+    from fastapi.testclient import TestClient
+
+    import main
+    from dependencies.auth import require_superadmin
+
+    client = TestClient(main.app)
+    health = client.get("/health").json()
+    assert health["modules"] is None
+    assert set(health) >= {"status", "database"}
+
+    assert client.get("/admin/diagnostics").status_code in (401, 403)
+
+    main.app.dependency_overrides[require_superadmin] = lambda: SimpleNamespace(username="root")
+    try:
+        response = client.get("/admin/diagnostics")
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert "db_pool" in response.json() and "logging" in response.json()
+
+
+def test_async_pool_checkout_waits_are_timed(tmp_path):
+    import asyncio
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from app.db_metrics import InstrumentedAsyncQueuePool, async_pool_metrics
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedAsyncQueuePool,
+                                     pool_size=1, max_overflow=0, pool_timeout=5)
+
+        async def query(hold_seconds):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                await asyncio.sleep(hold_seconds)
+
+        try:
+            # The second task waits on the event loop for the first one's connection
+            await asyncio.gather(query(0.2), query(0))
+        finally:
+            await engine.dispose()
+
+    async_pool_metrics.reset()
+    asyncio.run(scenario())
+
+    assert async_pool_metrics.waits == 2
+    assert async_pool_metrics.wait_max_ms >= 100
@@ -0,0 +1,166 @@
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.email_queue import EmailQueueWorker, enqueue_email, retry_delay_seconds
+from app.email_service import EmailService
+from app.models import EmailLog
+
+
+class CollectingHandler:
+    def __init__(self):
+        self.messages = []
+        self.peers = []  # client address per message, one per SMTP connection
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.peers.append(session.peer)
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def local_sender(port):
+    sender = EmailService()
+    sender.smtp_host = "127.0.0.1"
+    sender.smtp_port = port
+    sender.smtp_starttls = False
+    sender.smtp_require_auth = False
+    sender.smtp_username = sender.smtp_password = ""
+    sender.from_email = "noreply@example.com"
+    return sender
+
+
+@pytest.fixture
+def smtp_server():
+    handler = CollectingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+def worker_for(db, sender, **kwargs):
+    return EmailQueueWorker(session_factory=async_sessionmaker(db.bind, expire_on_commit=False),
+                            sender=sender, **kwargs)
+
+
+def test_queued_email_is_delivered_and_body_cleared(run_async_db, smtp_server):
+    controller, handler = smtp_server
+
+    async def scenario(db):
+        enqueue_email(db, template_name="password_reset", recipient_email="alice@example.com",
+                      subject="Reset", body_text="link", body_html="<p>link</p>")
+        await db.commit()
+
+        worker = worker_for(db, local_sender(controller.port))
+        assert await worker.process_once() == 1
+        assert await worker.process_once() == 0
+
+        db.expire_all()
+        email_log = (await db.get(EmailLog, 1))
+        assert email_log.status == "sent" and email_log.attempts == 1
+        assert email_log.sent_at is not None and email_log.body_html is None
+        return worker.stats()
+
+    stats = run_async_db(scenario)
+    assert stats["sent"] == 1
+    assert handler.messages[0].rcpt_tos == ["alice@example.com"]
+    assert b"Subject: Reset" in handler.messages[0].content
+
+
+def test_failed_delivery_backs_off_then_gives_up(run_async_db):
+    async def scenario(db):
+        enqueue_email(db, template_name="t", recipient_email="bob@example.com", subject="s", body_text="b")
+        await db.commit()
+
+        worker = worker_for(db, local_sender(free_port()), max_attempts=2)  # nothing listens there
+        assert await worker.process_once() == 1
+
+        db.expire_all()
+        email_log = await db.get(EmailLog, 1)
+        assert email_log.status == "queued" and email_log.attempts == 1
+        assert email_log.next_attempt_at > datetime.utcnow() + timedelta(seconds=20)
+        assert await worker.process_once() == 0  # not due yet
+
+        email_log.next_attempt_at = datetime.utcnow()
+        await db.commit()
+        assert await worker.process_once() == 1
+
+        db.expire_all()
+        email_log = await db.get(EmailLog, 1)
+        assert email_log.status == "failed" and email_log.attempts == 2
+        assert email_log.last_error and email_log.body_text is None
+
+    run_async_db(scenario)
+
+
+def test_expired_lease_is_reclaimed(run_async_db, smtp_server):
+    controller, handler = smtp_server
+
+    async def scenario(db):
+        email_log = enqueue_email(db, template_name="t", recipient_email="c@example.com", subject="s", body_text="b")
+        # Claimed by a worker that died mid-send
+        email_log.status = "sending"
+        email_log.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        await db.commit()
+
+        assert await worker_for(db, local_sender(controller.port)).process_once() == 1
+
+    run_async_db(scenario)
+    assert len(handler.messages) == 1
+
+
+def test_retry_delay_grows_exponentially_and_is_capped():
+    assert 27 <= retry_delay_seconds(1, base=30, maximum=3600) <= 33
+    assert 108 <= retry_delay_seconds(3, base=30, maximum=3600) <= 132
+    assert retry_delay_seconds(20, base=30, maximum=3600) <= 3960
+
+
+def test_batch_shares_one_smtp_connection(run_async_db, smtp_server):
+    controller, handler = smtp_server
+    sender = local_sender(controller.port)
+
+    async def scenario(db):
+        for i in range(5):
+            enqueue_email(db, template_name="employee_added", recipient_email=f"admin{i}@example.com",
+                          subject="New employee", body_text="b")
+        await db.commit()
+
+        worker = worker_for(db, sender)
+        assert await worker.process_once() == 5
+
+    run_async_db(scenario)
+    assert len(handler.messages) == 5
+    assert len(set(handler.peers)) == 1
+    stats = sender.smtp_pool.stats()
+    assert stats["connections_opened"] == 1 and stats["reused"] == 4
+    sender.smtp_pool.close()
+
+
+def test_smtp_pool_recycles_and_recovers_connections(smtp_server):
+    controller, handler = smtp_server
+    sender = local_sender(controller.port)
+    pool = sender.smtp_pool
+    pool.max_messages_per_connection = 2
+
+    for i in range(5):
+        pool.send(sender.build_message(f"u{i}@example.com", "s", "b"))
+    assert len(set(handler.peers)) == 3
+
+    # The server dropped the idle session; the send reconnects once
+    pool._idle[0].smtp.close()
+    pool.send(sender.build_message("late@example.com", "s", "b"))
+    assert pool.stats()["stale_retries"] == 1
+    assert len(handler.messages) == 6
+
+    pool.idle_timeout_seconds = 0
+    assert pool.reap_idle() == 1
+    assert pool.stats()["idle"] == 0
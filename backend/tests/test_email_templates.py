@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+from app.email_service import EmailService
+from app.email_templates import EmailTemplates, email_templates
+
+
+def test_reset_email_renders_link_and_escapes_fields():
+    service = EmailService()
+    html = service.create_reset_email_html("<b>alice</b>", "tok123")
+    text = service.create_reset_email_text("alice", "tok123")
+
+    assert f"{service.frontend_url}/reset-password?token=tok123" in html
+    assert "&lt;b&gt;alice&lt;/b&gt;" in html and "<b>alice</b>" not in html
+    assert "class=\"footer\"" in html  # shared layout
+    assert text.startswith("Reset Your Password") and "Hi alice," in text
+
+
+def test_welcome_email_only_includes_credentials_when_given():
+    employee = SimpleNamespace(first_name="Ana", last_name="Diaz", department=None, position="Dev")
+    fields = dict(employee=employee, username="ana", role_name="Employee", frontend_url="http://app")
+
+    with_password = email_templates.render("employee_welcome.html", temporary_password="Tmp#1", **fields)
+    without = email_templates.render("employee_welcome.html", temporary_password=None, **fields)
+
+    assert "Tmp#1" in with_password and "http://app/login" in with_password
+    assert "Temporary Password" not in without
+    assert "Not specified" in without
+
+
+def test_templates_compile_once_per_locale(tmp_path):
+    (tmp_path / "fr").mkdir()
+    (tmp_path / "hello.txt").write_text("Hello {{ who }}")
+    (tmp_path / "fr" / "hello.txt").write_text("Bonjour {{ who }}")
+    templates = EmailTemplates(template_dir=str(tmp_path), bytecode_dir=str(tmp_path / "cache"))
+
+    assert templates.warm() == 1
+    assert templates.render("hello.txt", who="Ana") == "Hello Ana"
+    assert templates.render("hello.txt", locale="fr", who="Ana") == "Bonjour Ana"
+    assert templates.render("hello.txt", locale="de", who="Ana") == "Hello Ana"
+    templates.render("hello.txt", locale="fr", who="Bo")
+    assert templates.stats()["compiled"] == 3
+    assert any((tmp_path / "cache").iterdir())
@@ -0,0 +1,90 @@
+import pytest
+from fastapi import HTTPException, Response
+
+from app.models_hr import HREmployee
+from routers.employees import list_employees
+
+
+async def list_page(db, **kwargs):
+    params = dict(department=None, active=None, q=None, limit=100, cursor=None)
+    params.update(kwargs)
+    response = Response()
+    employees = await list_employees(response=response, db=db, current_user=None, **params)
+    return employees, response
+
+
+def seed(db):
+    people = [("E-001", "Anna", "Smith"), ("E-002", "Annabel", "Jones"), ("ANNA", "Bob", "Stone"),
+              ("E-004", "Carl", "Hannah"), ("E-005", "Dora", "Lee")]
+    for code, first, last in people:
+        db.add(HREmployee(emp_code=code, first_name=first, last_name=last, active_status=True))
+
+
+def test_search_ranks_exact_matches_first(run_async_db):
+    async def scenario(db):
+        seed(db)
+        await db.commit()
+
+        results, _ = await list_page(db, q="anna")
+        codes = [employee.emp_code for employee in results]
+        assert codes[:2] == ["ANNA", "E-001"]  # exact code, then exact first name
+        assert set(codes) == {"ANNA", "E-001", "E-002", "E-004"}
+
+    run_async_db(scenario)
+
+
+def test_cursor_pages_without_overlap(run_async_db):
+    async def scenario(db):
+        seed(db)
+        await db.commit()
+
+        for q in (None, "a"):
+            seen, cursor = [], None
+            while True:
+                employees, response = await list_page(db, q=q, limit=2, cursor=cursor)
+                seen.extend(employee.emp_code for employee in employees)
+                cursor = response.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+            assert sorted(seen) == ["ANNA", "E-001", "E-002", "E-004", "E-005"]
+            if q is None:
+                assert seen == sorted(seen)
+
+    run_async_db(scenario)
+
+
+def test_list_without_limit_or_cursor_is_unpaged(run_async_db, monkeypatch):
+    from routers import employees
+
+    monkeypatch.setattr(employees, "EMPLOYEE_LIST_DEFAULT_LIMIT", 2)
+
+    async def scenario(db):
+        seed(db)
+        await db.commit()
+
+        everyone, response = await list_page(db, limit=None)
+        assert len(everyone) == 5 and "X-Next-Cursor" not in response.headers
+
+        # A cursor alone pages with the default limit
+        _, response = await list_page(db, limit=1)
+        rest, response = await list_page(db, limit=None, cursor=response.headers["X-Next-Cursor"])
+        assert [employee.emp_code for employee in rest] == ["E-001", "E-002"]
+        assert "X-Next-Cursor" in response.headers
+
+    run_async_db(scenario)
+
+
+def test_cursor_of_the_other_ordering_is_rejected(run_async_db):
+    async def scenario(db):
+        seed(db)
+        await db.commit()
+
+        _, by_code = await list_page(db, limit=1)
+        _, by_rank = await list_page(db, q="a", limit=1)
+        with pytest.raises(HTTPException) as exc:
+            await list_page(db, q="a", limit=1, cursor=by_code.headers["X-Next-Cursor"])
+        assert exc.value.status_code == 400
+        with pytest.raises(HTTPException):
+            await list_page(db, limit=1, cursor=by_rank.headers["X-Next-Cursor"])
+
+    run_async_db(scenario)
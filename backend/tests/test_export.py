@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.export import stream_rows
+from app.models_hr import HREmployee
+from routers.employees import EMPLOYEE_EXPORT_FIELDS
+
+
+async def collect(db, export_format, batch_size=2):
+    table = HREmployee.__table__
+    statement = select(*(table.c[field] for field in EMPLOYEE_EXPORT_FIELDS)).order_by(table.c.emp_code)
+    chunks = [
+        chunk async for chunk in stream_rows(
+            statement, EMPLOYEE_EXPORT_FIELDS, export_format, batch_size=batch_size,
+            session_factory=async_sessionmaker(db.bind),
+        )
+    ]
+    return chunks
+
+
+async def seed(db, count=5):
+    for i in range(count):
+        db.add(HREmployee(emp_code=f"E-{i:03d}", first_name=f"First{i}", last_name="Last",
+                          salary_monthly=1000 + i, created_at=datetime(2026, 1, 1)))
+    await db.commit()
+
+
+def test_ndjson_export_streams_one_chunk_per_batch(run_async_db):
+    async def scenario(db):
+        await seed(db)
+        chunks = await collect(db, "ndjson")
+        assert len(chunks) == 3  # 5 rows in batches of 2
+
+        records = [json.loads(line) for line in "".join(chunks).splitlines()]
+        assert [record["emp_code"] for record in records] == [f"E-{i:03d}" for i in range(5)]
+        assert records[0]["salary_monthly"] == "1000.00"
+        assert set(records[0]) == set(EMPLOYEE_EXPORT_FIELDS)
+
+    run_async_db(scenario)
+
+
+def test_csv_export_has_header_and_rows(run_async_db):
+    async def scenario(db):
+        await seed(db, count=3)
+        chunks = await collect(db, "csv")
+        rows = list(csv.reader(io.StringIO("".join(chunks))))
+        assert rows[0] == list(EMPLOYEE_EXPORT_FIELDS)
+        assert [row[1] for row in rows[1:]] == ["E-000", "E-001", "E-002"]
+
+    run_async_db(scenario)
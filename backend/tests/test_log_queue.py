@@ -0,0 +1,60 @@
+import io
+import logging
+import threading
+
+from app.logging_config import BatchStreamHandler, LogQueue
+
+
+def test_log_queue_writes_records_from_writer_thread():
+    stream = io.StringIO()
+    handler = BatchStreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    logger = logging.getLogger("tests.log_queue")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+    log_queue = LogQueue(maxsize=100, batch_size=10)
+    log_queue.install(["tests.log_queue"])
+    try:
+        for i in range(25):
+            logger.info("record %d", i)
+        logger.debug("filtered by the logger level")
+    finally:
+        log_queue.stop()
+        logger.handlers = []
+
+    lines = stream.getvalue().splitlines()
+    assert lines[0] == "INFO record 0"
+    assert len(lines) == 25
+    assert log_queue.stats()["written"] == 25
+    assert not handler.deferred
+
+
+def test_full_queue_drops_and_counts_records():
+    log_queue = LogQueue(maxsize=1, policy="drop")
+    record = logging.LogRecord("tests", logging.WARNING, __file__, 1, "slow disk", None, None)
+
+    log_queue.put(record, ())
+    log_queue.put(record, ())
+    log_queue.put(record, ())
+
+    assert log_queue.stats()["dropped"] == {"WARNING": 2}
+
+
+def test_drop_counts_are_exact_across_threads():
+    log_queue = LogQueue(maxsize=1, policy="drop")
+    record = logging.LogRecord("tests", logging.WARNING, __file__, 1, "slow disk", None, None)
+    log_queue.put(record, ())
+
+    def flood():
+        for _ in range(2000):
+            log_queue.put(record, ())
+
+    threads = [threading.Thread(target=flood) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert log_queue.stats()["dropped"] == {"WARNING": 16000}
@@ -0,0 +1,96 @@
+from types import SimpleNamespace
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Notification, NotificationCounter, User
+from app.notification_counters import adjust_unread, get_unread_count, reconcile_counters
+from routers.notifications import delete_notification
+from services.notification_service import NotificationService
+
+
+def test_counters_follow_creates_and_reads(run_async_db):
+    async def scenario(db):
+        db.add_all([
+            User(id="u1", username="alice", email="a@example.com", hashed_password="x"),
+            User(id="u2", username="bob", email="b@example.com", hashed_password="x"),
+        ])
+        # Inserted behind the counters' back, so only reconciliation sees it
+        db.add(Notification(type="t", recipient_user_id="u1", title="old", message="m"))
+        await db.commit()
+
+        service = NotificationService(db)
+        ids = await service.create_bulk_notifications(["u1", "u2"], "t", "new", "m")
+        await service._commit()
+        assert await service.get_unread_count("u2") == 1
+        # Row created by the increment, seeded with the notification inserted behind its back
+        assert await service.get_unread_count("u1") == 2
+
+        await service.mark_notification_read(ids["u2"], "u2")
+        await adjust_unread(db, ["u2"], -5)  # never below zero
+        await db.commit()
+        assert await service.get_unread_count("u2") == 0
+
+        # Drift: a notification inserted after the row exists is only seen by reconciliation
+        db.add(Notification(type="t", recipient_user_id="u1", title="late", message="m"))
+        await db.commit()
+        assert await reconcile_counters(db, grace_seconds=-60) == 1
+        assert await get_unread_count(db, "u1") == 3
+
+    run_async_db(scenario)
+
+
+def test_reconcile_skips_recent_counters_and_fills_missing(run_async_db):
+    async def scenario(db):
+        db.add(User(id="u1", username="alice", email="a@example.com", hashed_password="x"))
+        db.add(Notification(type="t", recipient_user_id="u1", title="n", message="m"))
+        await db.commit()
+
+        assert await reconcile_counters(db) == 1  # missing row inserted
+        await db.execute(update(NotificationCounter).values(unread_count=7))
+        await db.commit()
+        assert await reconcile_counters(db) == 0  # touched within the grace period
+        assert await reconcile_counters(db, grace_seconds=-60) == 1
+        assert await db.scalar(select(NotificationCounter.unread_count)) == 1
+
+    run_async_db(scenario)
+
+
+def test_concurrent_read_and_delete_decrement_once(run_async_db):
+    async def scenario(db):
+        db.add(User(id="u1", username="alice", email="a@example.com", hashed_password="x"))
+        await db.commit()
+        service = NotificationService(db)
+        ids = await service.create_bulk_notifications(["u1"], "t", "first", "m")
+        second = await service.create_bulk_notifications(["u1"], "t", "second", "m")
+        await service._commit()
+
+        # This session still holds the notification as unread when another request reads it
+        stale = await db.get(Notification, ids["u1"])
+        assert not stale.read
+        async with AsyncSession(db.bind) as other:
+            assert await NotificationService(other).mark_notification_read(ids["u1"], "u1")
+        assert await service.mark_notification_read(ids["u1"], "u1")
+        assert await get_unread_count(db, "u1") == 1
+
+        user = SimpleNamespace(id="u1", username="alice")
+        await delete_notification(ids["u1"], db=db, current_user=user)  # already read
+        assert await get_unread_count(db, "u1") == 1
+        await delete_notification(second["u1"], db=db, current_user=user)
+        assert await get_unread_count(db, "u1") == 0
+
+    run_async_db(scenario)
+
+
+def test_first_adjustment_seeds_from_existing_notifications(run_async_db):
+    async def scenario(db):
+        db.add(User(id="u1", username="alice", email="a@example.com", hashed_password="x"))
+        # Unread notifications that predate the counter row
+        db.add_all([Notification(type="t", recipient_user_id="u1", title=f"n{i}", message="m") for i in range(3)])
+        await db.commit()
+        first = await db.scalar(select(Notification.id).order_by(Notification.id))
+
+        assert await NotificationService(db).mark_notification_read(first, "u1")
+        assert await db.scalar(select(NotificationCounter.unread_count)) == 2
+
+    run_async_db(scenario)
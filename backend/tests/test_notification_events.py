@@ -0,0 +1,60 @@
+import asyncio
+
+from app.models import User
+from app.notification_events import NotificationBroker, format_sse
+from app.schemas import NotificationRecipients
+from services import notification_service
+from services.notification_service import NotificationService
+
+
+def test_broker_delivers_to_each_stream_and_drops_when_full():
+    async def scenario():
+        broker = NotificationBroker(backend="memory", queue_size=1)
+        first, second = broker.subscribe("u1"), broker.subscribe("u1")
+        other = broker.subscribe("u2")
+
+        await broker.publish("u1", "unread_count", {"delta": 1})
+        assert first.get_nowait() == ("unread_count", {"delta": 1})
+        assert second.get_nowait() == ("unread_count", {"delta": 1})
+        assert other.empty()
+
+        await broker.publish_many([("u2", "unread_count", {"delta": 1})] * 2)
+        broker.unsubscribe("u1", first)
+        broker.unsubscribe("u1", second)
+        return broker.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["dropped"] == 1 and stats["users"] == 1 and stats["streams"] == 1
+
+
+def test_sse_frame_format():
+    assert format_sse("unread_count", {"delta": -2}) == 'event: unread_count\ndata: {"delta":-2}\n\n'
+
+
+def test_service_publishes_only_after_commit(run_async_db, monkeypatch):
+    broker = NotificationBroker(backend="memory")
+    monkeypatch.setattr(notification_service, "notification_broker", broker)
+
+    async def scenario(db):
+        db.add(User(id="h1", username="hr1", email="h1@example.com", hashed_password="x", role="hr"))
+        await db.commit()
+        stream = broker.subscribe("h1")
+
+        service = NotificationService(db)
+        ids = await service.create_bulk_notifications(["h1"], "announcement", "Hi", "Hello")
+        assert stream.empty()  # not committed yet
+        await service._commit()
+
+        event, record = stream.get_nowait()
+        assert event == "notification" and record["id"] == ids["h1"] and record["title"] == "Hi"
+        assert stream.get_nowait() == ("unread_count", {"delta": 1})
+
+        await service.mark_notification_read(ids["h1"], "h1")
+        await service.mark_notification_read(ids["h1"], "h1")  # already read, no second delta
+        assert stream.get_nowait() == ("unread_count", {"delta": -1})
+        assert stream.empty()
+
+        await service.notify_recipients(NotificationRecipients(roles=["nobody"]), "t", "t", "m")
+        assert stream.empty()
+
+    run_async_db(scenario)
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.models import User
+from app.pagination import decode_cursor, encode_cursor, parse_fields
+from routers.users import list_users
+
+
+def test_cursor_round_trip_keeps_datetimes():
+    created_at = datetime(2026, 1, 2, 3, 4, 5, 678)
+    assert decode_cursor(encode_cursor(created_at, "abc")) == (created_at, "abc")
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor("not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+def test_parse_fields_whitelists_and_keeps_id():
+    allowed = ("id", "username", "email")
+    assert parse_fields(None, allowed) == allowed
+    assert parse_fields("email", allowed) == ("id", "email")
+    with pytest.raises(HTTPException):
+        parse_fields("hashed_password", allowed)
+
+
+def list_page(db, **kwargs):
+    params = dict(limit=50, cursor=None, role=None, is_active=None, fields=None, include_total=False)
+    params.update(kwargs)
+    return list_users(db=db, current_user=None, **params)
+
+
+def test_list_users_keyset_pages_cover_every_row_once(run_async_db):
+    async def scenario(db):
+        base = datetime(2026, 1, 1)
+        for i in range(7):
+            # Two users share each timestamp so the id tiebreaker matters
+            db.add(User(id=f"u{i}", username=f"user{i}", email=f"user{i}@example.com",
+                        hashed_password="x", role="hr" if i % 2 else "user",
+                        created_at=base + timedelta(minutes=i // 2)))
+        await db.commit()
+
+        seen, cursor = [], None
+        while True:
+            page = await list_page(db, limit=3, cursor=cursor, fields="username")
+            seen.extend(user["id"] for user in page["users"])
+            assert all(set(user) == {"id", "username"} for user in page["users"])
+            if not page["has_more"]:
+                break
+            cursor = page["next_cursor"]
+
+        assert seen == ["u6", "u5", "u4", "u3", "u2", "u1", "u0"]
+
+        hr_page = await list_page(db, role="hr", include_total=True)
+        assert [user["id"] for user in hr_page["users"]] == ["u5", "u3", "u1"]
+        assert hr_page["total"] == 3
+
+    run_async_db(scenario)
+
+
+def test_list_users_without_limit_or_cursor_is_unpaged(run_async_db, monkeypatch):
+    from routers import users
+
+    monkeypatch.setattr(users, "USER_LIST_DEFAULT_LIMIT", 2)
+
+    async def scenario(db):
+        for i in range(3):
+            db.add(User(id=f"u{i}", username=f"user{i}", email=f"user{i}@example.com",
+                        hashed_password="x", created_at=datetime(2026, 1, 1) + timedelta(minutes=i)))
+        await db.commit()
+
+        everyone = await list_page(db, limit=None)
+        assert [user["id"] for user in everyone["users"]] == ["u2", "u1", "u0"]
+        assert everyone["total"] == 3 and not everyone["has_more"]
+
+        # A cursor alone pages with the default limit
+        first = await list_page(db, limit=1)
+        rest = await list_page(db, limit=None, cursor=first["next_cursor"])
+        assert [user["id"] for user in rest["users"]] == ["u1", "u0"]
+
+    run_async_db(scenario)
+
+
+def test_notifications_page_backwards_and_forwards(run_async_db):
+    from fastapi import Response
+
+    from app.models import Notification
+    from routers.notifications import get_notifications
+
+    def page(db, **kwargs):
+        params = dict(unread_only=False, limit=2, before=None, after=None)
+        params.update(kwargs)
+        response = Response()
+        return response, get_notifications(response=response, db=db, current_user=User(id="u1"), **params)
+
+    async def scenario(db):
+        db.add(User(id="u1", username="alice", email="a@example.com", hashed_password="x"))
+        base = datetime(2026, 1, 1)
+        for i in range(5):
+            db.add(Notification(id=i + 1, type="t", recipient_user_id="u1", title=f"n{i}", message="m",
+                                created_at=base + timedelta(minutes=i // 2)))
+        await db.commit()
+
+        titles = []
+        before = None
+        while True:
+            response, coroutine = page(db, before=before)
+            titles += [n.title for n in await coroutine]
+            before = response.headers.get("X-Next-Cursor")
+            if before is None:
+                break
+        assert titles == ["n4", "n3", "n2", "n1", "n0"]
+
+        # Catch up from the oldest notification, closest rows first
+        oldest = encode_cursor(base, 1)
+        response, coroutine = page(db, after=oldest)
+        assert [n.title for n in await coroutine] == ["n2", "n1"]
+        response, coroutine = page(db, after=response.headers["X-Prev-Cursor"])
+        assert [n.title for n in await coroutine] == ["n4", "n3"]
+
+        with pytest.raises(HTTPException):
+            await page(db, before=oldest, after=oldest)[1]
+
+    run_async_db(scenario)
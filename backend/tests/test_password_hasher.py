@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from passlib.hash import bcrypt
+
+from app.hash_policy import MIN_PRODUCTION_BCRYPT_ROUNDS, build_context, check_rounds
+from app.password_hasher import PasswordHasher
+
+
+def test_hash_and_verify_run_on_pool():
+    hasher = PasswordHasher(workers=1, max_queue=1)
+
+    async def scenario():
+        hashed = await hasher.hash("Secret123")
+        return await hasher.verify("Secret123", hashed), await hasher.verify("Wrong123", hashed)
+
+    assert asyncio.run(scenario()) == (True, False)
+    assert hasher.stats()["completed"] == 3
+    hasher.shutdown()
+
+
+def test_saturated_pool_rejects_with_503():
+    hasher = PasswordHasher(workers=1, max_queue=0)
+
+    async def scenario():
+        first = asyncio.ensure_future(hasher.hash("Secret123"))
+        await asyncio.sleep(0)  # let the first call claim the only slot
+        with pytest.raises(HTTPException) as exc:
+            await hasher.hash("Secret456")
+        await first
+        return exc.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert hasher.stats()["rejected"] == 1
+    hasher.shutdown()
+
+
+def test_weaker_hash_is_upgraded_but_stronger_one_is_kept():
+    context = build_context(5)
+
+    valid, new_hash = context.verify_and_update("Secret123", bcrypt.using(rounds=4).hash("Secret123"))
+    assert valid is True
+    assert new_hash is not None and "$05$" in new_hash
+
+    valid, new_hash = context.verify_and_update("Secret123", new_hash)
+    assert valid is True and new_hash is None
+
+    # Never downgraded on login
+    valid, new_hash = context.verify_and_update("Secret123", bcrypt.using(rounds=6).hash("Secret123"))
+    assert valid is True and new_hash is None
+
+
+def test_production_refuses_a_weak_cost():
+    with pytest.raises(RuntimeError):
+        check_rounds(4, "production")
+    check_rounds(MIN_PRODUCTION_BCRYPT_ROUNDS, "production")
+    check_rounds(4, "test")
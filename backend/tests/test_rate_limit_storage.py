@@ -0,0 +1,88 @@
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from limits import parse
+from limits.strategies import FixedWindowRateLimiter
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+from sqlalchemy import create_engine, func, select
+
+from app import security
+from app.models import RateLimitCounter
+from app.rate_limit_storage import SyncedCounterStorage
+
+
+def test_synced_storage_shares_counts_between_processes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'limits.db'}")
+    RateLimitCounter.__table__.create(engine)
+    worker_a = SyncedCounterStorage(engine=engine, sync_seconds=3600)
+    worker_b = SyncedCounterStorage(engine=engine, sync_seconds=3600)
+    limit = parse("3/minute")
+    try:
+        limiter_a, limiter_b = FixedWindowRateLimiter(worker_a), FixedWindowRateLimiter(worker_b)
+        assert limiter_a.hit(limit, "1.2.3.4")
+        assert limiter_a.hit(limit, "1.2.3.4")
+        assert limiter_b.hit(limit, "1.2.3.4")
+        # Hits stay local until a sync; one batched upsert per worker publishes them
+        assert worker_a.sync() == 1
+        assert worker_b.sync() == 1
+        assert not limiter_b.hit(limit, "1.2.3.4")
+        worker_a.sync()
+        assert not limiter_a.test(limit, "1.2.3.4")
+        worker_b.sync()
+
+        with engine.connect() as conn:
+            assert conn.execute(select(func.sum(RateLimitCounter.count))).scalar() == 4
+    finally:
+        worker_a.stop()
+        worker_b.stop()
+
+
+def test_headers_middleware_and_route_costs(monkeypatch):
+    test_limiter = Limiter(key_func=get_remote_address)
+    monkeypatch.setattr(security, "route_costs", {"/expensive": 2})
+    app = FastAPI()
+    app.state.limiter = test_limiter
+    app.add_middleware(security.RateLimitHeadersMiddleware, limiter=test_limiter)
+
+    @app.get("/expensive")
+    @test_limiter.limit("5/minute", cost=security.request_cost)
+    async def expensive(request: Request):
+        return {"ok": True}
+
+    client = TestClient(app)
+    first = client.get("/expensive")
+    assert first.headers["x-ratelimit-limit"] == "5"
+    assert first.headers["x-ratelimit-remaining"] == "3"
+    client.get("/expensive")
+    assert client.get("/expensive").status_code == 429
+
+
+def test_headers_middleware_reads_window_stats_off_the_event_loop(monkeypatch):
+    test_limiter = Limiter(key_func=get_remote_address)
+    app = FastAPI()
+    app.state.limiter = test_limiter
+    app.add_middleware(security.RateLimitHeadersMiddleware, limiter=test_limiter)
+
+    @app.get("/limited")
+    @test_limiter.limit("5/minute")
+    async def limited(request: Request):
+        return {"ok": True}
+
+    on_loop = []
+    get_window_stats = test_limiter.limiter.get_window_stats
+
+    def recording_window_stats(*args):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return get_window_stats(*args)
+
+    monkeypatch.setattr(test_limiter.limiter, "get_window_stats", recording_window_stats)
+    response = TestClient(app).get("/limited")
+
+    assert response.headers["x-ratelimit-remaining"] == "4"
+    assert on_loop == [False]
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import rate_limiter
+from app.models import RateLimitCounter
+from app.rate_limiter import DatabaseCounterBackend, MemoryCounterBackend, SlidingWindowLimiter
+
+
+def test_sliding_window_weights_previous_window(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, "time", lambda: now[0])
+    limiter = SlidingWindowLimiter("reset", limit=3, window_seconds=100, backend=MemoryCounterBackend())
+
+    async def scenario():
+        for _ in range(3):
+            assert await limiter.allowed("1.2.3.4")
+            await limiter.hit("1.2.3.4")
+        assert not await limiter.allowed("1.2.3.4")
+        assert await limiter.allowed("5.6.7.8")
+
+        # Halfway through the next window half of the previous hits still count
+        now[0] = 1150.0
+        assert await limiter.usage("1.2.3.4") == pytest.approx(1.5)
+        assert await limiter.allowed("1.2.3.4")
+
+        now[0] = 1300.0
+        assert await limiter.usage("1.2.3.4") == 0
+
+    asyncio.run(scenario())
+
+
+def test_enforce_raises_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "time", lambda: 1030.0)
+    limiter = SlidingWindowLimiter("reset", limit=1, window_seconds=100, backend=MemoryCounterBackend())
+
+    async def scenario():
+        await limiter.hit("ip")
+        with pytest.raises(HTTPException) as exc:
+            await limiter.enforce("ip")
+        return exc.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert error.headers["Retry-After"] == "71"
+
+
+def test_database_backend_shares_counters(tmp_path):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'limits.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(RateLimitCounter.__table__.create)
+        try:
+            first = SlidingWindowLimiter("reset", limit=2, window_seconds=60, backend=DatabaseCounterBackend(engine))
+            second = SlidingWindowLimiter("reset", limit=2, window_seconds=60, backend=DatabaseCounterBackend(engine))
+
+            await first.hit("ip")
+            await second.hit("ip")
+            assert not await first.allowed("ip")
+            assert not await second.allowed("ip")
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_backend_errors_fail_open():
+    class BrokenBackend:
+        async def get(self, *args):
+            raise RuntimeError("database unavailable")
+
+        async def incr(self, *args):
+            raise RuntimeError("database unavailable")
+
+    limiter = SlidingWindowLimiter("reset", limit=1, window_seconds=60, backend=BrokenBackend())
+
+    async def scenario():
+        await limiter.hit("ip")
+        assert await limiter.allowed("ip")
+
+    asyncio.run(scenario())
+
+
+class YieldingBackend(MemoryCounterBackend):
+    """Memory counters that let other tasks run between calls, like a real database"""
+
+    async def get(self, key, window_start):
+        await asyncio.sleep(0)
+        return await super().get(key, window_start)
+
+    async def incr(self, key, window_start, amount, expires_at):
+        await asyncio.sleep(0)
+        return await super().incr(key, window_start, amount, expires_at)
+
+
+def test_concurrent_try_hits_never_exceed_the_limit():
+    limiter = SlidingWindowLimiter("reset", limit=3, window_seconds=60, backend=YieldingBackend())
+
+    async def scenario():
+        results = await asyncio.gather(*(limiter.try_hit("ip") for _ in range(10)))
+        assert results.count(True) == 3
+        assert limiter.rejected == 7
+        # Rejected attempts gave their cost back
+        assert await limiter.usage("ip") == 3
+
+    asyncio.run(scenario())
+
+
+def test_released_attempts_do_not_count():
+    limiter = SlidingWindowLimiter("reset", limit=1, window_seconds=60, backend=MemoryCounterBackend())
+
+    async def scenario():
+        assert await limiter.try_hit("ip")
+        await limiter.release("ip")
+        assert await limiter.try_hit("ip")
+        assert not await limiter.try_hit("ip")
+
+    asyncio.run(scenario())
@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.logging_config import RequestLoggingMiddleware, RequestLogSampler, get_request_id, redact_query_string
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(RequestLoggingMiddleware)
+
+    @app.exception_handler(HTTPException)
+    async def http_exception_handler(request: Request, exc: HTTPException):
+        return JSONResponse(status_code=exc.status_code, content={"request_id": get_request_id(request)})
+
+    @app.get("/ok")
+    async def ok(request: Request):
+        return {"request_id": request.state.request_id}
+
+    @app.get("/missing")
+    async def missing():
+        raise HTTPException(status_code=404)
+
+    return TestClient(app)
+
+
+def test_request_id_is_generated_and_returned():
+    response = make_client().get("/ok")
+
+    assert response.headers["x-request-id"] == response.json()["request_id"]
+    assert len(response.headers["x-request-id"]) == 36
+
+
+def test_incoming_request_id_reaches_exception_handlers():
+    client = make_client()
+    response = client.get("/missing", headers={"X-Request-ID": "edge-1234"})
+
+    assert response.status_code == 404
+    assert response.json()["request_id"] == "edge-1234"
+    assert response.headers["x-request-id"] == "edge-1234"
+
+    # Malformed IDs are replaced rather than echoed
+    response = client.get("/ok", headers={"X-Request-ID": "bad id\r\n"})
+    assert response.headers["x-request-id"] != "bad id"
+
+
+def test_sampler_always_keeps_errors_and_slow_requests():
+    sampler = RequestLogSampler(default_rate=1.0, path_rates={"/health": 0.0, "/health/deep": 1.0}, slow_ms=500)
+
+    assert not sampler.sample("/health")
+    assert sampler.sample("/health/deep")
+    assert sampler.sample("/api/users")
+    assert not sampler.should_log(False, 200, 0.01)
+    assert sampler.should_log(False, 503, 0.01)
+    assert sampler.should_log(False, 200, 0.6)
+    assert sampler.stats()["skipped"] == 1
+
+
+def test_superadmin_can_change_sampling_at_runtime(monkeypatch):
+    import main
+    from dependencies.auth import require_superadmin
+
+    sampler = RequestLogSampler(default_rate=1.0, path_rates={})
+    monkeypatch.setattr(main, "request_log_sampler", sampler)
+    main.app.dependency_overrides[require_superadmin] = lambda: SimpleNamespace(username="root")
+    try:
+        response = TestClient(main.app).put(
+            "/admin/request-logging", json={"path_rates": {"/health": 0.05}, "slow_ms": 250}
+        )
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.json()["path_rates"] == {"/health": 0.05}
+    assert sampler.rate_for("/health") == 0.05
+    assert sampler.slow_ms == 250
+    assert sampler.default_rate == 1.0
+
+
+def test_credentials_in_the_query_string_are_redacted():
+    assert redact_query_string("ticket=abc&limit=5") == "ticket=[REDACTED]&limit=5"
+    assert redact_query_string("Access_Token=eyJ.x.y&q=a%3Db") == "Access_Token=[REDACTED]&q=a%3Db"
+    assert redact_query_string("flag&token=") == "flag&token=[REDACTED]"
+    assert redact_query_string("") == ""
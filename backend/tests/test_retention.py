@@ -0,0 +1,89 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.models import EmailLog, EmailLogArchive, Notification, User
+from app.retention import RetentionJob, parse_retention_policies
+
+
+def job_for(db, **kwargs):
+    return RetentionJob(session_factory=async_sessionmaker(db.bind, expire_on_commit=False),
+                        batch_size=2, batch_pause_seconds=0, **kwargs)
+
+
+def test_parse_retention_policies():
+    assert parse_retention_policies("employee_added=30, audit=0,bad") == {"employee_added": 30, "audit": 0}
+
+
+def test_prunes_old_read_notifications_per_type(run_async_db):
+    async def scenario(db):
+        db.add(User(id="u1", username="alice", email="a@example.com", hashed_password="x"))
+        old, recent = datetime.utcnow() - timedelta(days=40), datetime.utcnow() - timedelta(days=5)
+        for notification_type, created_at, read in [
+            ("employee_added", old, True), ("employee_added", old, True), ("employee_added", old, True),
+            ("employee_added", old, False),        # unread: kept
+            ("employee_added", recent, True),      # too new: kept
+            ("announcement", old, True),           # default policy (90 days): kept
+            ("audit", datetime(2000, 1, 1), True), # 0 = keep forever
+        ]:
+            db.add(Notification(type=notification_type, recipient_user_id="u1", title="t", message="m",
+                                created_at=created_at, read=read))
+        await db.commit()
+
+        report = await job_for(db, notification_days=90,
+                               notification_policies={"employee_added": 30, "audit": 0}).run_once()
+        assert report["notifications_deleted"] == {"employee_added": 3, "*": 0}
+        assert len((await db.execute(select(Notification.id))).all()) == 4
+
+    run_async_db(scenario)
+
+
+def test_archives_finished_email_logs(run_async_db, tmp_path):
+    async def scenario(db):
+        old = datetime.utcnow() - timedelta(days=60)
+        for status in ("sent", "failed", "sent", "queued"):
+            db.add(EmailLog(template_name="t", recipient_email="a@example.com", subject="s",
+                            status=status, created_at=old))
+        db.add(EmailLog(template_name="t", recipient_email="b@example.com", subject="s", status="sent"))
+        await db.commit()
+
+        report = await job_for(db, email_log_days=30, archive_mode="table").run_once()
+        assert report["email_logs_archived"] == 3
+        archived = (await db.execute(select(EmailLogArchive.id, EmailLogArchive.status))).all()
+        assert sorted(archived) == [(1, "sent"), (2, "failed"), (3, "sent")]
+        remaining = (await db.execute(select(EmailLog.status))).scalars().all()
+        assert sorted(remaining) == ["queued", "sent"]
+
+        # JSONL mode writes the rows to a gzip file instead
+        db.add(EmailLog(template_name="t", recipient_email="c@example.com", subject="s",
+                        status="sent", created_at=old))
+        await db.commit()
+        job = job_for(db, email_log_days=30, archive_mode="jsonl", archive_dir=str(tmp_path))
+        assert (await job.run_once())["email_logs_archived"] == 1
+
+    run_async_db(scenario)
+    [archive] = tmp_path.glob("email_logs-*.jsonl.gz")
+    with gzip.open(archive, "rt") as lines:
+        assert json.loads(lines.readline())["recipient_email"] == "c@example.com"
+
+
+def test_rows_already_archived_by_another_run_do_not_abort_the_batch(run_async_db):
+    async def scenario(db):
+        old = datetime.utcnow() - timedelta(days=60)
+        for _ in range(3):
+            db.add(EmailLog(template_name="t", recipient_email="a@example.com", subject="s",
+                            status="sent", created_at=old))
+        # Another worker archived id 1 but had not deleted it yet
+        db.add(EmailLogArchive(id=1, template_name="t", recipient_email="a@example.com", subject="s",
+                               status="sent", created_at=old, archived_at=datetime.utcnow()))
+        await db.commit()
+
+        report = await job_for(db, email_log_days=30, archive_mode="table").run_once()
+        assert report["email_logs_archived"] == 3
+        assert sorted((await db.execute(select(EmailLogArchive.id))).scalars().all()) == [1, 2, 3]
+        assert (await db.execute(select(EmailLog.id))).all() == []
+
+    run_async_db(scenario)
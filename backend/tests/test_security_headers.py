@@ -0,0 +1,34 @@
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from app.security import DOCS_CONTENT_SECURITY_POLICY, SecurityHeadersMiddleware
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(SecurityHeadersMiddleware)
+
+    @app.get("/cookies")
+    async def cookies(response: Response):
+        response.set_cookie("a", "1")
+        response.set_cookie("b", "2")
+        response.headers["x-frame-options"] = "SAMEORIGIN"
+        return {}
+
+    return TestClient(app)
+
+
+def test_security_headers_keep_repeated_and_app_set_headers():
+    response = make_client().get("/cookies")
+
+    assert len(response.headers.get_list("set-cookie")) == 2
+    assert response.headers.get_list("x-frame-options") == ["SAMEORIGIN"]
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert response.headers["content-security-policy"] == "default-src 'self'"
+
+
+def test_docs_use_their_own_header_profile():
+    response = make_client().get("/docs")
+
+    assert response.headers["content-security-policy"] == DOCS_CONTENT_SECURITY_POLICY.decode()
+    assert response.headers["x-content-type-options"] == "nosniff"
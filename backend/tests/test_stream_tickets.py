@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import stream_tickets
+from app.auth import decode_token
+from app.rate_limiter import MemoryCounterBackend
+from app.stream_tickets import grant_revocation_reason, issue_stream_ticket, redeem_stream_ticket
+from app.token_versions import TokenVersionMap
+
+
+def make_grant(**overrides):
+    grant = {"sub": "alice", "uid": "u1", "ver": 0, "tok_exp": int(time.time()) + 600}
+    grant.update(overrides)
+    return grant
+
+
+def test_ticket_is_redeemed_once(monkeypatch):
+    backend = MemoryCounterBackend()
+    monkeypatch.setattr(stream_tickets, "counter_backend", lambda: backend)
+    ticket = issue_stream_ticket(make_grant())
+
+    async def scenario():
+        grant = await redeem_stream_ticket(ticket)
+        with pytest.raises(HTTPException) as exc:
+            await redeem_stream_ticket(ticket)
+        return grant, exc.value
+
+    grant, error = asyncio.run(scenario())
+    assert grant == make_grant(tok_exp=grant["tok_exp"])
+    assert error.status_code == 401
+
+    # A ticket is not an access token
+    with pytest.raises(HTTPException):
+        decode_token(ticket)
+
+
+def test_ticket_never_outlives_the_access_token(monkeypatch):
+    monkeypatch.setattr(stream_tickets, "counter_backend", lambda: MemoryCounterBackend())
+    ticket = issue_stream_ticket(make_grant(tok_exp=int(time.time()) - 1))
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(redeem_stream_ticket(ticket))
+    assert exc.value.status_code == 401
+
+
+def test_grant_is_closed_on_expiry_and_revocation(tmp_path, monkeypatch):
+    monkeypatch.setattr(stream_tickets, "token_versions", TokenVersionMap(refresh_seconds=60))
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'grants.db'}")
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE users (id TEXT PRIMARY KEY, token_version INTEGER, is_active BOOLEAN)"))
+            await conn.execute(text("INSERT INTO users VALUES ('u1', 0, 1)"))
+        try:
+            async with async_sessionmaker(engine)() as db:
+                assert await grant_revocation_reason(db, make_grant()) is None
+                assert await grant_revocation_reason(db, make_grant(tok_exp=int(time.time()) - 1)) == "expired"
+
+                await db.execute(text("UPDATE users SET token_version = 1 WHERE id = 'u1'"))
+                await db.commit()
+                stream_tickets.token_versions.mark_stale()
+                assert await grant_revocation_reason(db, make_grant()) == "revoked"
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
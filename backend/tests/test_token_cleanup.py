@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.models import PasswordResetToken, User
+from app.token_cleanup import ResetTokenCleanup
+
+
+def test_cleanup_deletes_only_expired_tokens_in_batches(run_async_db):
+    async def scenario(db):
+        db.add(User(id="u1", username="alice", email="a@example.com", hashed_password="x"))
+        now = datetime.utcnow()
+        for i in range(5):
+            db.add(PasswordResetToken(user_id="u1", token=f"old{i}", expires_at=now - timedelta(minutes=1)))
+        db.add(PasswordResetToken(user_id="u1", token="live", expires_at=now + timedelta(minutes=30)))
+        await db.commit()
+
+        cleanup = ResetTokenCleanup(session_factory=async_sessionmaker(db.bind), batch_size=2)
+        assert await cleanup.run_once() == 5
+        assert await cleanup.run_once() == 0
+        assert (await db.execute(select(PasswordResetToken.token))).scalars().all() == ["live"]
+        assert cleanup.stats()["deleted"] == 5
+
+    run_async_db(scenario)
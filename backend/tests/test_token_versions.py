@@ -0,0 +1,108 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.token_versions import TokenVersionMap
+
+
+def run_with_users(tmp_path, scenario, create_users=True):
+    """Run `scenario(db)` against an AsyncSession on a small users table"""
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'versions.db'}")
+        if create_users:
+            async with engine.begin() as conn:
+                await conn.execute(text("CREATE TABLE users (id TEXT PRIMARY KEY, token_version INTEGER, is_active BOOLEAN)"))
+                await conn.execute(text("INSERT INTO users VALUES ('u1', 0, 1), ('u2', 3, 0)"))
+        try:
+            async with async_sessionmaker(engine)() as db:
+                await scenario(db)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(runner())
+
+
+def test_current_version_is_accepted_with_one_lookup_per_user(tmp_path):
+    async def scenario(db):
+        versions = TokenVersionMap(refresh_seconds=60)
+
+        assert await versions.is_current(db, "u1", 0) is True
+        assert await versions.is_current(db, "u1", 0) is True
+        assert versions.refreshes == 1
+        assert versions.stats()["users"] == 1
+
+    run_with_users(tmp_path, scenario)
+
+
+def test_bumped_version_and_inactive_user_are_rejected(tmp_path):
+    async def scenario(db):
+        versions = TokenVersionMap(refresh_seconds=60)
+        assert await versions.is_current(db, "u1", 0) is True
+
+        await db.execute(text("UPDATE users SET token_version = 1 WHERE id = 'u1'"))
+        await db.commit()
+        versions.mark_stale("u1")
+
+        assert await versions.is_current(db, "u1", 0) is False
+        assert await versions.is_current(db, "u1", 1) is True
+        assert await versions.is_current(db, "u2", 3) is False
+
+    run_with_users(tmp_path, scenario)
+
+
+def test_deleted_user_is_rejected(tmp_path):
+    async def scenario(db):
+        versions = TokenVersionMap(refresh_seconds=60)
+        assert await versions.is_current(db, "missing", 0) is False
+
+    run_with_users(tmp_path, scenario)
+
+
+def test_unavailable_map_reports_unknown(tmp_path):
+    async def scenario(db):
+        versions = TokenVersionMap(refresh_seconds=60)
+        assert await versions.is_current(db, "u1", 0) is None
+
+    run_with_users(tmp_path, scenario, create_users=False)
+
+
+def test_token_newer_than_cached_version_reloads_the_user(tmp_path):
+    async def scenario(db):
+        versions = TokenVersionMap(refresh_seconds=60)
+        assert await versions.is_current(db, "u1", 0) is True
+
+        # Password change in another worker: the new token must not read as revoked
+        await db.execute(text("UPDATE users SET token_version = 1 WHERE id = 'u1'"))
+        await db.commit()
+
+        assert await versions.is_current(db, "u1", 1) is True
+        assert await versions.is_current(db, "u1", 0) is False
+        assert versions.refreshes == 2
+        # A database that has not seen the bump yet cannot decide
+        assert await versions.is_current(db, "u1", 2) is None
+
+    run_with_users(tmp_path, scenario)
+
+
+def test_cache_is_bounded(tmp_path):
+    async def scenario(db):
+        versions = TokenVersionMap(refresh_seconds=60, max_entries=1)
+        assert await versions.is_current(db, "u1", 0) is True
+        assert await versions.is_current(db, "u2", 3) is False
+
+        assert versions.stats()["users"] == 1
+        assert await versions.is_current(db, "u1", 0) is True
+        assert versions.refreshes == 3
+
+    run_with_users(tmp_path, scenario)
+
+
+def test_failed_refresh_rolls_back_the_session(tmp_path):
+    async def scenario(db):
+        versions = TokenVersionMap(refresh_seconds=60)
+        assert await versions.refresh(db, "u1") is False
+
+        assert (await db.execute(text("SELECT 1"))).scalar() == 1
+
+    run_with_users(tmp_path, scenario, create_users=False)